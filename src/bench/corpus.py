@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from src.utils.io import Paths, TableWriter, load_yaml
+from src.utils.menu import load_aliases_map
+
+# 생성 발화 템플릿 재료(설정에 없는 말투/접미사만 여기 둔다)
+ORDER_SUFFIXES = ["주세요", "주문할게요", "주문이요", "주문 가능할까요", "주문해 주세요", "부탁드려요 주문이요"]
+ITEM_JOINERS = [", ", " 그리고 ", "랑 ", " 하고 "]
+ORDER_TYPE_SUFFIX = {"TAKE_OUT": ["포장이요", "포장해 주세요", "테이크아웃이요"], "DINE_IN": ["먹고 가요", "매장이요"]}
+STAFF_REPLIES = ["네 알겠습니다", "네 준비해 드릴게요", "결제 도와드리겠습니다", "잠시만 기다려 주세요"]
+SMALL_TALK = ["화장실 어디예요?", "와이파이 비밀번호 알려주세요", "영업시간이 어떻게 되나요?", "주차 되나요?"]
+BEVERAGE_UNIT = "잔"
+DESSERT_UNIT = "개"
+# 단위 앞에 오지 않는 단독형 수사(하나/둘...)는 생성에서 제외
+STANDALONE_NUMBER_WORDS = {"하나", "둘", "셋", "넷"}
+# patterns.yml 슬롯 값 → 스키마 값(02_build_aliases / 파서 정규화와 동일)
+ICE_GOLD = {"NONE": "less", "LESS": "less", "REGULAR": "normal", "MORE": "more"}
+SHOT_GOLD = {"plus1": 1, "plus2": 2, "plus3": 3}
+RAW_COLUMNS = ["IDX", "발화자", "발화문", "카테고리", "QA번호", "QA여부", "감성", "인텐트", "개체명", "상담번호", "상담내순번"]
+
+
+@dataclass
+class CorpusSpec:
+    """menu/aliases/patterns에서 뽑은 생성 재료. 워커로 그대로 넘길 수 있게 순수 dict/list만 담는다."""
+
+    items: List[dict]
+    slot_words: Dict[str, Dict[str, List[str]]]
+    number_words: Dict[int, List[str]]
+    noise_tokens: List[str]
+    category: str = "카페"
+
+
+@dataclass
+class NoiseConfig:
+    spacing: float = 0.1   # STT 띄어쓰기 오류(공백 삭제/삽입) 확률
+    typo: float = 0.05     # 음절 중복/누락 확률
+    filler: float = 0.1    # "음", "저기" 같은 선행 잡음 토큰 확률
+    multi: float = 0.35    # 아이템을 2개 이상 이어 붙일 확률
+    max_items: int = 3
+
+
+@dataclass
+class Chunk:
+    rows: List[dict] = field(default_factory=list)
+    gold: List[dict] = field(default_factory=list)
+
+
+def build_spec(paths: Paths, domain: str) -> CorpusSpec:
+    menu = load_yaml(paths.configs / f"menu.{domain}.yml") or {}
+    patterns = load_yaml(paths.configs / "patterns.yml") or {}
+    aliases = load_aliases_map(paths.configs / f"aliases.{domain}.yml")
+
+    items: List[dict] = []
+    for it in menu.get("items") or []:
+        if not isinstance(it, dict) or not it.get("sku"):
+            continue
+        temps = list(it.get("temps") or [])
+        # (phrase, 별칭 암시 옵션). 암시 온도가 메뉴 온도와 맞지 않는 별칭은 제외
+        phrases: List[Tuple[str, dict]] = [(p, {}) for p in [it.get("display")] + list(it.get("alt") or []) if isinstance(p, str) and p]
+        for term, apply in aliases.items():
+            if apply.get("sku") != it["sku"]:
+                continue
+            implied = {k: v for k, v in (apply.get("options") or {}).items() if k == "temp"}
+            if implied.get("temp") and implied["temp"] not in temps:
+                continue
+            phrases.append((term, implied))
+        items.append({
+            "sku": it["sku"],
+            "phrases": phrases,
+            "temps": temps,
+            "sizes_enabled": bool(it.get("sizes_enabled")),
+            "allow": list(it.get("allow_options") or []),
+            "dessert": it.get("category") == "dessert" or "dessert" in (it.get("tags") or []),
+        })
+
+    parsing = patterns.get("parsing") or {}
+    slots = parsing.get("slots") or {}
+    slot_words = {k: {v: list(ws) for v, ws in (slots.get(k) or {}).items()} for k in ("size", "temp", "ice", "shot", "syrup")}
+    number_words: Dict[int, List[str]] = {}
+    quantity = parsing.get("quantity") or {}
+    for word, val in (quantity.get("number_words") or {}).items():
+        if isinstance(val, int) and word not in STANDALONE_NUMBER_WORDS:
+            number_words.setdefault(val, []).append(word)
+    noise = ((patterns.get("normalization") or {}).get("stt_noise_tokens")) or []
+    category = ((patterns.get("filters") or {}).get("category_whitelist") or ["카페"])[0]
+    return CorpusSpec(items=items, slot_words=slot_words, number_words=number_words,
+                      noise_tokens=[t for t in noise if t], category=category)
+
+
+def _pick_word(rng: random.Random, spec: CorpusSpec, slot: str, value: str) -> Optional[str]:
+    words = spec.slot_words.get(slot, {}).get(value) or []
+    return rng.choice(words) if words else None
+
+
+def make_item(rng: random.Random, spec: CorpusSpec) -> Tuple[str, dict]:
+    """아이템 1개의 발화 조각과 gold 아이템."""
+    it = rng.choice(spec.items)
+    phrase, implied = rng.choice(it["phrases"])
+    opts: Dict[str, object] = {}
+    words: List[str] = []
+
+    temp = implied.get("temp")
+    if temp is None and it["temps"] and rng.random() < 0.7:
+        word = _pick_word(rng, spec, "temp", rng.choice(it["temps"]))
+        if word:
+            words.append(word)
+            temp = next(t for t in it["temps"] if word in spec.slot_words["temp"].get(t, []))
+    if temp and it["temps"]:
+        opts["temp"] = temp
+    if it["sizes_enabled"] and rng.random() < 0.5:
+        size = rng.choice([s for s in spec.slot_words.get("size", {}) if s in ("S", "M", "L", "XL")] or ["M"])
+        word = _pick_word(rng, spec, "size", size)
+        if word:
+            words.append(word)
+            opts["size"] = "L" if size == "XL" else size
+    head = " ".join(words + [phrase])
+
+    tail: List[str] = []
+    if "shot" in it["allow"] and rng.random() < 0.2:
+        value = rng.choice([v for v in spec.slot_words.get("shot", {}) if v in SHOT_GOLD] or ["plus1"])
+        word = _pick_word(rng, spec, "shot", value)
+        if word:
+            tail.append(word)
+            opts["shot"] = SHOT_GOLD[value]
+    if "syrup" in it["allow"] and rng.random() < 0.15:
+        value = rng.choice(list(spec.slot_words.get("syrup", {})) or ["VANILLA"])
+        word = _pick_word(rng, spec, "syrup", value)
+        if word:
+            tail.append(word)
+            opts["syrup"] = value
+    if "ice" in it["allow"] and temp == "ICE" and rng.random() < 0.2:
+        value = rng.choice([v for v in spec.slot_words.get("ice", {}) if v in ICE_GOLD] or ["LESS"])
+        word = _pick_word(rng, spec, "ice", value)
+        if word:
+            tail.append(word)
+            opts["ice"] = ICE_GOLD[value]
+
+    qty = 1
+    r = rng.random()
+    unit = DESSERT_UNIT if it["dessert"] else BEVERAGE_UNIT
+    if r < 0.45:
+        qty = rng.choice(sorted(spec.number_words)) if spec.number_words else 1
+        tail.append(f"{rng.choice(spec.number_words[qty])} {unit}" if spec.number_words else f"1{unit}")
+    elif r < 0.8:
+        qty = rng.randint(1, 10)
+        tail.append(f"{qty}{unit}" if rng.random() < 0.7 else f"{qty} {unit}")
+    item: Dict[str, object] = {"sku": it["sku"], "quantity": qty}
+    if opts:
+        item["options"] = opts
+    return " ".join([head] + tail), item
+
+
+def add_noise(rng: random.Random, text: str, noise: NoiseConfig, spec: CorpusSpec) -> str:
+    if noise.spacing and rng.random() < noise.spacing:
+        spaces = [i for i, ch in enumerate(text) if ch == " "]
+        if spaces and rng.random() < 0.5:
+            i = rng.choice(spaces)
+            text = text[:i] + text[i + 1:]
+        else:
+            i = rng.randrange(1, max(2, len(text)))
+            text = text[:i] + " " + text[i:]
+    if noise.typo and rng.random() < noise.typo and len(text) > 3:
+        i = rng.randrange(len(text))
+        text = text[:i] + text[i] + text[i:] if rng.random() < 0.5 else text[:i] + text[i + 1:]
+    if noise.filler and spec.noise_tokens and rng.random() < noise.filler:
+        text = f"{rng.choice(spec.noise_tokens)} {text}"
+    # 글자 삭제로 생긴 연속 공백은 하나로
+    return " ".join(text.split())
+
+
+def make_order(rng: random.Random, spec: CorpusSpec, noise: NoiseConfig) -> Tuple[str, dict]:
+    """주문 발화 1개와 gold(order)."""
+    n_items = 1
+    while n_items < noise.max_items and rng.random() < noise.multi:
+        n_items += 1
+    parts, items = zip(*(make_item(rng, spec) for _ in range(n_items)))
+    text = rng.choice(ITEM_JOINERS).join(parts)
+    order: Dict[str, object] = {"items": list(items)}
+    if rng.random() < 0.2:
+        order_type = rng.choice(sorted(ORDER_TYPE_SUFFIX))
+        # 포장/매장 표현이 문장을 끝내므로 주문 어미는 붙이지 않는다
+        text = f"{text} {rng.choice(ORDER_TYPE_SUFFIX[order_type])}"
+        order["type"] = order_type
+    else:
+        text = f"{text} {rng.choice(ORDER_SUFFIXES)}"
+    return add_noise(rng, text, noise, spec), {"order": order}
+
+
+def generate_chunk(spec: CorpusSpec, noise: NoiseConfig, seed: int, chunk_idx: int, start: int, n_rows: int) -> Chunk:
+    """IDX start부터 n_rows행. 난수는 (seed, chunk_idx)로만 정해지므로 워커 수와 무관하게 결정적."""
+    rng = random.Random(f"{seed}:{chunk_idx}")
+    out = Chunk()
+    session = 0
+    idx = start
+    end = start + n_rows
+    while idx < end:
+        # 세션: (잡담?) + 고객 주문 + 직원 응답
+        sid = start + session
+        turns: List[Tuple[str, str, str, Optional[dict]]] = []
+        if rng.random() < 0.15:
+            turns.append(("c", "q", rng.choice(SMALL_TALK), None))
+        text, gold = make_order(rng, spec, noise)
+        turns.append(("c", "q", text, gold))
+        turns.append(("s", "a", rng.choice(STAFF_REPLIES), None))
+        for turn, (speaker, qa, utt, g) in enumerate(turns):
+            if idx >= end:
+                break
+            out.rows.append({
+                "IDX": idx, "발화자": speaker, "발화문": utt, "카테고리": spec.category, "QA번호": sid,
+                "QA여부": qa, "감성": "n", "인텐트": "주문" if g is not None else "기타", "개체명": None,
+                "상담번호": sid, "상담내순번": turn,
+            })
+            if g is not None:
+                out.gold.append({"IDX": idx, "input": utt, "gold": g})
+            idx += 1
+        session += 1
+    return out
+
+
+def _chunk_plan(n_rows: int, chunk_rows: int) -> Iterator[Tuple[int, int, int]]:
+    for i, start in enumerate(range(0, n_rows, chunk_rows)):
+        yield i, start, min(chunk_rows, n_rows - start)
+
+
+_WORKER: Dict[str, object] = {}
+
+
+def _init_worker(spec: CorpusSpec, noise: NoiseConfig, seed: int) -> None:
+    _WORKER.update(spec=spec, noise=noise, seed=seed)
+
+
+def _generate(task: Tuple[int, int, int]) -> Chunk:
+    i, start, n = task
+    return generate_chunk(_WORKER["spec"], _WORKER["noise"], _WORKER["seed"], i, start, n)  # type: ignore[arg-type]
+
+
+def iter_corpus(spec: CorpusSpec, n_rows: int, seed: int = 42, noise: Optional[NoiseConfig] = None,
+                workers: int = 1, chunk_rows: int = 50_000) -> Iterator[Chunk]:
+    """chunk 순서대로 생성 결과를 돌려준다(workers > 1이면 프로세스 풀, 출력은 동일)."""
+    noise = noise or NoiseConfig()
+    plan = list(_chunk_plan(n_rows, chunk_rows))
+    if workers <= 1:
+        for i, start, n in plan:
+            yield generate_chunk(spec, noise, seed, i, start, n)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(spec, noise, seed)) as ex:
+        yield from ex.map(_generate, plan)
+
+
+def generate_utterances(spec: CorpusSpec, n: int, seed: int = 42, noise: Optional[NoiseConfig] = None) -> List[Tuple[str, dict]]:
+    """주문 발화만 n개(gold 포함). 벤치마크 등 인메모리 용도."""
+    rng = random.Random(seed)
+    noise = noise or NoiseConfig()
+    return [make_order(rng, spec, noise) for _ in range(n)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--domain", default="cafe")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="생성할 원천 행 수(고객/직원 발화 포함)")
+    parser.add_argument("--out", default="", help="출력 경로(.csv/.parquet, 기본 data/raw/{domain}_synth.csv)")
+    parser.add_argument("--gold", default="", help="gold JSONL 경로(기본 출력 파일명 + .gold.jsonl)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunk_rows", type=int, default=50_000)
+    parser.add_argument("--spacing", type=float, default=0.1, help="STT 띄어쓰기 잡음 확률")
+    parser.add_argument("--typo", type=float, default=0.05, help="음절 중복/누락 확률")
+    parser.add_argument("--filler", type=float, default=0.1, help="선행 잡음 토큰 확률")
+    parser.add_argument("--multi", type=float, default=0.35, help="아이템 추가 확률(멀티 아이템)")
+    parser.add_argument("--max_items", type=int, default=3)
+    args = parser.parse_args()
+
+    paths = Paths(root=Path(__file__).resolve().parents[2])
+    out = Path(args.out) if args.out else paths.data_raw / f"{args.domain}_synth.csv"
+    gold_path = Path(args.gold) if args.gold else out.with_name(out.stem + ".gold.jsonl")
+    spec = build_spec(paths, args.domain)
+    noise = NoiseConfig(spacing=args.spacing, typo=args.typo, filler=args.filler, multi=args.multi,
+                        max_items=args.max_items)
+    raw_dtype = importlib.import_module("src.etl.01_filter_orders").RAW_DTYPE
+
+    started = time.perf_counter()
+    rows = golds = 0
+    gold_path.parent.mkdir(parents=True, exist_ok=True)
+    with TableWriter(out) as w, gold_path.open("w", encoding="utf-8") as g:
+        for chunk in iter_corpus(spec, args.rows, seed=args.seed, noise=noise, workers=args.workers,
+                                 chunk_rows=args.chunk_rows):
+            w.write(pd.DataFrame(chunk.rows, columns=RAW_COLUMNS).astype(raw_dtype))
+            for row in chunk.gold:
+                g.write(json.dumps(row, ensure_ascii=False))
+                g.write("\n")
+            rows += len(chunk.rows)
+            golds += len(chunk.gold)
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"[Corpus] {rows} rows ({golds} orders with gold) -> {out}, {gold_path}")
+    print(f"[Corpus] {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
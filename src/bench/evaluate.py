@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import importlib
+import platform
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.utils.constraints import MenuConstraints
+from src.utils.io import Paths, iter_jsonl_lines, load_yaml, write_json
+from src.utils.menu import MenuMapping, load_combined_mapping
+from src.utils.quantity import compile_quantity_parser
+from src.utils.slots import compile_slot_extractor
+from src.utils.textnorm import compile_normalizer
+from src.utils.validation import load_json
+
+DEFAULT_PARSER = "src.utils.parse:parse_order"
+# 정확도 지표는 절대값(0.01 = 1%p), 처리량은 비율로 회귀 판정
+DEFAULT_ACC_DROP = 0.01
+DEFAULT_SPEED_DROP = 0.15
+NONE_SKU = "<none>"
+ACCURACY_KEYS = ["item_precision", "item_recall", "option_precision", "option_recall", "exact_match", "type_accuracy"]
+
+# 워커 프로세스별 상태(initializer에서 1회 로드)
+_WORKER: Dict[str, object] = {}
+
+
+def load_parser(spec: str) -> Callable:
+    """"module:function" → 파서 callable. 시그니처는 parse_order_items와 같다: (text, menu_mapping, aliases_map).
+
+    반환값은 아이템 리스트 또는 {"items": [...], "type"?: ...} 주문 dict.
+    """
+    module, _, name = spec.partition(":")
+    if not module or not name:
+        raise ValueError(f"parser must be 'module:function', got {spec!r}")
+    return getattr(importlib.import_module(module), name)
+
+
+def as_order(result: object) -> dict:
+    if isinstance(result, dict):
+        return {"items": list(result.get("items") or []), "type": result.get("type")}
+    return {"items": list(result or []), "type": None}
+
+
+def load_gold(path: Path) -> List[Tuple[str, dict]]:
+    """evalset.jsonl(또는 src.bench.corpus의 .gold.jsonl) → [(input, order)]."""
+    rows = []
+    for row in iter_jsonl_lines(path):
+        gold = row.get("gold") or {}
+        rows.append((str(row.get("input", "")), as_order(gold.get("order", gold))))
+    return rows
+
+
+def _mapping(paths: Paths, domain: str) -> MenuMapping:
+    patterns = load_yaml(paths.configs / "patterns.yml") or {}
+    # 스테이지와 같은 조건(매칭 전 patterns.yml 정규화)
+    return load_combined_mapping(paths.configs / f"menu.{domain}.yml", paths.configs / f"aliases.{domain}.yml",
+                                 compile_normalizer(patterns), jamo_fuzzy=True,
+                                 slot_extractor=compile_slot_extractor(patterns),
+                                 quantity_parser=compile_quantity_parser(patterns))
+
+
+def _init_eval_worker(paths: Paths, domain: str, parser_spec: str) -> None:
+    _WORKER["mapping"] = _mapping(paths, domain)
+    _WORKER["parser"] = load_parser(parser_spec)
+
+
+def _run_shard(texts: List[str]) -> Tuple[List[dict], List[float]]:
+    mapping: MenuMapping = _WORKER["mapping"]  # type: ignore[assignment]
+    parser: Callable = _WORKER["parser"]  # type: ignore[assignment]
+    preds: List[dict] = []
+    lat: List[float] = []
+    clock = time.perf_counter
+    for text in texts:
+        t = clock()
+        result = parser(text, mapping, mapping.aliases)
+        lat.append(clock() - t)
+        preds.append(as_order(result))
+    return preds, lat
+
+
+def predict(paths: Paths, domain: str, texts: List[str], parser_spec: str = DEFAULT_PARSER, workers: int = 1,
+            shards_per_worker: int = 4, warmup: int = 50) -> Tuple[List[dict], List[float], float]:
+    """texts를 파싱해 (예측 주문, 발화별 지연(s), 총 wall s)를 돌려준다. 순서는 입력과 같다.
+
+    workers > 1이면 연속 구간 shard를 프로세스 풀에서 돌린다(워커마다 매핑/파서 1회 로드).
+    앞쪽 warmup개로 지연 초기화(매처 생성 등)를 먼저 끝내 지연 분포에서 뺀다.
+    """
+    if workers <= 1:
+        _init_eval_worker(paths, domain, parser_spec)
+        _run_shard(texts[:warmup])
+        started = time.perf_counter()
+        preds, lat = _run_shard(texts)
+        return preds, lat, time.perf_counter() - started
+    n_shards = max(1, min(len(texts), workers * shards_per_worker))
+    size = -(-len(texts) // n_shards) if texts else 1
+    shards = [texts[i:i + size] for i in range(0, len(texts), size)]
+    preds, lat = [], []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_eval_worker,
+                             initargs=(paths, domain, parser_spec)) as ex:
+        # 워밍업 shard를 워커 수만큼 먼저 돌려 초기화(매핑 로드 등)를 측정 구간 밖으로 뺀다
+        list(ex.map(_run_shard, [texts[:warmup]] * workers))
+        started = time.perf_counter()
+        for p, l in ex.map(_run_shard, shards):
+            preds.extend(p)
+            lat.extend(l)
+        wall = time.perf_counter() - started
+    return preds, lat, wall
+
+
+def load_constraints(paths: Paths, domain: str) -> Optional[MenuConstraints]:
+    """outputs/{domain}/menu.json의 옵션 제약(evalset gold를 거른 것과 같은 규칙). 없으면 None."""
+    menu_p = paths.outputs / domain / "menu.json"
+    return MenuConstraints.from_menu_json(load_json(menu_p)) if menu_p.exists() else None
+
+
+def constrain(preds: List[dict], constraints: MenuConstraints) -> List[dict]:
+    """예측 옵션 중 메뉴 제약을 어기는 것을 gold와 같은 방식(04의 filter_items)으로 지운 사본(원본 예측은 그대로)."""
+    return [{**p, "items": constraints.filter_items([dict(it) for it in p["items"]])} for p in preds]
+
+
+def _item_keys(items: List[dict]) -> Counter:
+    return Counter((it.get("sku"), it.get("quantity")) for it in items)
+
+
+def _option_keys(items: List[dict]) -> Counter:
+    return Counter((it.get("sku"), k, str(v)) for it in items for k, v in (it.get("options") or {}).items())
+
+
+def _exact_key(items: List[dict]) -> Counter:
+    return Counter((it.get("sku"), it.get("quantity"), tuple(sorted((it.get("options") or {}).items())))
+                   for it in items)
+
+
+def _align_skus(gold: List[dict], pred: List[dict]) -> List[Tuple[str, str]]:
+    """gold/예측 SKU 짝: 같은 SKU끼리 먼저, 남은 것은 순서대로, 짝이 없으면 NONE_SKU."""
+    g = [it.get("sku") or NONE_SKU for it in gold]
+    p = [it.get("sku") or NONE_SKU for it in pred]
+    pairs: List[Tuple[str, str]] = []
+    rest_p = Counter(p)
+    rest_g: List[str] = []
+    for sku in g:
+        if rest_p[sku] > 0:
+            rest_p[sku] -= 1
+            pairs.append((sku, sku))
+        else:
+            rest_g.append(sku)
+    left_p: List[str] = []
+    for sku in p:
+        if rest_p[sku] > 0:
+            rest_p[sku] -= 1
+            left_p.append(sku)
+    for i in range(max(len(rest_g), len(left_p))):
+        pairs.append((rest_g[i] if i < len(rest_g) else NONE_SKU, left_p[i] if i < len(left_p) else NONE_SKU))
+    return pairs
+
+
+@dataclass
+class _PR:
+    tp: int = 0
+    fp: int = 0
+    fn: int = 0
+
+    def add(self, gold: Counter, pred: Counter) -> None:
+        hit = sum((gold & pred).values())
+        self.tp += hit
+        self.fp += sum(pred.values()) - hit
+        self.fn += sum(gold.values()) - hit
+
+    def precision(self) -> float:
+        return round(self.tp / (self.tp + self.fp), 4) if self.tp + self.fp else 0.0
+
+    def recall(self) -> float:
+        return round(self.tp / (self.tp + self.fn), 4) if self.tp + self.fn else 0.0
+
+
+@dataclass
+class Scores:
+    n: int = 0
+    exact: int = 0
+    type_total: int = 0
+    type_correct: int = 0
+    items: _PR = field(default_factory=_PR)
+    options: _PR = field(default_factory=_PR)
+    per_sku: Dict[str, _PR] = field(default_factory=dict)
+    confusion: Dict[str, Counter] = field(default_factory=dict)
+    mismatches: List[dict] = field(default_factory=list)
+
+
+def score(gold_rows: List[Tuple[str, dict]], preds: List[dict], max_mismatches: int = 50) -> Scores:
+    s = Scores()
+    for (text, gold), pred in zip(gold_rows, preds):
+        s.n += 1
+        g_items, p_items = gold["items"], pred["items"]
+        s.items.add(_item_keys(g_items), _item_keys(p_items))
+        s.options.add(_option_keys(g_items), _option_keys(p_items))
+        for sku in {it.get("sku") for it in g_items} | {it.get("sku") for it in p_items}:
+            pr = s.per_sku.setdefault(str(sku), _PR())
+            pr.add(_item_keys([it for it in g_items if it.get("sku") == sku]),
+                   _item_keys([it for it in p_items if it.get("sku") == sku]))
+        for g_sku, p_sku in _align_skus(g_items, p_items):
+            s.confusion.setdefault(g_sku, Counter())[p_sku] += 1
+        # 주문 유형은 gold에 있을 때만 채점(evalset의 대부분은 유형이 없음)
+        type_ok = True
+        if gold.get("type"):
+            s.type_total += 1
+            type_ok = pred.get("type") == gold["type"]
+            s.type_correct += int(type_ok)
+        if _exact_key(g_items) == _exact_key(p_items) and type_ok:
+            s.exact += 1
+        elif len(s.mismatches) < max_mismatches:
+            s.mismatches.append({"input": text, "gold": gold, "pred": pred})
+    return s
+
+
+def _percentile(sorted_us: List[float], q: float) -> float:
+    if not sorted_us:
+        return 0.0
+    return sorted_us[min(len(sorted_us) - 1, int(q * len(sorted_us)))]
+
+
+def build_report(s: Scores, lat: List[float], wall: float) -> dict:
+    us = sorted(v * 1e6 for v in lat)
+    summary = {
+        "utterances": s.n,
+        "item_precision": s.items.precision(),
+        "item_recall": s.items.recall(),
+        "option_precision": s.options.precision(),
+        "option_recall": s.options.recall(),
+        "exact_match": round(s.exact / s.n, 4) if s.n else 0.0,
+        "type_accuracy": round(s.type_correct / s.type_total, 4) if s.type_total else None,
+        "throughput": round(s.n / wall, 1) if wall > 0 else 0.0,
+        "p50_us": round(_percentile(us, 0.50), 2),
+        "p90_us": round(_percentile(us, 0.90), 2),
+        "p99_us": round(_percentile(us, 0.99), 2),
+        "seconds": round(wall, 4),
+    }
+    per_sku = {
+        sku: {"tp": pr.tp, "fp": pr.fp, "fn": pr.fn, "precision": pr.precision(), "recall": pr.recall()}
+        for sku, pr in sorted(s.per_sku.items())
+    }
+    # 대각선(정답)은 빼고 오분류만 남긴다
+    confusion = {
+        g: {p: c for p, c in sorted(row.items()) if p != g}
+        for g, row in sorted(s.confusion.items())
+    }
+    return {
+        "summary": summary,
+        "per_sku": per_sku,
+        "confusion": {g: row for g, row in confusion.items() if row},
+        "mismatches": s.mismatches,
+    }
+
+
+def compare(current: dict, baseline: dict, acc_drop: float = DEFAULT_ACC_DROP,
+            speed_drop: float = DEFAULT_SPEED_DROP) -> List[str]:
+    """이전 리포트 대비 정확도가 acc_drop(절대값) 넘게 떨어지거나 처리량이 speed_drop(비율) 넘게 떨어진 항목."""
+    cur, base = current.get("summary") or {}, baseline.get("summary") or {}
+    regressions: List[str] = []
+    for key in ACCURACY_KEYS:
+        if cur.get(key) is None or base.get(key) is None:
+            continue
+        if cur[key] < base[key] - acc_drop:
+            regressions.append(f"{key}: {base[key]:.4f} -> {cur[key]:.4f}")
+    if base.get("throughput") and cur.get("throughput", 0) < base["throughput"] * (1 - speed_drop):
+        regressions.append(f"throughput: {base['throughput']:,.0f} -> {cur['throughput']:,.0f}/s")
+    return regressions
+
+
+def _fmt(summary: dict) -> str:
+    type_acc = f", type {summary['type_accuracy']:.3f}" if summary.get("type_accuracy") is not None else ""
+    return (f"item P/R {summary['item_precision']:.3f}/{summary['item_recall']:.3f}, "
+            f"option P/R {summary['option_precision']:.3f}/{summary['option_recall']:.3f}, "
+            f"exact {summary['exact_match']:.3f}{type_acc} | "
+            f"{summary['throughput']:,.0f} utt/s, p50 {summary['p50_us']:.1f} us, p99 {summary['p99_us']:.1f} us")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--domain", default="cafe")
+    parser.add_argument("--gold", default="", help="gold JSONL(기본 outputs/{domain}/evalset.jsonl, corpus .gold.jsonl도 가능)")
+    parser.add_argument("--parser", default=DEFAULT_PARSER, help="평가할 파서 'module:function'")
+    parser.add_argument("--workers", type=int, default=1, help="파싱 프로세스 수")
+    parser.add_argument("--limit", type=int, default=0, help="앞쪽 N개만 평가(0 = 전체)")
+    parser.add_argument("--out", default="", help="리포트 JSON 경로(기본 outputs/{domain}/eval/eval_<시각>.json)")
+    parser.add_argument("--baseline", default="", help="비교할 이전 리포트 JSON")
+    parser.add_argument("--acc_drop", type=float, default=DEFAULT_ACC_DROP, help="정확도 회귀 판정(절대값)")
+    parser.add_argument("--speed_drop", type=float, default=DEFAULT_SPEED_DROP, help="처리량 회귀 판정 비율")
+    args = parser.parse_args()
+
+    paths = Paths(root=Path(__file__).resolve().parents[2])
+    gold_path = Path(args.gold) if args.gold else paths.outputs / args.domain / "evalset.jsonl"
+    gold_rows = load_gold(gold_path)
+    if args.limit > 0:
+        gold_rows = gold_rows[:args.limit]
+    preds, lat, wall = predict(paths, args.domain, [t for t, _ in gold_rows], args.parser, args.workers)
+    # 회귀 판정은 파서 원출력 점수로 한다. 04가 gold를 거른 것과 같은 옵션 제약을 건 점수는 참고용으로 나란히 기록
+    report = build_report(score(gold_rows, preds), lat, wall)
+    constraints = load_constraints(paths, args.domain)
+    if constraints is not None:
+        constrained = build_report(score(gold_rows, constrain(preds, constraints)), lat, wall)["summary"]
+        report["constrained"] = {key: constrained[key] for key in ACCURACY_KEYS}
+    stamp = dt.datetime.now(dt.timezone.utc)
+    report["meta"] = {
+        "domain": args.domain,
+        "gold": str(gold_path),
+        "parser": args.parser,
+        "workers": args.workers,
+        "generated_at": stamp.isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+    print(f"[Eval] {len(gold_rows)} utterances: {_fmt(report['summary'])}")
+    if "constrained" in report:
+        c = report["constrained"]
+        print(f"[Eval] with menu constraints: option P/R {c['option_precision']:.3f}/{c['option_recall']:.3f}, "
+              f"exact {c['exact_match']:.3f}")
+
+    out = Path(args.out) if args.out else paths.outputs / args.domain / "eval" / f"eval_{stamp:%Y%m%dT%H%M%SZ}.json"
+    write_json(out, report)
+    print(f"[Eval] saved -> {out}")
+
+    if args.baseline:
+        regressions = compare(report, load_json(Path(args.baseline)), args.acc_drop, args.speed_drop)
+        if regressions:
+            print(f"[Eval] {len(regressions)} regressions vs {args.baseline}:")
+            for line in regressions:
+                print(f"  {line}")
+            raise SystemExit(1)
+        print(f"[Eval] no regressions vs {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import argparse
+import re
+import time
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from src.utils.io import Paths, iter_jsonl_lines
+from src.utils.parse import split_order_segments
+from src.utils.quantity import KOR_NUM_MAP, default_quantity_parser
+
+
+def legacy_parse_quantity(text: str) -> Optional[int]:
+    # 비교 기준: 컴파일 파서 도입 이전 구현(호출마다 정렬 + 토큰별 정규식)
+    t = text.strip()
+    m = re.search(r"(\d{1,3})\s*(잔|개|병|세트|컵)", t)
+    if m:
+        return int(m.group(1))
+    for tok, val in sorted(KOR_NUM_MAP.items(), key=lambda x: -len(x[0])):
+        if re.search(fr"{tok}\s*(잔|개|병|세트|컵)", t):
+            return val
+    m = re.search(r"\b(\d{1,3})\b", t)
+    if m:
+        return int(m.group(1))
+    return None
+
+
+def time_calls(fn: Callable[[str], Optional[int]], texts: List[str], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for t in texts:
+            fn(t)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--domain", default="cafe")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    paths = Paths(root=Path(__file__).resolve().parents[2])
+    evalset = paths.outputs / args.domain / "evalset.jsonl"
+    texts: List[str] = []
+    for row in iter_jsonl_lines(evalset):
+        texts.extend(split_order_segments(str(row.get("input", ""))))
+
+    compiled = default_quantity_parser()
+    diffs = [(t, legacy_parse_quantity(t), compiled(t)) for t in texts]
+    diffs = [d for d in diffs if d[1] != d[2]]
+
+    legacy_s = time_calls(legacy_parse_quantity, texts, args.repeat)
+    compiled_s = time_calls(compiled, texts, args.repeat)
+    calls = len(texts) * args.repeat
+    print(f"[Bench] quantity segments={len(texts)} calls={calls}")
+    print(f"  legacy   : {legacy_s * 1e6 / calls:8.2f} us/call")
+    print(f"  compiled : {compiled_s * 1e6 / calls:8.2f} us/call  (x{legacy_s / compiled_s:.1f})")
+    print(f"  differing results: {len(diffs)}")
+    for t, old, new in diffs[:10]:
+        print(f"    {old!r:>5} -> {new!r:<5} {t}")
+
+
+if __name__ == "__main__":
+    main()
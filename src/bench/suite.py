@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import importlib
+import json
+import platform
+import tempfile
+import time
+import tracemalloc
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from src.bench.corpus import build_spec, generate_utterances
+from src.utils.constraints import MenuConstraints
+from src.utils.io import Paths, iter_jsonl_lines, load_yaml, write_json
+from src.utils.menu import MenuMapping, find_sku_by_text, load_combined_mapping
+from src.utils.parse import parse_order_items, split_order_segments
+from src.utils.quantity import compile_quantity_parser
+from src.utils.slots import compile_slot_extractor
+from src.utils.textnorm import compile_normalizer
+from src.utils.validation import load_json, validate_jsonl_files
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+# 비교 지표: 처리량은 낮아지면, p99는 높아지면 회귀
+DEFAULT_THRESHOLD = 0.15
+
+
+def evalset_inputs(paths: Paths, domain: str) -> List[str]:
+    return [str(row.get("input", "")) for row in iter_jsonl_lines(paths.outputs / domain / "evalset.jsonl")]
+
+
+def synthetic_corpus(paths: Paths, domain: str, n: int, seed: int = 0) -> List[str]:
+    """src.bench.corpus 생성기로 주문 발화 n개를 만든다(seed 고정, 기본 노이즈)."""
+    spec = build_spec(paths, domain)
+    return [text for text, _ in generate_utterances(spec, n, seed=seed)]
+
+
+def _percentile(sorted_us: List[float], q: float) -> float:
+    if not sorted_us:
+        return 0.0
+    return sorted_us[min(len(sorted_us) - 1, int(q * len(sorted_us)))]
+
+
+def bench_calls(fn: Callable[[object], object], inputs: List[object], memory: bool = True,
+                warmup: int = 100) -> Dict[str, float]:
+    """호출 단위로 시간을 재서 처리량과 p50/p99(us)를 구한다. memory면 별도 패스로 tracemalloc 피크(MB).
+
+    앞쪽 warmup개 입력으로 지연 초기화(파서 컴파일, 매처 생성 등)를 먼저 끝낸 뒤 측정한다.
+    """
+    for x in inputs[:warmup]:
+        fn(x)
+    lat = array("d")
+    clock = time.perf_counter
+    started = clock()
+    for x in inputs:
+        t = clock()
+        fn(x)
+        lat.append(clock() - t)
+    total = clock() - started
+    us = sorted(v * 1e6 for v in lat)
+    result = {
+        "calls": len(inputs),
+        "seconds": round(total, 4),
+        "throughput": round(len(inputs) / total, 1) if total > 0 else 0.0,
+        "p50_us": round(_percentile(us, 0.50), 2),
+        "p99_us": round(_percentile(us, 0.99), 2),
+    }
+    if memory:
+        # 시간 측정과 분리(tracemalloc은 호출을 크게 느리게 함)
+        tracemalloc.start()
+        for x in inputs:
+            fn(x)
+        result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 3)
+        tracemalloc.stop()
+    return result
+
+
+def raw_frame(texts: List[str]) -> pd.DataFrame:
+    """filter_orderlike 입력용 원천 스키마 프레임(절반은 직원/답변 발화로 섞음)."""
+    n = len(texts)
+    return pd.DataFrame({
+        "발화자": ["c" if i % 2 == 0 else "s" for i in range(n)],
+        "발화문": texts,
+        "카테고리": ["카페"] * n,
+        "QA여부": ["q" if i % 4 != 3 else "a" for i in range(n)],
+        "상담번호": [i // 8 for i in range(n)],
+        "상담내순번": [i % 8 for i in range(n)],
+    })
+
+
+def write_gold_jsonl(path: Path, texts: List[str], mapping: MenuMapping) -> int:
+    n = 0
+    with path.open("w", encoding="utf-8") as f:
+        for t in texts:
+            items = parse_order_items(t, mapping, mapping.aliases)
+            if items:
+                f.write(json.dumps({"input": t, "gold": {"order": {"items": items}}}, ensure_ascii=False))
+                f.write("\n")
+                n += 1
+    return n
+
+
+def run_suite(paths: Paths, domain: str, sizes: Iterable[int], repeat: int = 3, memory: bool = True,
+              only: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    patterns = load_yaml(paths.configs / "patterns.yml") or {}
+    # 스테이지와 같은 조건(매칭 전 patterns.yml 정규화)으로 잰다
+    mapping = load_combined_mapping(paths.configs / f"menu.{domain}.yml", paths.configs / f"aliases.{domain}.yml",
+                                    compile_normalizer(patterns), jamo_fuzzy=True,
+                                    slot_extractor=compile_slot_extractor(patterns),
+                                    quantity_parser=compile_quantity_parser(patterns))
+    filter_orderlike = importlib.import_module("src.etl.01_filter_orders").filter_orderlike
+    menu_json = load_json(paths.outputs / domain / "menu.json")
+    constraints = MenuConstraints.from_menu_json(menu_json)
+    corpora: Dict[str, List[str]] = {"evalset": evalset_inputs(paths, domain)}
+    for n in sizes:
+        corpora[str(n)] = synthetic_corpus(paths, domain, n, seed=n)
+
+    def wanted(name: str) -> bool:
+        return not only or name in only
+
+    results: Dict[str, Dict[str, float]] = {}
+    for label, texts in corpora.items():
+        segments = [s for t in texts for s in split_order_segments(t)]
+        cases: Dict[str, tuple] = {
+            "parse_order_items": (lambda t: parse_order_items(t, mapping, mapping.aliases), texts),
+            "find_sku_by_text": (lambda s: find_sku_by_text(s, mapping), segments),
+            "parse_quantity": (mapping.quantity_parser, segments),
+            "split_order_segments": (split_order_segments, texts),
+        }
+        for name, (fn, inputs) in cases.items():
+            if wanted(name):
+                results[f"{name}@{label}"] = bench_calls(fn, inputs, memory=memory)
+                print(f"[Bench] {name}@{label}: {_fmt(results[f'{name}@{label}'])}")
+
+        # 프레임/파일 단위 작업은 반복 호출의 지연 분포로 본다(처리량은 행/줄 기준)
+        if wanted("filter_orderlike"):
+            df = raw_frame(texts)
+            r = bench_calls(lambda d: filter_orderlike(d, patterns), [df] * repeat, memory=memory, warmup=1)
+            r["throughput"] = round(len(df) * repeat / r["seconds"], 1) if r["seconds"] > 0 else 0.0
+            results[f"filter_orderlike@{label}"] = r
+            print(f"[Bench] filter_orderlike@{label}: {_fmt(r)}")
+        if wanted("validate_jsonl"):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = Path(tmp) / "evalset.jsonl"
+                lines = write_gold_jsonl(path, texts, mapping)
+                files = {"evalset": (path, "evalset.schema.json")}
+                r = bench_calls(lambda f: validate_jsonl_files(f, paths.configs, constraints), [files] * repeat,
+                                memory=memory, warmup=1)
+                r["throughput"] = round(lines * repeat / r["seconds"], 1) if r["seconds"] > 0 else 0.0
+            results[f"validate_jsonl@{label}"] = r
+            print(f"[Bench] validate_jsonl@{label}: {_fmt(r)}")
+    return results
+
+
+def _fmt(r: Dict[str, float]) -> str:
+    mem = f", peak {r['peak_mb']:.3f} MB" if "peak_mb" in r else ""
+    return f"{r['throughput']:,.0f}/s, p50 {r['p50_us']:.1f} us, p99 {r['p99_us']:.1f} us{mem}"
+
+
+def compare(current: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """baseline 대비 처리량이 threshold 넘게 떨어지거나 p99가 threshold 넘게 오른 항목."""
+    regressions: List[str] = []
+    for key, cur in current.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if base.get("throughput") and cur["throughput"] < base["throughput"] * (1 - threshold):
+            regressions.append(f"{key}: throughput {base['throughput']:,.0f} -> {cur['throughput']:,.0f}/s")
+        if base.get("p99_us") and cur["p99_us"] > base["p99_us"] * (1 + threshold):
+            regressions.append(f"{key}: p99 {base['p99_us']:.1f} -> {cur['p99_us']:.1f} us")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--domain", default="cafe")
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES), help="합성 코퍼스 크기(쉼표 구분)")
+    parser.add_argument("--only", default="", help="실행할 벤치마크 이름(쉼표 구분, 기본 전체)")
+    parser.add_argument("--repeat", type=int, default=3, help="filter/validate 반복 횟수")
+    parser.add_argument("--skip_memory", action="store_true", help="tracemalloc 피크 측정 생략")
+    parser.add_argument("--out", default="", help="결과 JSON 경로(기본 outputs/bench/bench_<시각>.json)")
+    parser.add_argument("--baseline", default="", help="비교할 이전 결과 JSON")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="회귀 판정 비율(0.15 = 15%)")
+    args = parser.parse_args()
+
+    paths = Paths(root=Path(__file__).resolve().parents[2])
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    only = [s.strip() for s in args.only.split(",") if s.strip()] or None
+    results = run_suite(paths, args.domain, sizes, repeat=args.repeat, memory=not args.skip_memory, only=only)
+
+    stamp = dt.datetime.now(dt.timezone.utc)
+    out = Path(args.out) if args.out else paths.outputs / "bench" / f"bench_{stamp:%Y%m%dT%H%M%SZ}.json"
+    write_json(out, {
+        "meta": {
+            "domain": args.domain,
+            "generated_at": stamp.isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": sizes,
+        },
+        "results": results,
+    })
+    print(f"[Bench] saved -> {out}")
+
+    if args.baseline:
+        baseline = load_json(Path(args.baseline)).get("results") or {}
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"[Bench] {len(regressions)} regressions over {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            raise SystemExit(1)
+        print(f"[Bench] no regressions over {args.threshold:.0%} vs {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,21 @@
 import argparse
+from pathlib import Path
+
+from src.utils.io import Paths
+from src.utils.metrics import instrumented
+
+
+def eda_report(domain: str) -> None:
+    print(f"[EDA] domain={domain} (stub)")
+
 
 def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("--domain", required=True)
+    parser.add_argument("--profile", action="store_true", help="cProfile 결과를 outputs/{domain}/profile/에 저장")
     args = parser.parse_args()
-    print(f"[EDA] domain={args.domain} (stub)")
+    paths = Paths(root=Path(__file__).resolve().parents[2])
+    instrumented(paths, args.domain, "00_eda_report", lambda: eda_report(args.domain), profile=args.profile)()
 
 if __name__ == "__main__":
     main()
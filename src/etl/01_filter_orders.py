@@ -2,37 +2,127 @@ from __future__ import annotations
 
 import argparse
 import re
+import time
 from pathlib import Path
+from typing import Iterator, List, Optional
 
 import pandas as pd
 
-from src.utils.io import Paths, load_yaml
+from src.utils.buildstate import BuildState, StageSpec, run_incremental, stage_code
+from src.utils.io import Paths, TableWriter, load_yaml, require_pyarrow, to_categorical, write_table
+from src.utils.metrics import instrumented, peak_rss_mb, set_rows
 
 
-def load_domain_csvs(paths: Paths, domain: str) -> pd.DataFrame:
-    glob = list((paths.data_raw).glob(f"{domain}_*.csv"))
+RAW_DTYPE = {
+    "IDX": "Int64",
+    "발화자": "string",
+    "발화문": "string",
+    "카테고리": "string",
+    "QA번호": "Int64",
+    "QA여부": "string",
+    "감성": "string",
+    "인텐트": "string",
+    "개체명": "string",
+    "상담번호": "Int64",
+    "상담내순번": "Int64",
+}
+
+
+def domain_csv_paths(paths: Paths, domain: str) -> List[Path]:
+    glob = sorted((paths.data_raw).glob(f"{domain}_*.csv"))
     if not glob:
         raise FileNotFoundError(f"no raw CSVs for domain={domain} under {paths.data_raw}")
-    dtype = {
-        "IDX": "Int64",
-        "발화자": "string",
-        "발화문": "string",
-        "카테고리": "string",
-        "QA번호": "Int64",
-        "QA여부": "string",
-        "감성": "string",
-        "인텐트": "string",
-        "개체명": "string",
-        "상담번호": "Int64",
-        "상담내순번": "Int64",
-    }
-    frames = [pd.read_csv(p, dtype=dtype) for p in glob]
+    return glob
+
+
+def domain_parquet_paths(paths: Paths, domain: str) -> List[Path]:
+    return sorted((paths.data_raw).glob(f"{domain}_*.parquet"))
+
+
+def _parquet_fresh(csv_path: Path) -> bool:
+    pq_path = csv_path.with_suffix(".parquet")
+    return pq_path.exists() and pq_path.stat().st_mtime >= csv_path.stat().st_mtime
+
+
+def raw_parquet_paths(paths: Paths, domain: str) -> List[Path]:
+    """CSV마다 최신 Parquet 변환본이 있으면 그 목록(CSV 순서). 하나라도 없거나 낡았으면 []: CSV를 그대로 읽는다."""
+    csvs = domain_csv_paths(paths, domain)
+    if not all(_parquet_fresh(p) for p in csvs):
+        return []
+    return [p.with_suffix(".parquet") for p in csvs]
+
+
+def convert_raw_to_parquet(paths: Paths, domain: str, chunksize: int) -> List[Path]:
+    """원천 CSV를 Parquet(categorical 열은 dictionary 인코딩)으로 변환. 없거나 CSV보다 오래된 변환본만 다시 만들고 그 목록을 돌려준다."""
+    out: List[Path] = []
+    for csv_path in domain_csv_paths(paths, domain):
+        if _parquet_fresh(csv_path):
+            continue
+        pq_path = csv_path.with_suffix(".parquet")
+        with TableWriter(pq_path) as w:
+            for chunk in pd.read_csv(csv_path, dtype=RAW_DTYPE, chunksize=chunksize):
+                w.write(chunk)
+        out.append(pq_path)
+    return out
+
+
+def prepare_raw(paths: Paths, domain: str, chunksize: int, convert: bool = False) -> None:
+    """Parquet 변환본을 쓰는 도메인(변환본이 하나라도 있거나 convert)이면 낡거나 빠진 변환본을 갱신한다.
+
+    입력 해시 계산(stage_spec) 전에 부른다. 새로 추가·수정한 CSV가 낡은 Parquet에 가려지지 않게 하기 위함.
+    """
+    if not convert and not domain_parquet_paths(paths, domain):
+        return
+    refreshed = convert_raw_to_parquet(paths, domain, chunksize)
+    if refreshed:
+        print(f"[Filter] raw parquet refreshed: {', '.join(p.name for p in refreshed)}")
+
+
+def _pushdown_filter(patterns: dict):
+    # 발화자/QA/카테고리 조건을 Parquet 리더에 밀어 넣는다(정규식 게이트는 pandas에서)
+    import pyarrow.dataset as ds
+    filters = (patterns.get("filters") or {}) if isinstance(patterns, dict) else {}
+    expr = (ds.field("발화자") == str(filters.get("require_speaker", "c"))) & \
+        (ds.field("QA여부") == str(filters.get("require_qa", "q")))
+    cats = filters.get("category_whitelist") or []
+    if cats:
+        expr = expr & ds.field("카테고리").isin(cats)
+    return expr
+
+
+def _raw_dataset(files: List[Path]):
+    require_pyarrow()
+    import pyarrow.dataset as ds
+    return ds.dataset([str(p) for p in files], format="parquet")
+
+
+def load_domain_csvs(paths: Paths, domain: str) -> pd.DataFrame:
+    frames = [pd.read_csv(p, dtype=RAW_DTYPE) for p in domain_csv_paths(paths, domain)]
     df = pd.concat(frames, ignore_index=True)
     return df
 
 
+def load_domain_raw(paths: Paths, domain: str, patterns: dict) -> pd.DataFrame:
+    """원천 로드. 모든 CSV에 최신 Parquet 변환본이 있으면 발화자/QA/카테고리 필터를 리더에 pushdown."""
+    files = raw_parquet_paths(paths, domain)
+    if files:
+        return _raw_dataset(files).to_table(filter=_pushdown_filter(patterns)).to_pandas()
+    return load_domain_csvs(paths, domain)
+
+
+def iter_domain_chunks(paths: Paths, domain: str, chunksize: int, patterns: Optional[dict] = None) -> Iterator[pd.DataFrame]:
+    # 파일별 chunk 단위 읽기: 메모리 상한 ~ chunksize 행
+    files = raw_parquet_paths(paths, domain) if patterns is not None else []
+    if files:
+        for batch in _raw_dataset(files).to_batches(filter=_pushdown_filter(patterns), batch_size=chunksize):
+            yield batch.to_pandas()
+        return
+    for p in domain_csv_paths(paths, domain):
+        yield from pd.read_csv(p, dtype=RAW_DTYPE, chunksize=chunksize)
+
+
 def filter_orderlike(df: pd.DataFrame, patterns: dict) -> pd.DataFrame:
-    df = df.copy()
+    # boolean 인덱싱이 새 프레임을 만들므로 사전 copy는 하지 않는다
     filters = (patterns.get("filters") or {}) if isinstance(patterns, dict) else {}
     speaker = str(filters.get("require_speaker", "c"))
     qa = str(filters.get("require_qa", "q"))
@@ -57,20 +147,76 @@ def filter_orderlike(df: pd.DataFrame, patterns: dict) -> pd.DataFrame:
     return df[mask]
 
 
+def stream_filter_orderlike(paths: Paths, domain: str, patterns: dict, out_path: Path, chunksize: int) -> tuple[int, int]:
+    """chunk 단위로 필터링해 생존 행만 out_path(.csv/.parquet)에 이어 쓴다. (읽은 행 수, 출력 행 수)"""
+    rows_in = rows_out = 0
+    with TableWriter(out_path) as w:
+        for chunk in iter_domain_chunks(paths, domain, chunksize, patterns):
+            rows_in += len(chunk)
+            kept = filter_orderlike(chunk, patterns)
+            w.write(kept)
+            rows_out += len(kept)
+    return rows_in, rows_out
+
+
+def stage_spec(paths: Paths, domain: str, fmt: str = "csv") -> StageSpec:
+    # 원천 CSV 세트와 그 Parquet 변환본(size+mtime 지문 캐시) + patterns.yml
+    csvs = domain_csv_paths(paths, domain)
+    parquets = [p.with_suffix(".parquet") for p in csvs if p.with_suffix(".parquet").exists()]
+    return StageSpec(
+        files=csvs + parquets + [paths.configs / "patterns.yml"],
+        outputs=[paths.data_interim / f"{domain}_orders.{fmt}"],
+        params={"format": fmt},
+        code=stage_code(__file__),
+    )
+
+
+def filter_orders(paths: Paths, domain: str, patterns: dict, stream: bool = False, chunksize: int = 200_000,
+                  fmt: str = "csv") -> Optional[pd.DataFrame]:
+    """01 단계 본체. 필터 결과를 interim에 쓰고, 메모리에 올린 경우(비스트리밍) 그 프레임을 돌려준다.
+
+    원천 Parquet 갱신은 호출 측이 stage_spec 전에 prepare_raw로 한다.
+    """
+    out_path = paths.data_interim / f"{domain}_orders.{fmt}"
+    started = time.perf_counter()
+    filtered: Optional[pd.DataFrame] = None
+    if stream:
+        rows_in, rows_out = stream_filter_orderlike(paths, domain, patterns, out_path, chunksize)
+    else:
+        df = load_domain_raw(paths, domain, patterns)
+        filtered = filter_orderlike(df, patterns)
+        if fmt == "parquet":
+            filtered = to_categorical(filtered)
+        write_table(out_path, filtered)
+        rows_in, rows_out = len(df), len(filtered)
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    set_rows(rows_in, rows_out)
+    print(f"[Filter] saved {rows_out} rows -> {out_path}")
+    print(f"[Filter] read {rows_in} rows in {elapsed:.2f}s ({rows_in / elapsed:,.0f} rows/s), peak RSS {peak_rss_mb():.0f} MB")
+    return filtered
+
+
 def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("--domain", required=True)
+    parser.add_argument("--stream", action="store_true", help="chunk 단위 스트리밍(메모리 상한 고정)")
+    parser.add_argument("--chunksize", type=int, default=200_000, help="--stream 시 chunk 행 수")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="interim 포맷(parquet은 pyarrow 필요)")
+    parser.add_argument("--convert_raw", action="store_true", help="원천 CSV를 1회 Parquet으로 변환 후 필터 pushdown")
+    parser.add_argument("--force", action="store_true", help="입력 해시가 같아도 다시 실행")
+    parser.add_argument("--profile", action="store_true", help="cProfile 결과를 outputs/{domain}/profile/에 저장")
     args = parser.parse_args()
 
     paths = Paths(root=Path(__file__).resolve().parents[2])
-    df = load_domain_csvs(paths, args.domain)
     patterns = load_yaml(paths.configs / "patterns.yml") or {}
-    filtered = filter_orderlike(df, patterns)
-
-    out_path = paths.data_interim / f"{args.domain}_orders.csv"
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    filtered.to_csv(out_path, index=False)
-    print(f"[Filter] saved {len(filtered)} rows -> {out_path}")
+    # 변환본 갱신이 입력 해시보다 먼저여야 같은 입력으로 두 번 돌지 않는다
+    prepare_raw(paths, args.domain, args.chunksize, convert=args.convert_raw)
+    run_incremental(BuildState.for_domain(paths, args.domain), "01_filter_orders", stage_spec(paths, args.domain, args.format),
+                    instrumented(paths, args.domain, "01_filter_orders",
+                                 lambda: filter_orders(paths, args.domain, patterns, stream=args.stream,
+                                                       chunksize=args.chunksize, fmt=args.format),
+                                 profile=args.profile),
+                    force=args.force)
 
 
 if __name__ == "__main__":
@@ -2,9 +2,11 @@ from __future__ import annotations
 
 import argparse
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
 
+from src.utils.buildstate import BuildState, StageSpec, run_incremental, stage_code
 from src.utils.io import Paths, write_json
+from src.utils.metrics import instrumented, set_rows
 from src.utils.menu import load_aliases_map
 
 
@@ -50,13 +52,14 @@ def _normalize_alias_apply(apply: dict) -> dict:
     return out
 
 
-def main() -> None:
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--domain", required=True)
-    args = parser.parse_args()
+def stage_spec(paths: Paths, domain: str) -> StageSpec:
+    return StageSpec(files=[paths.configs / f"aliases.{domain}.yml"], outputs=[paths.outputs / domain / "aliases.json"],
+                     code=stage_code(__file__))
 
-    paths = Paths(root=Path(__file__).resolve().parents[2])
-    aliases_map = load_aliases_map(paths.configs / f"aliases.{args.domain}.yml")
+
+def build_aliases(paths: Paths, domain: str, aliases_map: Optional[Dict[str, dict]] = None) -> Dict[str, dict]:
+    if aliases_map is None:
+        aliases_map = load_aliases_map(paths.configs / f"aliases.{domain}.yml")
 
     out_obj: Dict[str, dict] = {}
     for term, apply in aliases_map.items():
@@ -65,10 +68,26 @@ def main() -> None:
             continue
         out_obj[term] = normalized
 
-    out_dir = paths.outputs / args.domain
+    out_dir = paths.outputs / domain
     out_dir.mkdir(parents=True, exist_ok=True)
     write_json(out_dir / "aliases.json", out_obj)
+    set_rows(len(aliases_map), len(out_obj))
     print(f"[Aliases] saved {len(out_obj)} aliases -> {out_dir / 'aliases.json'}")
+    return out_obj
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--domain", required=True)
+    parser.add_argument("--force", action="store_true", help="입력 해시가 같아도 다시 실행")
+    parser.add_argument("--profile", action="store_true", help="cProfile 결과를 outputs/{domain}/profile/에 저장")
+    args = parser.parse_args()
+
+    paths = Paths(root=Path(__file__).resolve().parents[2])
+    run_incremental(BuildState.for_domain(paths, args.domain), "02_build_aliases", stage_spec(paths, args.domain),
+                    instrumented(paths, args.domain, "02_build_aliases", lambda: build_aliases(paths, args.domain),
+                                 profile=args.profile),
+                    force=args.force)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+from typing import Optional
+
+from src.utils.buildstate import BuildState, StageSpec, run_incremental, stage_code
+from src.utils.io import Paths, file_sha256, load_yaml
+from src.utils.menu import MenuMapping, load_combined_mapping
+from src.utils.menu_index import write_menu_index
+from src.utils.metrics import instrumented, set_rows
+from src.utils.quantity import compile_quantity_parser
+from src.utils.slots import compile_slot_extractor
+from src.utils.textnorm import compile_normalizer
+from src.utils.validation import load_json
+
+
+def stage_spec(paths: Paths, domain: str) -> StageSpec:
+    out_dir = paths.outputs / domain
+    return StageSpec(
+        files=[paths.configs / f"menu.{domain}.yml", paths.configs / f"aliases.{domain}.yml",
+               paths.configs / "patterns.yml", out_dir / "menu.json", out_dir / "aliases.json"],
+        outputs=[out_dir / "menu_index.bin"],
+        code=stage_code(__file__),
+    )
+
+
+def build_index(paths: Paths, domain: str, mapping: Optional[MenuMapping] = None,
+                menu_json: Optional[dict] = None, aliases_json: Optional[dict] = None,
+                patterns: Optional[dict] = None) -> Path:
+    out_dir = paths.outputs / domain
+    menu_p = out_dir / "menu.json"
+    aliases_p = out_dir / "aliases.json"
+    if menu_json is None or aliases_json is None:
+        if not menu_p.exists() or not aliases_p.exists():
+            raise FileNotFoundError("menu.json/aliases.json not found. Run export menu/aliases steps first.")
+        menu_json = load_json(menu_p) if menu_json is None else menu_json
+        aliases_json = load_json(aliases_p) if aliases_json is None else aliases_json
+    # phrase(표시명/alt/별칭, 신뢰도)와 전처리기는 configs 기준(03/04와 같은 매핑), 제약/암시 옵션은 런타임 JSON 기준
+    if patterns is None:
+        patterns = load_yaml(paths.configs / "patterns.yml") or {}
+    if mapping is None:
+        mapping = load_combined_mapping(paths.configs / f"menu.{domain}.yml", paths.configs / f"aliases.{domain}.yml",
+                                        compile_normalizer(patterns), jamo_fuzzy=True,
+                                        slot_extractor=compile_slot_extractor(patterns),
+                                        quantity_parser=compile_quantity_parser(patterns))
+    out_path = out_dir / "menu_index.bin"
+    write_menu_index(out_path, mapping, menu_json, aliases_json, patterns)
+    set_rows(rows_out=len(mapping.phrase_to_sku) + len(mapping.aliases))
+    print(f"[Index] saved {file_sha256(out_path)} -> {out_path}")
+    return out_path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--domain", required=True)
+    parser.add_argument("--force", action="store_true", help="입력 해시가 같아도 다시 실행")
+    parser.add_argument("--profile", action="store_true", help="cProfile 결과를 outputs/{domain}/profile/에 저장")
+    args = parser.parse_args()
+
+    paths = Paths(root=Path(__file__).resolve().parents[2])
+    run_incremental(BuildState.for_domain(paths, args.domain), "02_build_index", stage_spec(paths, args.domain),
+                    instrumented(paths, args.domain, "02_build_index", lambda: build_index(paths, args.domain),
+                                 profile=args.profile),
+                    force=args.force)
+
+
+if __name__ == "__main__":
+    main()
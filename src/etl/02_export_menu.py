@@ -2,13 +2,16 @@ from __future__ import annotations
 
 import argparse
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
+from src.utils.buildstate import BuildState, StageSpec, run_incremental, stage_code
+from src.utils.constraints import compile_constraints
 from src.utils.io import Paths, load_yaml, write_json
+from src.utils.metrics import instrumented, set_rows
 
 
 def compile_menu(menu_yaml: dict) -> Dict[str, Any]:
-    # 메뉴 YAML을 런타임 친화 JSON으로 변환 (불필요한 정책/주석 제거)
+    # 메뉴 YAML을 런타임 친화 JSON으로 변환 (가격/주석 등 정책 원문은 제거, 옵션 정책은 constraints 표로)
     result: Dict[str, Any] = {"version": menu_yaml.get("version", "0.1.0"), "items": []}
     items = menu_yaml.get("items") or []
     for it in items:
@@ -25,25 +28,43 @@ def compile_menu(menu_yaml: dict) -> Dict[str, Any]:
             out["base_price"] = it["base_price"]
         if it.get("sizes_enabled") is not None:
             out["sizes_enabled"] = bool(it.get("sizes_enabled"))
-        # allow_options 제한은 참고용으로 포함
         if isinstance(it.get("allow_options"), list):
             out["allow_options"] = it["allow_options"]
         result["items"].append(out)
+    # tags/applies_to_tags/deny_options 정책은 SKU별 비트마스크 표로 해석해 싣는다(src/utils/constraints.py)
+    result["constraints"] = compile_constraints([it for it in items if isinstance(it, dict)], menu_yaml.get("options"))
     return result
 
 
+def stage_spec(paths: Paths, domain: str) -> StageSpec:
+    return StageSpec(files=[paths.configs / f"menu.{domain}.yml"], outputs=[paths.outputs / domain / "menu.json"],
+                     code=stage_code(__file__))
+
+
+def export_menu(paths: Paths, domain: str, menu_yaml: Optional[dict] = None) -> Dict[str, Any]:
+    if menu_yaml is None:
+        menu_yaml = load_yaml(paths.configs / f"menu.{domain}.yml")
+    compiled = compile_menu(menu_yaml)
+    out_dir = paths.outputs / domain
+    out_dir.mkdir(parents=True, exist_ok=True)
+    write_json(out_dir / "menu.json", compiled)
+    set_rows(len(menu_yaml.get("items") or []), len(compiled.get("items") or []))
+    print(f"[Menu] exported -> {out_dir / 'menu.json'}")
+    return compiled
+
+
 def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("--domain", required=True)
+    parser.add_argument("--force", action="store_true", help="입력 해시가 같아도 다시 실행")
+    parser.add_argument("--profile", action="store_true", help="cProfile 결과를 outputs/{domain}/profile/에 저장")
     args = parser.parse_args()
 
     paths = Paths(root=Path(__file__).resolve().parents[2])
-    menu_yaml = load_yaml(paths.configs / f"menu.{args.domain}.yml")
-    compiled = compile_menu(menu_yaml)
-    out_dir = paths.outputs / args.domain
-    out_dir.mkdir(parents=True, exist_ok=True)
-    write_json(out_dir / "menu.json", compiled)
-    print(f"[Menu] exported -> {out_dir / 'menu.json'}")
+    run_incremental(BuildState.for_domain(paths, args.domain), "02_export_menu", stage_spec(paths, args.domain),
+                    instrumented(paths, args.domain, "02_export_menu", lambda: export_menu(paths, args.domain),
+                                 profile=args.profile),
+                    force=args.force)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+from typing import List, Optional
+
+from src.utils.buildstate import BuildState, StageSpec, run_incremental, stage_code
+from src.utils.fewshot_index import write_fewshot_index
+from src.utils.io import Paths, file_sha256
+from src.utils.metrics import instrumented, set_rows
+
+
+def stage_spec(paths: Paths, domain: str) -> StageSpec:
+    out_dir = paths.outputs / domain
+    return StageSpec(
+        files=[out_dir / "few_shots.jsonl"],
+        outputs=[out_dir / "few_shots.index.bin"],
+        code=stage_code(__file__),
+    )
+
+
+def build_fewshot_index(paths: Paths, domain: str, rows: Optional[List[dict]] = None) -> Path:
+    """few_shots.jsonl의 input으로 문자 n-gram BM25 검색 인덱스를 만든다(원본 줄은 인덱스에 그대로 보관)."""
+    out_dir = paths.outputs / domain
+    few_p = out_dir / "few_shots.jsonl"
+    if rows is None:
+        if not few_p.exists():
+            raise FileNotFoundError("few_shots.jsonl not found. Run build fewshots step first.")
+        lines = [line for line in few_p.read_text(encoding="utf-8").splitlines() if line.strip()]
+        rows = [json.loads(line) for line in lines]
+    else:
+        lines = [json.dumps(r, ensure_ascii=False) for r in rows]
+    out_path = out_dir / "few_shots.index.bin"
+    write_fewshot_index(out_path, rows, lines)
+    set_rows(len(rows), len(rows))
+    print(f"[FewShotIndex] saved {file_sha256(out_path)} -> {out_path}")
+    return out_path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--domain", required=True)
+    parser.add_argument("--force", action="store_true", help="입력 해시가 같아도 다시 실행")
+    parser.add_argument("--profile", action="store_true", help="cProfile 결과를 outputs/{domain}/profile/에 저장")
+    args = parser.parse_args()
+
+    paths = Paths(root=Path(__file__).resolve().parents[2])
+    run_incremental(BuildState.for_domain(paths, args.domain), "03_build_fewshot_index", stage_spec(paths, args.domain),
+                    instrumented(paths, args.domain, "03_build_fewshot_index",
+                                 lambda: build_fewshot_index(paths, args.domain), profile=args.profile),
+                    force=args.force)
+
+
+if __name__ == "__main__":
+    main()
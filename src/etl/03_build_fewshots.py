@@ -2,49 +2,116 @@ from __future__ import annotations
 
 import argparse
 import json
+from contextlib import ExitStack
 from pathlib import Path
 from typing import Dict, List
 
+import numpy as np
 import pandas as pd
 
-from src.utils.io import Paths, write_jsonl, load_yaml
-from src.utils.menu import load_combined_mapping, has_menu_phrase, load_aliases_map
+from src.utils.buildstate import BuildState, StageSpec, run_incremental, stage_code
+from src.utils.constraints import MenuConstraints
+from src.utils.io import Paths, interim_file, read_interim, write_jsonl, load_yaml
+from src.utils.menu import MenuMapping, fuzzy_stats, load_combined_mapping, has_menu_phrase
+from src.utils.metrics import count, instrumented, set_rows
 from src.utils.validation import load_json
-from src.utils.parse import detect_sku, detect_size, detect_temp, parse_quantity, parse_order_items
+from src.utils.parallel import ParallelParser
+from src.utils.parse import parse_order, parse_order_items_batch
+from src.utils.parse_cache import ParseCache
+from src.utils.sampling import (StratifiedSampler, dedupe_utterances, interim_pool, make_quotas, sample_stream,
+                                seeded_texts)
+from src.utils.quantity import compile_quantity_parser
+from src.utils.slots import compile_slot_extractor
+from src.utils.textnorm import compile_normalizer
 
 
-def to_order_or_ask(text: str, menu_mapping) -> Dict:
+INTERIM_COLUMNS = ["발화문", "상담번호", "상담내순번"]
+
+
+def to_order_or_ask(text: str, menu_mapping, aliases_map: Dict | None = None, order: Dict | None = None) -> Dict:
     t = text
-    items = parse_order_items(t, menu_mapping)
-    if not items:
+    if order is None:
+        order = parse_order(t, menu_mapping, aliases_map)
+    if not order["items"]:
         missing = ["sku"]
         return {
             "label": "ASK",
             "missing_slots": missing,
             "question": "메뉴와 (ICE/HOT), 사이즈(S/M/L)를 알려주세요.",
         }
-    return {"label": "ORDER_DRAFT", "target": {"order": {"items": items}}}
+    return {"label": "ORDER_DRAFT", "target": {"order": order}}
 
 
-def main() -> None:
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--domain", required=True)
-    parser.add_argument("--k", type=int, default=50)
-    parser.add_argument("--only_order_draft", action="store_true", help="ASK 샘플 제외")
-    parser.add_argument("--max_ask_ratio", type=float, default=0.4, help="ASK 최대 비율")
-    args = parser.parse_args()
+def fewshot_row(text: str, order: Dict, constraints: MenuConstraints, only_order_draft: bool = False) -> tuple:
+    """파싱 결과 → (few-shot 행 또는 None, 층 판정용 주문). ASK 행이면 주문은 None."""
+    res = to_order_or_ask(text, None, order=order)
+    if res["label"] != "ORDER_DRAFT":
+        if only_order_draft:
+            return None, None
+        return {
+            "input": text,
+            "label": "ASK",
+            "missing_slots": res["missing_slots"],
+            "question": res["question"],
+        }, None
+    order = res["target"]["order"]
+    filtered_items = constraints.filter_items(order["items"])
+    if not filtered_items:
+        return None, None
+    order = {**order, "items": filtered_items}
+    return {"input": text, "label": "ORDER_DRAFT", "target": {"order": order}}, order
 
-    paths = Paths(root=Path(__file__).resolve().parents[2])
-    interim = paths.data_interim / f"{args.domain}_orders.csv"
-    if not interim.exists():
-        raise FileNotFoundError(f"missing interim file: {interim}")
-    df = pd.read_csv(interim)
-    aliases_map = load_aliases_map(paths.configs / f"aliases.{args.domain}.yml")
-    menu_mapping = load_combined_mapping(paths.configs / f"menu.{args.domain}.yml", paths.configs / f"aliases.{args.domain}.yml")
+
+def stage_spec(paths: Paths, domain: str, k: int = 50, only_order_draft: bool = False,
+               max_ask_ratio: float = 0.4, dedupe: bool = False, dedupe_threshold: float = 0.8,
+               multi_share: float = 0.3, option_share: float = 0.5, max_sku_share: float = 0.1,
+               stream: bool = False, pool: int = 50_000) -> StageSpec:
+    # workers는 결과에 영향이 없으므로 params에서 제외
+    return StageSpec(
+        files=[interim_file(paths, domain), paths.configs / f"menu.{domain}.yml", paths.configs / f"aliases.{domain}.yml",
+               paths.configs / "patterns.yml", paths.outputs / domain / "menu.json"],
+        outputs=[paths.outputs / domain / "few_shots.jsonl"],
+        params={"k": k, "only_order_draft": only_order_draft, "max_ask_ratio": max_ask_ratio,
+                "dedupe": dedupe, "dedupe_threshold": dedupe_threshold, "multi_share": multi_share,
+                "option_share": option_share, "max_sku_share": max_sku_share, "stream": stream,
+                "pool": pool if stream else None},
+        code=stage_code(__file__),
+    )
+
+
+def build_fewshots(paths: Paths, domain: str, k: int = 50, only_order_draft: bool = False,
+                   max_ask_ratio: float = 0.4, workers: int = 1, df: pd.DataFrame | None = None,
+                   menu_mapping: MenuMapping | None = None, menu_json: dict | None = None,
+                   patterns: dict | None = None, dedupe: bool = False, dedupe_threshold: float = 0.8,
+                   multi_share: float = 0.3, option_share: float = 0.5, max_sku_share: float = 0.1,
+                   stream: bool = False, pool: int = 50_000, chunksize: int = 200_000,
+                   parse_cache: bool = True) -> List[dict]:
+    """03 단계 본체. 이미 로드된 interim/매핑/설정이 있으면 그대로 쓰고, 없으면 파일에서 읽는다.
+
+    발화를 시드 순서로 훑으며 배치 단위로만 파싱하고, SKU/아이템 수/옵션 유무/ASK 할당량(make_quotas)이
+    모두 차면(k행) 멈춘다. stream이면 interim 전체 대신 reservoir 표본 pool행에서 고른다.
+    dedupe면 샘플링 전에 거의 같은 발화(MinHash/LSH, 추정 Jaccard >= dedupe_threshold)를 클러스터당 1행으로 줄인다.
+    """
+    if stream:
+        df = interim_pool(paths, domain, pool, seed=42, chunksize=chunksize)
+    elif df is None:
+        # 발화문 + 세션 키만 읽는다(Parquet interim이면 열 pushdown)
+        df = read_interim(paths, domain, columns=INTERIM_COLUMNS)
+    menu_yaml = paths.configs / f"menu.{domain}.yml"
+    aliases_yaml = paths.configs / f"aliases.{domain}.yml"
+    if patterns is None:
+        patterns = load_yaml(paths.configs / "patterns.yml") or {}
+    if menu_mapping is None:
+        # 매칭 전 patterns.yml 정규화/rewrites 적용
+        menu_mapping = load_combined_mapping(menu_yaml, aliases_yaml, compile_normalizer(patterns), jamo_fuzzy=True,
+                                             slot_extractor=compile_slot_extractor(patterns),
+                                             quantity_parser=compile_quantity_parser(patterns))
+    # 매핑에 컴파일된 별칭 매처를 재사용하도록 같은 사전을 넘긴다
+    aliases_map = menu_mapping.aliases
     # menu constraints from exported JSON
-    menu_json = load_json(paths.outputs / args.domain / "menu.json")
-    sku_conf = {it.get("sku"): it for it in (menu_json.get("items") or []) if isinstance(it, dict)}
-    patterns = load_yaml(paths.configs / "patterns.yml") or {}
+    if menu_json is None:
+        menu_json = load_json(paths.outputs / domain / "menu.json")
+    constraints = MenuConstraints.from_menu_json(menu_json)
 
     import re
     # 새로운 구조: filters.order_gate_regex 또는 filters.order_keywords 사용
@@ -66,68 +133,95 @@ def main() -> None:
         t = str(text)
         return any(r.search(t) for r in order_regexes)
 
-    rows: List[dict] = []
-    for _, r in df.sample(n=min(args.k, len(df)), random_state=42).iterrows():
-        text = str(r.get("발화문", ""))
-        # 메뉴 언급이 없거나 주문 동사 미포함이면 스킵
-        if not has_menu_phrase(text, menu_mapping) or not is_order_text(text):
-            continue
-        res = to_order_or_ask(text, menu_mapping)
-        if res["label"] == "ORDER_DRAFT":
-            # 멀티 아이템 파싱 시 aliases 암시 옵션 반영을 위해 재파싱
-            from src.utils.parse import parse_order_items
-            items = parse_order_items(text, menu_mapping, aliases_map)
-            # filter options by sku constraints & schema-allowed keys
-            filtered_items = []
-            for it in items:
-                sku = it.get("sku")
-                conf = sku_conf.get(sku, {})
-                allowed_schema = {"size", "temp", "shot", "syrup", "ice"}
-                allow_options = set(conf.get("allow_options") or [])
-                if conf.get("sizes_enabled"):
-                    allow_options.add("size")
-                temps = set(conf.get("temps") or [])
-                opts = it.get("options") or {}
-                if isinstance(opts, dict):
-                    new_opts = {}
-                    for k, v in opts.items():
-                        if k not in allowed_schema:
-                            continue
-                        if k != "temp" and k not in allow_options:
-                            continue
-                        if k == "temp" and temps and v not in temps:
-                            continue
-                        new_opts[k] = v
-                    if new_opts:
-                        it["options"] = new_opts
-                    elif "options" in it:
-                        del it["options"]
-                filtered_items.append(it)
-            items = filtered_items
-            if not items:
-                continue
-            rows.append({"input": text, "label": "ORDER_DRAFT", "target": {"order": {"items": items}}})
-        else:
-            if args.only_order_draft:
-                continue
-            rows.append({
-                "input": text,
-                "label": "ASK",
-                "missing_slots": res["missing_slots"],
-                "question": res["question"],
-            })
-
-    # ASK 비율 제한
-    if not args.only_order_draft and rows:
-        drafts = [r for r in rows if r["label"] == "ORDER_DRAFT"]
-        asks = [r for r in rows if r["label"] == "ASK"]
-        max_ask = int(len(drafts) * args.max_ask_ratio)
-        asks = asks[:max_ask]
-        rows = drafts + asks
-
-    out_dir = paths.outputs / args.domain
+    if dedupe:
+        before = len(df)
+        df = dedupe_utterances(df, menu_mapping.normalizer, dedupe_threshold)
+        print(f"[FewShots] dedupe: {before} -> {len(df)} rows")
+
+    # workers > 1이면 아래 with 블록에서 프로세스 풀 파서로 바꾼다(파싱 캐시도 with 블록에서 연다)
+    parse = None
+    cache = None
+
+    def build(batch: List[str]) -> List[tuple]:
+        texts = pd.Series(batch, dtype=object)
+        # 메뉴 언급이 없거나 주문 동사 미포함이면 파싱하지 않는다
+        keep = texts.map(lambda t: has_menu_phrase(t, menu_mapping)) & texts.map(is_order_text)
+        count("gate_dropped", int(len(texts) - keep.sum()))
+        # aliases 암시 옵션·슬롯·주문 유형까지 반영해 배치로 1회만 파싱
+        parsed = parse(texts[keep]) if parse is not None else parse_order_items_batch(texts[keep], menu_mapping,
+                                                                                       aliases_map, orders=True,
+                                                                                       cache=cache)
+        out: List[tuple] = [(None, None)] * len(texts)
+        for i, text, order in zip(np.nonzero(keep.to_numpy())[0], texts[keep], parsed):
+            out[i] = fewshot_row(text, order, constraints, only_order_draft)
+        return out
+
+    # ASK는 drafts * max_ask_ratio 이하가 되도록 전체의 r / (1 + r)
+    ask_share = 0.0 if only_order_draft else max_ask_ratio / (1 + max_ask_ratio)
+    sampler = StratifiedSampler(make_quotas(k, multi_share, option_share, max_sku_share, ask_share),
+                                patience=max(500, 5 * k))
+    candidates = seeded_texts(df, seed=42)
+    with ExitStack() as stack:
+        if parse_cache:
+            cache = stack.enter_context(ParseCache.for_domain(paths, domain))
+        if workers > 1:
+            parse = stack.enter_context(ParallelParser(menu_yaml, aliases_yaml, workers,
+                                                       normalizer=menu_mapping.normalizer, orders=True, cache=cache,
+                                                       jamo_fuzzy=menu_mapping.jamo_fuzzy,
+                                                       slot_extractor=menu_mapping.slot_extractor,
+                                                       quantity_parser=menu_mapping.quantity_parser))
+        rows = sample_stream(candidates, build, sampler, batch_size=256 * max(1, workers))
+    # ORDER_DRAFT 먼저, ASK는 뒤에
+    rows = [r for r in rows if r["label"] == "ORDER_DRAFT"] + [r for r in rows if r["label"] == "ASK"]
+
+    out_dir = paths.outputs / domain
     write_jsonl(out_dir / "few_shots.jsonl", rows)
+    scanned = sampler.scanned
+    set_rows(scanned, len(rows))
+    fz = fuzzy_stats(menu_mapping)
+    print(f"[FewShots] sampled {len(rows)}/{k} rows after scanning {scanned}/{len(candidates)} utterances")
+    print(f"[FewShots] fuzzy fallback cache hits={fz['hits']} misses={fz['misses']}")
+    if cache is not None:
+        pc = cache.stats()
+        print(f"[FewShots] parse cache hits={pc['hits']} misses={pc['misses']} (hit rate {pc['hit_rate']:.1%})")
     print(f"[FewShots] saved {len(rows)} lines -> {out_dir / 'few_shots.jsonl'}")
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--domain", required=True)
+    parser.add_argument("--k", type=int, default=50, help="출력 예시 수(후보가 모자라면 그보다 적음)")
+    parser.add_argument("--only_order_draft", action="store_true", help="ASK 샘플 제외")
+    parser.add_argument("--max_ask_ratio", type=float, default=0.4, help="ASK 최대 비율")
+    parser.add_argument("--workers", type=int, default=1, help="파싱 프로세스 수(결과는 단일 프로세스와 동일)")
+    parser.add_argument("--dedupe", action="store_true", help="샘플링 전 유사 발화 클러스터당 1개만 남김")
+    parser.add_argument("--dedupe_threshold", type=float, default=0.8, help="유사 발화 판정 Jaccard(문자 3-gram)")
+    parser.add_argument("--multi_share", type=float, default=0.3, help="멀티 아이템 예시 목표 비율")
+    parser.add_argument("--option_share", type=float, default=0.5, help="옵션 포함 예시 목표 비율")
+    parser.add_argument("--max_sku_share", type=float, default=0.1, help="SKU 하나가 차지할 수 있는 최대 비율")
+    parser.add_argument("--stream", action="store_true", help="interim을 chunk로 훑어 reservoir 표본에서 고름(메모리 상한)")
+    parser.add_argument("--pool", type=int, default=50_000, help="--stream 시 reservoir 표본 크기")
+    parser.add_argument("--chunksize", type=int, default=200_000, help="--stream 시 chunk 행 수")
+    parser.add_argument("--no_parse_cache", action="store_true", help="data/interim 파싱 캐시를 쓰지 않음")
+    parser.add_argument("--force", action="store_true", help="입력 해시가 같아도 다시 실행")
+    parser.add_argument("--profile", action="store_true", help="cProfile 결과를 outputs/{domain}/profile/에 저장")
+    args = parser.parse_args()
+
+    paths = Paths(root=Path(__file__).resolve().parents[2])
+    quota_args = dict(multi_share=args.multi_share, option_share=args.option_share, max_sku_share=args.max_sku_share,
+                      stream=args.stream, pool=args.pool)
+    spec = stage_spec(paths, args.domain, k=args.k, only_order_draft=args.only_order_draft, max_ask_ratio=args.max_ask_ratio,
+                      dedupe=args.dedupe, dedupe_threshold=args.dedupe_threshold, **quota_args)
+    run_incremental(BuildState.for_domain(paths, args.domain), "03_build_fewshots", spec,
+                    instrumented(paths, args.domain, "03_build_fewshots",
+                                 lambda: build_fewshots(paths, args.domain, k=args.k, only_order_draft=args.only_order_draft,
+                                                        max_ask_ratio=args.max_ask_ratio, workers=args.workers,
+                                                        dedupe=args.dedupe, dedupe_threshold=args.dedupe_threshold,
+                                                        chunksize=args.chunksize, parse_cache=not args.no_parse_cache,
+                                                        **quota_args),
+                                 profile=args.profile),
+                    force=args.force)
 
 
 if __name__ == "__main__":
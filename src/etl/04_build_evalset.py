@@ -1,83 +1,169 @@
 from __future__ import annotations
 
 import argparse
+from contextlib import ExitStack
 from pathlib import Path
 from typing import List
 
 import pandas as pd
 
-from src.utils.io import Paths, write_jsonl
-from src.utils.menu import load_combined_mapping, load_aliases_map
-from src.utils.parse import parse_order_items
+from src.utils.buildstate import BuildState, StageSpec, run_incremental, stage_code
+from src.utils.constraints import MenuConstraints
+from src.utils.io import Paths, interim_file, load_yaml, read_interim, write_jsonl
+from src.utils.menu import MenuMapping, fuzzy_stats, load_combined_mapping
+from src.utils.metrics import instrumented, set_rows
+from src.utils.parallel import ParallelParser
+from src.utils.parse import parse_order, parse_order_items_batch
+from src.utils.parse_cache import ParseCache
+from src.utils.sampling import (StratifiedSampler, dedupe_utterances, interim_pool, make_quotas, sample_stream,
+                                seeded_texts)
+from src.utils.quantity import compile_quantity_parser
+from src.utils.slots import compile_slot_extractor
+from src.utils.textnorm import compile_normalizer
 from src.utils.validation import load_json
 
 
-def to_gold(text: str, menu_mapping) -> dict | None:
-    items = parse_order_items(text, menu_mapping)
-    if not items:
+INTERIM_COLUMNS = ["발화문", "상담번호", "상담내순번"]
+
+
+def to_gold(text: str, menu_mapping, aliases_map: dict | None = None, order: dict | None = None) -> dict | None:
+    if order is None:
+        order = parse_order(text, menu_mapping, aliases_map)
+    if not order["items"]:
         return None
-    return {"order": {"items": items}}
+    return {"order": order}
+
+
+def eval_row(text: str, order: dict, constraints: MenuConstraints) -> tuple:
+    """파싱 결과 → (evalset 행 또는 None, 층 판정용 주문)."""
+    gold = to_gold(text, None, order=order)
+    if gold is None:
+        return None, None
+    filtered_items = constraints.filter_items(gold["order"]["items"])
+    if not filtered_items:
+        return None, None
+    order = {**gold["order"], "items": filtered_items}
+    return {"input": text, "gold": {"order": order}}, order
+
+
+def stage_spec(paths: Paths, domain: str, n: int = 300, dedupe: bool = False, dedupe_threshold: float = 0.8,
+               multi_share: float = 0.3, option_share: float = 0.5, max_sku_share: float = 0.1,
+               stream: bool = False, pool: int = 50_000) -> StageSpec:
+    return StageSpec(
+        files=[interim_file(paths, domain), paths.configs / f"menu.{domain}.yml", paths.configs / f"aliases.{domain}.yml",
+               paths.configs / "patterns.yml", paths.outputs / domain / "menu.json"],
+        outputs=[paths.outputs / domain / "evalset.jsonl"],
+        params={"n": n, "dedupe": dedupe, "dedupe_threshold": dedupe_threshold, "multi_share": multi_share,
+                "option_share": option_share, "max_sku_share": max_sku_share, "stream": stream,
+                "pool": pool if stream else None},
+        code=stage_code(__file__),
+    )
+
+
+def build_evalset(paths: Paths, domain: str, n: int = 300, workers: int = 1, df: pd.DataFrame | None = None,
+                  menu_mapping: MenuMapping | None = None, menu_json: dict | None = None,
+                  patterns: dict | None = None, dedupe: bool = False, dedupe_threshold: float = 0.8,
+                  multi_share: float = 0.3, option_share: float = 0.5, max_sku_share: float = 0.1,
+                  stream: bool = False, pool: int = 50_000, chunksize: int = 200_000,
+                  parse_cache: bool = True) -> List[dict]:
+    """04 단계 본체. 이미 로드된 interim/매핑/menu.json이 있으면 그대로 쓰고, 없으면 파일에서 읽는다.
+
+    03과 같은 층별 스트리밍 샘플러로 n행이 차면 파싱을 멈춘다(stream이면 reservoir 표본 pool행에서).
+    dedupe면 샘플링 전에 거의 같은 발화를 클러스터당 1행으로 줄인다(03과 같은 기준).
+    """
+    if stream:
+        df = interim_pool(paths, domain, pool, seed=123, chunksize=chunksize)
+    elif df is None:
+        # 발화문 + 세션 키만 읽는다(Parquet interim이면 열 pushdown)
+        df = read_interim(paths, domain, columns=INTERIM_COLUMNS)
+    menu_yaml = paths.configs / f"menu.{domain}.yml"
+    aliases_yaml = paths.configs / f"aliases.{domain}.yml"
+    if menu_mapping is None:
+        if patterns is None:
+            patterns = load_yaml(paths.configs / "patterns.yml") or {}
+        # 매칭 전 patterns.yml 정규화/rewrites 적용
+        menu_mapping = load_combined_mapping(menu_yaml, aliases_yaml, compile_normalizer(patterns), jamo_fuzzy=True,
+                                             slot_extractor=compile_slot_extractor(patterns),
+                                             quantity_parser=compile_quantity_parser(patterns))
+    # 매핑에 컴파일된 별칭 매처를 재사용하도록 같은 사전을 넘긴다
+    aliases_map = menu_mapping.aliases
+    if menu_json is None:
+        menu_json = load_json(paths.outputs / domain / "menu.json")
+    constraints = MenuConstraints.from_menu_json(menu_json)
+
+    if dedupe:
+        before = len(df)
+        df = dedupe_utterances(df, menu_mapping.normalizer, dedupe_threshold)
+        print(f"[EvalSet] dedupe: {before} -> {len(df)} rows")
+
+    # workers > 1이면 아래 with 블록에서 프로세스 풀 파서로 바꾼다(파싱 캐시도 with 블록에서 연다)
+    parse = None
+    cache = None
+
+    def build(batch: List[str]) -> List[tuple]:
+        texts = pd.Series(batch, dtype=object)
+        # 암시 옵션·슬롯·주문 유형까지 반영해 배치로 1회만 파싱 후 제약 필터링
+        parsed = parse(texts) if parse is not None else parse_order_items_batch(texts, menu_mapping, aliases_map,
+                                                                                orders=True, cache=cache)
+        return [eval_row(text, order, constraints) for text, order in zip(texts, parsed)]
+
+    sampler = StratifiedSampler(make_quotas(n, multi_share, option_share, max_sku_share), patience=max(500, 5 * n))
+    candidates = seeded_texts(df, seed=123)
+    with ExitStack() as stack:
+        if parse_cache:
+            cache = stack.enter_context(ParseCache.for_domain(paths, domain))
+        if workers > 1:
+            parse = stack.enter_context(ParallelParser(menu_yaml, aliases_yaml, workers,
+                                                       normalizer=menu_mapping.normalizer, orders=True, cache=cache,
+                                                       jamo_fuzzy=menu_mapping.jamo_fuzzy,
+                                                       slot_extractor=menu_mapping.slot_extractor,
+                                                       quantity_parser=menu_mapping.quantity_parser))
+        rows = sample_stream(candidates, build, sampler, batch_size=256 * max(1, workers))
+
+    out_dir = paths.outputs / domain
+    write_jsonl(out_dir / "evalset.jsonl", rows)
+    set_rows(sampler.scanned, len(rows))
+    fz = fuzzy_stats(menu_mapping)
+    print(f"[EvalSet] sampled {len(rows)}/{n} rows after scanning {sampler.scanned}/{len(candidates)} utterances")
+    print(f"[EvalSet] fuzzy fallback cache hits={fz['hits']} misses={fz['misses']}")
+    if cache is not None:
+        pc = cache.stats()
+        print(f"[EvalSet] parse cache hits={pc['hits']} misses={pc['misses']} (hit rate {pc['hit_rate']:.1%})")
+    print(f"[EvalSet] saved {len(rows)} lines -> {out_dir / 'evalset.jsonl'}")
+    return rows
 
 
 def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("--domain", required=True)
-    parser.add_argument("--n", type=int, default=300)
+    parser.add_argument("--n", type=int, default=300, help="출력 gold 수(후보가 모자라면 그보다 적음)")
+    parser.add_argument("--workers", type=int, default=1, help="파싱 프로세스 수(결과는 단일 프로세스와 동일)")
+    parser.add_argument("--dedupe", action="store_true", help="샘플링 전 유사 발화 클러스터당 1개만 남김")
+    parser.add_argument("--dedupe_threshold", type=float, default=0.8, help="유사 발화 판정 Jaccard(문자 3-gram)")
+    parser.add_argument("--multi_share", type=float, default=0.3, help="멀티 아이템 gold 목표 비율")
+    parser.add_argument("--option_share", type=float, default=0.5, help="옵션 포함 gold 목표 비율")
+    parser.add_argument("--max_sku_share", type=float, default=0.1, help="SKU 하나가 차지할 수 있는 최대 비율")
+    parser.add_argument("--stream", action="store_true", help="interim을 chunk로 훑어 reservoir 표본에서 고름(메모리 상한)")
+    parser.add_argument("--pool", type=int, default=50_000, help="--stream 시 reservoir 표본 크기")
+    parser.add_argument("--chunksize", type=int, default=200_000, help="--stream 시 chunk 행 수")
+    parser.add_argument("--no_parse_cache", action="store_true", help="data/interim 파싱 캐시를 쓰지 않음")
+    parser.add_argument("--force", action="store_true", help="입력 해시가 같아도 다시 실행")
+    parser.add_argument("--profile", action="store_true", help="cProfile 결과를 outputs/{domain}/profile/에 저장")
     args = parser.parse_args()
 
     paths = Paths(root=Path(__file__).resolve().parents[2])
-    interim = paths.data_interim / f"{args.domain}_orders.csv"
-    if not interim.exists():
-        raise FileNotFoundError(f"missing interim file: {interim}")
-    df = pd.read_csv(interim)
-    aliases_map = load_aliases_map(paths.configs / f"aliases.{args.domain}.yml")
-    menu_mapping = load_combined_mapping(paths.configs / f"menu.{args.domain}.yml", paths.configs / f"aliases.{args.domain}.yml")
-    menu_json = load_json(paths.outputs / args.domain / "menu.json")
-    sku_conf = {it.get("sku"): it for it in (menu_json.get("items") or []) if isinstance(it, dict)}
-
-    sample = df.sample(n=min(args.n * 3, len(df)), random_state=123)
-    rows: List[dict] = []
-    for _, r in sample.iterrows():
-        text = str(r.get("발화문", ""))
-        gold = to_gold(text, menu_mapping)
-        if gold is None:
-            continue
-        # 암시 옵션 반영 재파싱 및 제약 필터링
-        items = parse_order_items(text, menu_mapping, aliases_map)
-        filtered_items = []
-        for it in items:
-            sku = it.get("sku")
-            conf = sku_conf.get(sku, {})
-            allowed_schema = {"size", "temp", "shot", "syrup", "ice"}
-            allow_options = set(conf.get("allow_options") or [])
-            if conf.get("sizes_enabled"):
-                allow_options.add("size")
-            temps = set(conf.get("temps") or [])
-            opts = it.get("options") or {}
-            if isinstance(opts, dict):
-                new_opts = {}
-                for k, v in opts.items():
-                    if k not in allowed_schema:
-                        continue
-                    if k != "temp" and k not in allow_options:
-                        continue
-                    if k == "temp" and temps and v not in temps:
-                        continue
-                    new_opts[k] = v
-                if new_opts:
-                    it["options"] = new_opts
-                elif "options" in it:
-                    del it["options"]
-            filtered_items.append(it)
-        if not filtered_items:
-            continue
-        rows.append({"input": text, "gold": {"order": {"items": filtered_items}}})
-
-    out_dir = paths.outputs / args.domain
-    # 상한 n 유지
-    rows = rows[: args.n]
-    write_jsonl(out_dir / "evalset.jsonl", rows)
-    print(f"[EvalSet] saved {len(rows)} lines -> {out_dir / 'evalset.jsonl'}")
+    quota_args = dict(multi_share=args.multi_share, option_share=args.option_share, max_sku_share=args.max_sku_share,
+                      stream=args.stream, pool=args.pool)
+    spec = stage_spec(paths, args.domain, n=args.n, dedupe=args.dedupe, dedupe_threshold=args.dedupe_threshold,
+                      **quota_args)
+    run_incremental(BuildState.for_domain(paths, args.domain), "04_build_evalset", spec,
+                    instrumented(paths, args.domain, "04_build_evalset",
+                                 lambda: build_evalset(paths, args.domain, n=args.n, workers=args.workers,
+                                                       dedupe=args.dedupe, dedupe_threshold=args.dedupe_threshold,
+                                                       chunksize=args.chunksize, parse_cache=not args.no_parse_cache,
+                                                       **quota_args),
+                                 profile=args.profile),
+                    force=args.force)
 
 
 if __name__ == "__main__":
@@ -2,113 +2,87 @@ from __future__ import annotations
 
 import argparse
 import datetime as dt
-import json
 from pathlib import Path
-
-from src.utils.io import Paths, file_sha256, write_json
-from src.utils.validation import (
-    load_json,
-    load_schema_store,
-    validate_json,
-    validate_jsonl,
-)
-
-
-def main() -> None:
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--domain", required=True)
-    args = parser.parse_args()
-
-    paths = Paths(root=Path(__file__).resolve().parents[2])
-    out_dir = paths.outputs / args.domain
+from typing import List
+
+import pandas as pd
+
+from src.utils.buildstate import BuildState, StageSpec, run_incremental, stage_code
+from src.utils.constraints import MenuConstraints
+from src.utils.io import Paths, file_sha256, iter_jsonl_lines, load_yaml, write_json
+from src.utils.menu import MenuMapping, load_combined_mapping
+from src.utils.menu_index import load_menu_index
+from src.utils.metrics import instrumented, load_metrics, set_rows
+from src.utils.parse import parse_order_items_batch
+from src.utils.quantity import compile_quantity_parser
+from src.utils.slots import compile_slot_extractor
+from src.utils.textnorm import compile_normalizer
+from src.utils.validation import SchemaSet, load_json, validate_jsonl_files
+
+
+def stage_spec(paths: Paths, domain: str) -> StageSpec:
+    out_dir = paths.outputs / domain
+    files = [out_dir / name for name in ("aliases.json", "few_shots.jsonl", "evalset.jsonl", "menu.json", "menu_index.bin",
+                                              "few_shots.index.bin")]
+    files += [paths.configs / f"menu.{domain}.yml", paths.configs / f"aliases.{domain}.yml", paths.configs / "patterns.yml"]
+    files += sorted(paths.configs.glob("*.schema.json"))
+    return StageSpec(files=files, outputs=[out_dir / "artifact_manifest.json", out_dir / "validation_report.json"],
+                     code=stage_code(__file__))
+
+
+def check_index_parity(index_path: Path, mapping: MenuMapping, texts: List[str]) -> int:
+    """인덱스 매핑(to_mapping)과 ETL 매핑의 parse_order 결과가 같은지 확인한다. 다르면 ValueError."""
+    index_mapping = load_menu_index(index_path).to_mapping(jamo_fuzzy=mapping.jamo_fuzzy)
+    s = pd.Series(texts, dtype=object)
+    want = parse_order_items_batch(s, mapping, mapping.aliases, orders=True)
+    got = parse_order_items_batch(s, index_mapping, index_mapping.aliases, orders=True)
+    diff = [t for t, w, g in zip(texts, want, got) if w != g]
+    if diff:
+        raise ValueError(f"menu index parse mismatch on {len(diff)}/{len(texts)} inputs (e.g. {diff[0]!r})")
+    return len(texts)
+
+
+def validate_artifacts(paths: Paths, domain: str, workers: int = 1) -> dict:
+    out_dir = paths.outputs / domain
     aliases_p = out_dir / "aliases.json"
     few_p = out_dir / "few_shots.jsonl"
     eval_p = out_dir / "evalset.jsonl"
     menu_p = out_dir / "menu.json"
 
-    store = load_schema_store(paths.configs)
-    slots_schema = load_json(paths.configs / "slots.schema.json")
-    aliases_schema = load_json(paths.configs / "aliases.schema.json")
-    few_schema = load_json(paths.configs / "few_shots.schema.json")
-    eval_schema = load_json(paths.configs / "evalset.schema.json")
-    manifest_schema = load_json(paths.configs / "artifact_manifest.schema.json")
+    schemas = SchemaSet(paths.configs)
 
     # Validate aliases.json
     aliases_obj = load_json(aliases_p)
-    ok, err = validate_json(aliases_obj, aliases_schema, store)
+    ok, err = schemas.validate("aliases.schema.json", aliases_obj)
     if not ok:
         raise SystemExit(f"aliases.json invalid: {err}")
 
-    # Validate few_shots.jsonl
-    ok_cnt, fail_cnt, messages = validate_jsonl(few_p, few_schema, store)
-    if fail_cnt > 0:
-        raise SystemExit(f"few_shots.jsonl invalid lines={fail_cnt}: {messages[:3]}")
-
-    # Validate evalset.jsonl
-    ok_cnt, fail_cnt, messages = validate_jsonl(eval_p, eval_schema, store)
-    if fail_cnt > 0:
-        raise SystemExit(f"evalset.jsonl invalid lines={fail_cnt}: {messages[:3]}")
-
     # Preflight: menu option allowance & enum normalization
     if not menu_p.exists():
         raise SystemExit("menu.json not found. Run export menu step first.")
     menu_obj = load_json(menu_p)
-    sku_to_conf = {it.get("sku"): it for it in menu_obj.get("items", []) if isinstance(it, dict)}
-
-    def check_items_in_lines(jsonl_path):
-        problems = []
-        with open(jsonl_path, "r", encoding="utf-8") as f:
-            for ln, line in enumerate(f, start=1):
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    obj = json.loads(line)
-                except Exception as e:
-                    problems.append((ln, f"json parse error: {e}"))
-                    continue
-                data = obj.get("target") or obj.get("gold") or {}
-                order = (data or {}).get("order") or {}
-                for item in (order.get("items") or []):
-                    sku = item.get("sku")
-                    conf = sku_to_conf.get(sku)
-                    if not conf:
-                        problems.append((ln, f"unknown sku: {sku}"))
-                        continue
-                    allowed = set(conf.get("allow_options") or [])
-                    if conf.get("sizes_enabled"):
-                        allowed.add("size")
-                    temps = set(conf.get("temps") or [])
-                    opts = (item.get("options") or {}) if isinstance(item.get("options"), dict) else {}
-                    # key allow check
-                    for k in opts.keys():
-                        if k not in {"size", "temp", "shot", "syrup", "ice"}:
-                            problems.append((ln, f"unsupported option key: {k}"))
-                        elif k not in allowed and k != "temp":
-                            problems.append((ln, f"option not allowed for {sku}: {k}"))
-                    # enum/value check
-                    if "size" in opts and opts["size"] not in {"S", "M", "L"}:
-                        problems.append((ln, f"invalid size: {opts['size']}"))
-                    if "temp" in opts and opts["temp"] not in {"ICE", "HOT"}:
-                        problems.append((ln, f"invalid temp: {opts['temp']}"))
-                    if "temp" in opts and temps and opts["temp"] not in temps:
-                        problems.append((ln, f"temp not supported for {sku}: {opts['temp']}"))
-                    if "ice" in opts and opts["ice"] not in {"less", "normal", "more"}:
-                        problems.append((ln, f"invalid ice: {opts['ice']}"))
-                    if "shot" in opts and (not isinstance(opts["shot"], int) or opts["shot"] < 0):
-                        problems.append((ln, f"invalid shot: {opts['shot']}"))
-        return problems
-
-    problems_few = check_items_in_lines(few_p)
-    problems_eval = check_items_in_lines(eval_p)
-    problems = [("few_shots", ln, msg) for ln, msg in problems_few] + [("evalset", ln, msg) for ln, msg in problems_eval]
+    constraints = MenuConstraints.from_menu_json(menu_obj)
+
+    # few_shots/evalset: 파일당 1회 파싱으로 스키마 + 의미 검사(큰 파일은 byte-range 병렬)
+    report = validate_jsonl_files(
+        {"few_shots": (few_p, "few_shots.schema.json"), "evalset": (eval_p, "evalset.schema.json")},
+        paths.configs, constraints, workers=workers,
+    )
+    write_json(out_dir / "validation_report.json", report.to_dict())
+    set_rows(sum(r.records for r in report.files.values()))
+    for name, r in report.files.items():
+        if r.schema_failures > 0:
+            messages = [f"line {ln}: {m}" for ln, m in r.schema_errors]
+            raise SystemExit(f"{name}.jsonl invalid lines={r.schema_failures}: {messages[:3]}")
+    problems = [(name, ln, msg) for name, r in report.files.items() for ln, msg in r.problems]
     if problems:
+        n_issues = sum(r.semantic_failures for r in report.files.values())
         preview = ", ".join([f"{src}:{ln} {msg}" for src, ln, msg in problems[:5]])
-        raise SystemExit(f"preflight failed: {len(problems)} issues. e.g. {preview}")
+        raise SystemExit(f"preflight failed: {n_issues} lines with issues. e.g. {preview}")
 
     # Alias conflicts (non-fatal warnings): same term mapping in configs
     try:
-        cfg_aliases_path = paths.configs / f"aliases.{args.domain}.yml"
+        cfg_aliases_path = paths.configs / f"aliases.{domain}.yml"
         if cfg_aliases_path.exists():
             import yaml
             with open(cfg_aliases_path, "r", encoding="utf-8") as f:
@@ -138,22 +112,58 @@ def main() -> None:
     # source hash: 합쳐서 계산(간단히 aliases만 기준으로 예시)
     source_hash = file_sha256(aliases_p)
     manifest = {
-        "domain": args.domain,
+        "domain": domain,
         "version": "0.1.0",
         "generated_at": dt.datetime.now(dt.timezone.utc).isoformat(),
-        "counts": {
-            "aliases": len(aliases_obj),
-            "few_shots": sum(1 for _ in open(few_p, "r", encoding="utf-8")),
-            "evalset": sum(1 for _ in open(eval_p, "r", encoding="utf-8")),
-        },
+        "counts": {"aliases": len(aliases_obj), **report.counts},
         "source_hash": source_hash,
         "patterns_version": "2025-10-20",
     }
-    ok, err = validate_json(manifest, manifest_schema, store)
+    # 앞 단계들의 마지막 실행 지표(build_metrics.json). 05 자신의 지표는 metrics 파일에만 남는다.
+    stage_metrics = {k: v for k, v in load_metrics(out_dir).items() if k != "05_validate_artifacts"}
+    if stage_metrics:
+        manifest["metrics"] = stage_metrics
+    # 런타임 MenuIndex(02_build_index)가 있으면 로더가 대조할 해시를 기록
+    index_p = out_dir / "menu_index.bin"
+    if index_p.exists():
+        # 인덱스로 띄운 파서가 03/04와 같은 매핑(configs + patterns, 자모 fuzzy)의 결과를 내는지 evalset 입력으로 확인
+        patterns = load_yaml(paths.configs / "patterns.yml") or {}
+        mapping = load_combined_mapping(paths.configs / f"menu.{domain}.yml", paths.configs / f"aliases.{domain}.yml",
+                                        compile_normalizer(patterns), jamo_fuzzy=True,
+                                        slot_extractor=compile_slot_extractor(patterns),
+                                        quantity_parser=compile_quantity_parser(patterns))
+        texts = [row["input"] for row in iter_jsonl_lines(eval_p) if isinstance(row.get("input"), str)]
+        try:
+            n_parity = check_index_parity(index_p, mapping, texts)
+        except ValueError as e:
+            raise SystemExit(f"menu_index.bin out of sync with configs: {e}")
+        print(f"[Validate] menu index parse parity ok on {n_parity} evalset inputs")
+        manifest["menu_index_hash"] = file_sha256(index_p)
+    fewshot_index_p = out_dir / "few_shots.index.bin"
+    if fewshot_index_p.exists():
+        manifest["fewshot_index_hash"] = file_sha256(fewshot_index_p)
+    ok, err = schemas.validate("artifact_manifest.schema.json", manifest)
     if not ok:
         raise SystemExit(f"manifest invalid: {err}")
     write_json(out_dir / "artifact_manifest.json", manifest)
     print(f"[Validate] artifacts valid. manifest -> {out_dir / 'artifact_manifest.json'}")
+    return manifest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--domain", required=True)
+    parser.add_argument("--workers", type=int, default=1, help="큰 JSONL을 byte-range로 나눠 검증할 프로세스 수")
+    parser.add_argument("--force", action="store_true", help="입력 해시가 같아도 다시 실행")
+    parser.add_argument("--profile", action="store_true", help="cProfile 결과를 outputs/{domain}/profile/에 저장")
+    args = parser.parse_args()
+
+    paths = Paths(root=Path(__file__).resolve().parents[2])
+    run_incremental(BuildState.for_domain(paths, args.domain), "05_validate_artifacts", stage_spec(paths, args.domain),
+                    instrumented(paths, args.domain, "05_validate_artifacts",
+                                 lambda: validate_artifacts(paths, args.domain, workers=args.workers),
+                                 profile=args.profile),
+                    force=args.force)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import argparse
+import importlib
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from src.utils.buildstate import BuildState, StageSpec, run_incremental
+from src.utils.io import Paths, load_yaml, read_interim
+from src.utils.menu import MenuMapping, combined_mapping_from_config
+from src.utils.metrics import instrumented
+from src.utils.quantity import compile_quantity_parser
+from src.utils.slots import compile_slot_extractor
+from src.utils.textnorm import compile_normalizer
+from src.utils.validation import load_json
+
+
+def _stage_module(name: str):
+    # 스테이지 모듈명이 숫자로 시작하므로 importlib로 불러온다
+    return importlib.import_module(f"src.etl.{name}")
+
+
+class PipelineContext:
+    """한 프로세스 안에서 스테이지가 공유하는 상태(설정/매핑/interim/스테이지 결과).
+
+    설정 파일과 매핑은 처음 요청될 때 1회만 로드한다. 스테이지가 스레드로 동시에 돌 수 있어 잠금으로 보호.
+    """
+
+    def __init__(self, paths: Paths, domain: str, args: argparse.Namespace):
+        self.paths = paths
+        self.domain = domain
+        self.args = args
+        self.results: Dict[str, Any] = {}
+        self.state = BuildState.for_domain(paths, domain)
+        self.skipped: set = set()
+        self._memo: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def _once(self, key: str, load: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key not in self._memo:
+                self._memo[key] = load()
+            return self._memo[key]
+
+    def config(self, filename: str) -> Optional[dict]:
+        path = self.paths.configs / filename
+        return self._once(f"config:{filename}", lambda: (load_yaml(path) or {}) if path.exists() else None)
+
+    @property
+    def patterns(self) -> dict:
+        return self.config("patterns.yml") or {}
+
+    @property
+    def mapping(self) -> MenuMapping:
+        return self._once("mapping", lambda: combined_mapping_from_config(
+            self.config(f"menu.{self.domain}.yml") or {}, self.config(f"aliases.{self.domain}.yml"),
+            compile_normalizer(self.patterns), jamo_fuzzy=True,
+            slot_extractor=compile_slot_extractor(self.patterns), quantity_parser=compile_quantity_parser(self.patterns)))
+
+    def incremental(self, stage: str, spec: StageSpec, run: Callable[[], Any],
+                    reload: Optional[Callable[[], Any]] = None) -> Any:
+        """입력 해시가 같으면 건너뛰고, 후속 단계가 쓸 결과는 reload로 디스크에서 읽는다. 실행하면 지표를 기록."""
+        ran, result = run_incremental(self.state, stage, spec, self.instrumented(stage, run), force=self.args.force)
+        if ran:
+            return result
+        self.skipped.add(stage)
+        return reload() if reload is not None else None
+
+    def instrumented(self, stage: str, run: Callable[[], Any]) -> Callable[[], Any]:
+        return instrumented(self.paths, self.domain, stage, run, profile=self.args.profile)
+
+    def interim(self) -> pd.DataFrame:
+        # 01이 메모리에 올린 필터 결과가 있으면 재사용(스트리밍 모드면 파일에서 1회 읽기)
+        def load() -> pd.DataFrame:
+            df = self.results.get("01_filter_orders")
+            if df is not None:
+                return df
+            return read_interim(self.paths, self.domain, columns=_stage_module("03_build_fewshots").INTERIM_COLUMNS)
+        return self._once("interim", load)
+
+
+@dataclass
+class Stage:
+    name: str
+    deps: Tuple[str, ...]
+    run: Callable[[PipelineContext], Any]
+
+
+@dataclass
+class StageTiming:
+    name: str
+    start: float
+    wall: float
+
+
+def default_stages() -> List[Stage]:
+    """make artifacts와 같은 00–05 단계를 의존 관계로 선언한다."""
+    def eda(ctx: PipelineContext) -> Any:
+        return ctx.instrumented("00_eda_report", lambda: _stage_module("00_eda_report").eda_report(ctx.domain))()
+
+    def filter_orders(ctx: PipelineContext) -> Any:
+        a = ctx.args
+        mod = _stage_module("01_filter_orders")
+        mod.prepare_raw(ctx.paths, ctx.domain, a.chunksize)
+        # 건너뛰면 결과 None → 03/04는 interim 파일을 1회 읽는다
+        return ctx.incremental("01_filter_orders", mod.stage_spec(ctx.paths, ctx.domain, a.format),
+                               lambda: mod.filter_orders(ctx.paths, ctx.domain, ctx.patterns, stream=a.stream,
+                                                         chunksize=a.chunksize, fmt=a.format))
+
+    def export_menu(ctx: PipelineContext) -> Any:
+        mod = _stage_module("02_export_menu")
+        return ctx.incremental("02_export_menu", mod.stage_spec(ctx.paths, ctx.domain),
+                               lambda: mod.export_menu(ctx.paths, ctx.domain, ctx.config(f"menu.{ctx.domain}.yml") or {}),
+                               lambda: load_json(ctx.paths.outputs / ctx.domain / "menu.json"))
+
+    def build_aliases(ctx: PipelineContext) -> Any:
+        mod = _stage_module("02_build_aliases")
+        return ctx.incremental("02_build_aliases", mod.stage_spec(ctx.paths, ctx.domain),
+                               lambda: mod.build_aliases(ctx.paths, ctx.domain, ctx.mapping.aliases),
+                               lambda: load_json(ctx.paths.outputs / ctx.domain / "aliases.json"))
+
+    def build_index(ctx: PipelineContext) -> Any:
+        mod = _stage_module("02_build_index")
+        return ctx.incremental("02_build_index", mod.stage_spec(ctx.paths, ctx.domain),
+                               lambda: mod.build_index(ctx.paths, ctx.domain, ctx.mapping, ctx.results["02_export_menu"],
+                                                       ctx.results["02_build_aliases"], ctx.patterns))
+
+    def build_fewshots(ctx: PipelineContext) -> Any:
+        a = ctx.args
+        mod = _stage_module("03_build_fewshots")
+        spec = mod.stage_spec(ctx.paths, ctx.domain, k=a.k, only_order_draft=not a.include_ask,
+                              dedupe=a.dedupe, dedupe_threshold=a.dedupe_threshold, stream=a.stream)
+        # 스트리밍 모드면 interim 전체를 올리지 않고 각 단계가 reservoir 표본을 만든다
+        return ctx.incremental("03_build_fewshots", spec, lambda: mod.build_fewshots(
+            ctx.paths, ctx.domain, k=a.k, only_order_draft=not a.include_ask, workers=a.workers,
+            df=None if a.stream else ctx.interim(), menu_mapping=ctx.mapping, menu_json=ctx.results["02_export_menu"],
+            patterns=ctx.patterns, dedupe=a.dedupe, dedupe_threshold=a.dedupe_threshold,
+            stream=a.stream, chunksize=a.chunksize, parse_cache=not a.no_parse_cache))
+
+    def build_fewshot_index(ctx: PipelineContext) -> Any:
+        mod = _stage_module("03_build_fewshot_index")
+        # 03을 건너뛰었으면 결과 None → few_shots.jsonl을 읽는다
+        return ctx.incremental("03_build_fewshot_index", mod.stage_spec(ctx.paths, ctx.domain),
+                               lambda: mod.build_fewshot_index(ctx.paths, ctx.domain, ctx.results.get("03_build_fewshots")))
+
+    def build_evalset(ctx: PipelineContext) -> Any:
+        a = ctx.args
+        mod = _stage_module("04_build_evalset")
+        spec = mod.stage_spec(ctx.paths, ctx.domain, n=a.n, dedupe=a.dedupe, dedupe_threshold=a.dedupe_threshold,
+                              stream=a.stream)
+        return ctx.incremental("04_build_evalset", spec, lambda: mod.build_evalset(
+            ctx.paths, ctx.domain, n=a.n, workers=a.workers, df=None if a.stream else ctx.interim(),
+            menu_mapping=ctx.mapping, menu_json=ctx.results["02_export_menu"],
+            dedupe=a.dedupe, dedupe_threshold=a.dedupe_threshold, stream=a.stream, chunksize=a.chunksize,
+            parse_cache=not a.no_parse_cache))
+
+    def validate(ctx: PipelineContext) -> Any:
+        mod = _stage_module("05_validate_artifacts")
+        return ctx.incremental("05_validate_artifacts", mod.stage_spec(ctx.paths, ctx.domain),
+                               lambda: mod.validate_artifacts(ctx.paths, ctx.domain, workers=ctx.args.workers))
+
+    return [
+        Stage("00_eda_report", (), eda),
+        Stage("01_filter_orders", (), filter_orders),
+        Stage("02_export_menu", (), export_menu),
+        Stage("02_build_aliases", (), build_aliases),
+        Stage("02_build_index", ("02_export_menu", "02_build_aliases"), build_index),
+        Stage("03_build_fewshots", ("01_filter_orders", "02_export_menu"), build_fewshots),
+        Stage("03_build_fewshot_index", ("03_build_fewshots",), build_fewshot_index),
+        Stage("04_build_evalset", ("01_filter_orders", "02_export_menu"), build_evalset),
+        Stage("05_validate_artifacts", ("02_build_index", "03_build_fewshot_index", "04_build_evalset"), validate),
+    ]
+
+
+def run_pipeline(ctx: PipelineContext, stages: List[Stage], jobs: int = 4) -> List[StageTiming]:
+    """의존 스테이지가 끝난 단계부터 스레드 풀에 올린다. 실패한 단계가 있으면 예외를 그대로 올린다."""
+    by_name = {s.name: s for s in stages}
+    for s in stages:
+        missing = [d for d in s.deps if d not in by_name]
+        if missing:
+            raise ValueError(f"unknown dependency for {s.name}: {missing}")
+    pending = dict(by_name)
+    done: set = set()
+    timings: List[StageTiming] = []
+    t0 = time.perf_counter()
+
+    def timed(stage: Stage) -> StageTiming:
+        started = time.perf_counter()
+        ctx.results[stage.name] = stage.run(ctx)
+        return StageTiming(stage.name, started - t0, time.perf_counter() - started)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as ex:
+        running: Dict[Any, str] = {}
+        while pending or running:
+            # 선언 순서를 유지해 제출(준비된 단계끼리는 동시에 실행)
+            for name in [n for n, s in pending.items() if all(d in done for d in s.deps)]:
+                running[ex.submit(timed, pending.pop(name))] = name
+            if not running:
+                raise ValueError(f"dependency cycle among stages: {sorted(pending)}")
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                name = running.pop(fut)
+                timings.append(fut.result())
+                done.add(name)
+    return timings
+
+
+def format_timings(timings: List[StageTiming], total: float, skipped: Optional[set] = None) -> str:
+    skipped = skipped or set()
+    width = max([len(t.name) for t in timings] + [len("stage")])
+    lines = [f"{'stage':<{width}}  {'start(s)':>8}  {'wall(s)':>8}  status"]
+    for t in sorted(timings, key=lambda t: t.start):
+        status = "skipped" if t.name in skipped else "ran"
+        lines.append(f"{t.name:<{width}}  {t.start:>8.2f}  {t.wall:>8.2f}  {status}")
+    lines.append(f"{'total':<{width}}  {'':>8}  {total:>8.2f}")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--domain", required=True)
+    parser.add_argument("--k", type=int, default=200, help="03 few-shot 수")
+    parser.add_argument("--include_ask", action="store_true", help="03에서 ASK 샘플 포함(기본은 ORDER_DRAFT만)")
+    parser.add_argument("--n", type=int, default=300, help="04 evalset 수")
+    parser.add_argument("--workers", type=int, default=1, help="03/04 파싱·05 검증 프로세스 수")
+    parser.add_argument("--dedupe", action="store_true", help="03/04 샘플링 전 유사 발화 클러스터당 1개만 남김")
+    parser.add_argument("--dedupe_threshold", type=float, default=0.8, help="유사 발화 판정 Jaccard(문자 3-gram)")
+    parser.add_argument("--stream", action="store_true", help="01 chunk 단위 스트리밍, 03/04는 reservoir 표본에서 샘플링")
+    parser.add_argument("--chunksize", type=int, default=200_000)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="interim 포맷")
+    parser.add_argument("--jobs", type=int, default=4, help="동시에 실행할 독립 스테이지 수")
+    parser.add_argument("--no_parse_cache", action="store_true", help="03/04에서 data/interim 파싱 캐시를 쓰지 않음")
+    parser.add_argument("--force", action="store_true", help="입력 해시가 같아도 모든 단계 다시 실행")
+    parser.add_argument("--profile", action="store_true", help="단계별 cProfile 결과 저장(단계는 순차 실행)")
+    args = parser.parse_args()
+
+    paths = Paths(root=Path(__file__).resolve().parents[1])
+    ctx = PipelineContext(paths, args.domain, args)
+    started = time.perf_counter()
+    # 프로파일러는 동시에 하나만 켜는 것이 안전하므로 --profile이면 순차 실행
+    timings = run_pipeline(ctx, default_stages(), jobs=1 if args.profile else args.jobs)
+    print("[Pipeline] stage timings")
+    print(format_timings(timings, time.perf_counter() - started, ctx.skipped))
+
+
+if __name__ == "__main__":
+    main()
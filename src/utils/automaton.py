@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import deque
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+
+class PhraseMatch(NamedTuple):
+    start: int
+    end: int
+    phrase: str
+
+
+class PhraseAutomaton:
+    """Aho-Corasick 다중 패턴 매처.
+
+    등록 순서(rank)를 보존하므로 기존 "dict 순서 첫 매칭" 규칙도 재현할 수 있다.
+    텍스트를 한 번만 훑어 모든 매칭 구간을 돌려준다.
+    keys가 주어지면 keys(phrase)가 내는 표기들(정규화된 텍스트용)로 트라이를 만들고,
+    매칭 결과는 원래 phrase로 돌려준다.
+    """
+
+    def __init__(self, phrases: Iterable[str], keys: Optional[Callable[[str], Iterable[str]]] = None):
+        self.phrases: List[str] = []
+        self._rank: Dict[str, int] = {}
+        # 트라이에 넣은 패턴별 phrase id / 길이(keys가 없으면 패턴 id == phrase id)
+        self._pat_pid: List[int] = []
+        self._pat_len: List[int] = []
+        # 노드별 전이/실패 링크/출력(패턴 id 목록)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        for ph in phrases:
+            if not isinstance(ph, str) or not ph or ph in self._rank:
+                continue
+            patterns = list(dict.fromkeys(k for k in keys(ph) if k)) if keys is not None else [ph]
+            if not patterns:
+                continue
+            pid = self._rank[ph] = len(self.phrases)
+            self.phrases.append(ph)
+            for pattern in patterns:
+                self._insert(pattern, len(self._pat_pid))
+                self._pat_pid.append(pid)
+                self._pat_len.append(len(pattern))
+        self._build_fail_links()
+
+    def __len__(self) -> int:
+        return len(self.phrases)
+
+    def __contains__(self, phrase: object) -> bool:
+        return phrase in self._rank
+
+    def rank(self, phrase: str) -> int:
+        return self._rank[phrase]
+
+    def _insert(self, pattern: str, pat_id: int) -> None:
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = nxt
+        self._out[node] = self._out[node] + (pat_id,)
+
+    def _build_fail_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                # 실패 링크의 출력까지 합쳐 두면 검색 시 체인을 따라갈 필요가 없다
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def finditer(self, text: str) -> Iterator[PhraseMatch]:
+        """겹침을 포함한 모든 매칭을 끝 위치 순으로 돌려준다."""
+        goto, fail, out, phrases = self._goto, self._fail, self._out, self.phrases
+        pat_pid, pat_len = self._pat_pid, self._pat_len
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for k in out[node]:
+                yield PhraseMatch(i + 1 - pat_len[k], i + 1, phrases[pat_pid[k]])
+
+    def findall(self, text: str) -> List[PhraseMatch]:
+        return list(self.finditer(text))
+
+    def search(self, text: str) -> bool:
+        for _ in self.finditer(text):
+            return True
+        return False
+
+    def matched_by_rank(self, text: str) -> List[str]:
+        """매칭된 phrase를 중복 없이 등록 순서대로 돌려준다."""
+        ranks = {self._rank[m.phrase] for m in self.finditer(text)}
+        return [self.phrases[r] for r in sorted(ranks)]
+
+    def to_arrays(self) -> Dict[str, List[int]]:
+        """평탄한 int 배열(전이는 노드별 문자 코드 정렬)로 직렬화한다. MmapPhraseAutomaton과 짝.
+
+        출력은 패턴 id이고 패턴별 phrase id/길이(pat_pid/pat_len)를 함께 내므로 keys로 만든 매처도 직렬화된다.
+        """
+        edge_start, edge_char, edge_next = [0], [], []
+        out_start, out_ids = [0], []
+        for node, trans in enumerate(self._goto):
+            for ch, nxt in sorted(trans.items(), key=lambda kv: ord(kv[0])):
+                edge_char.append(ord(ch))
+                edge_next.append(nxt)
+            edge_start.append(len(edge_char))
+            out_ids.extend(self._out[node])
+            out_start.append(len(out_ids))
+        return {
+            "edge_start": edge_start,
+            "edge_char": edge_char,
+            "edge_next": edge_next,
+            "fail": list(self._fail),
+            "out_start": out_start,
+            "out_ids": out_ids,
+            "pat_pid": list(self._pat_pid),
+            "pat_len": list(self._pat_len),
+        }
+
+
+class MmapPhraseAutomaton:
+    """to_arrays() 배열(예: mmap 위 memoryview) 위에서 바로 동작하는 읽기 전용 매처.
+
+    PhraseAutomaton과 같은 검색 API를 제공하며 배열을 복사하지 않는다.
+    phrase_of(pid)는 phrase 문자열을 돌려주는 콜백.
+    """
+
+    def __init__(self, arrays: Dict[str, Sequence[int]], phrase_of: Callable[[int], str], size: int):
+        self._edge_start = arrays["edge_start"]
+        self._edge_char = arrays["edge_char"]
+        self._edge_next = arrays["edge_next"]
+        self._fail = arrays["fail"]
+        self._out_start = arrays["out_start"]
+        self._out_ids = arrays["out_ids"]
+        self._pat_pid = arrays["pat_pid"]
+        self._pat_len = arrays["pat_len"]
+        self._phrase_of = phrase_of
+        self._size = size
+        # 디코딩한 phrase 문자열만 프로세스 로컬로 캐시(배열 자체는 공유)
+        self._decoded: List[str | None] = [None] * size
+        self._rank: Dict[str, int] | None = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def phrases(self) -> List[str]:
+        return [self._phrase(i) for i in range(self._size)]
+
+    def rank(self, phrase: str) -> int:
+        if self._rank is None:
+            self._rank = {self._phrase(i): i for i in range(self._size)}
+        return self._rank[phrase]
+
+    def __contains__(self, phrase: object) -> bool:
+        try:
+            self.rank(phrase)  # type: ignore[arg-type]
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def _next(self, node: int, code: int) -> int:
+        lo, hi = self._edge_start[node], self._edge_start[node + 1]
+        i = bisect_left(self._edge_char, code, lo, hi)
+        if i < hi and self._edge_char[i] == code:
+            return self._edge_next[i]
+        return -1
+
+    def _find_ids(self, text: str) -> Iterator[Tuple[int, int]]:
+        """(끝 위치 - 1, 패턴 id)."""
+        fail, out_start, out_ids = self._fail, self._out_start, self._out_ids
+        node = 0
+        for i, ch in enumerate(text):
+            code = ord(ch)
+            nxt = self._next(node, code)
+            while nxt < 0 and node:
+                node = fail[node]
+                nxt = self._next(node, code)
+            node = nxt if nxt >= 0 else 0
+            for k in range(out_start[node], out_start[node + 1]):
+                yield i, out_ids[k]
+
+    def _phrase(self, pid: int) -> str:
+        ph = self._decoded[pid]
+        if ph is None:
+            ph = self._decoded[pid] = self._phrase_of(pid)
+        return ph
+
+    def finditer(self, text: str) -> Iterator[PhraseMatch]:
+        pat_pid, pat_len = self._pat_pid, self._pat_len
+        for i, k in self._find_ids(text):
+            yield PhraseMatch(i + 1 - pat_len[k], i + 1, self._phrase(pat_pid[k]))
+
+    def findall(self, text: str) -> List[PhraseMatch]:
+        return list(self.finditer(text))
+
+    def search(self, text: str) -> bool:
+        for _ in self._find_ids(text):
+            return True
+        return False
+
+    def matched_by_rank(self, text: str) -> List[str]:
+        ids = {self._pat_pid[k] for _, k in self._find_ids(text)}
+        return [self._phrase(pid) for pid in sorted(ids)]
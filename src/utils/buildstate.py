@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import datetime as dt
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from hashlib import sha256
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .io import file_sha256
+
+# outputs/{domain}/build_state.json: 입력 파일 지문 캐시 + 단계별 마지막 성공 입력 해시
+BUILD_STATE_FILE = "build_state.json"
+BUILD_STATE_VERSION = 1
+UTILS_DIR = Path(__file__).resolve().parent
+
+
+@dataclass
+class StageSpec:
+    """단계 입력 선언. files/code는 내용 해시, params는 결과에 영향을 주는 인자만."""
+
+    files: List[Path]
+    outputs: List[Path]
+    params: Dict[str, Any] = field(default_factory=dict)
+    code: List[Path] = field(default_factory=list)
+
+
+def stage_code(stage_file: str) -> List[Path]:
+    # 코드 버전: 단계 스크립트 + 공용 utils 전체
+    return [Path(stage_file).resolve()] + sorted(UTILS_DIR.glob("*.py"))
+
+
+class BuildState:
+    """content-hash 증분 빌드 상태.
+
+    큰 파일(원천 CSV 등)은 size+mtime 지문이 같으면 캐시된 해시를 쓰고, 바뀐 경우에만 전체 해시를 다시 계산한다.
+    파이프라인 러너에서 스레드로 공유되므로 잠금으로 보호.
+    """
+
+    def __init__(self, path: Path, root: Path):
+        self.path = path
+        self.root = root
+        self._lock = threading.RLock()
+        data: dict = {}
+        if path.exists():
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                data = {}
+        if data.get("version") != BUILD_STATE_VERSION:
+            data = {}
+        self.files: Dict[str, dict] = data.get("files") or {}
+        self.stages: Dict[str, dict] = data.get("stages") or {}
+
+    @classmethod
+    def for_domain(cls, paths: Any, domain: str) -> "BuildState":
+        return cls(paths.outputs / domain / BUILD_STATE_FILE, paths.root)
+
+    def _key(self, path: Path) -> str:
+        try:
+            return path.resolve().relative_to(self.root.resolve()).as_posix()
+        except ValueError:
+            return path.resolve().as_posix()
+
+    def digest(self, path: Path) -> str:
+        """파일 내용 해시. size+mtime이 캐시와 같으면 다시 읽지 않는다."""
+        st = path.stat()
+        key = self._key(path)
+        with self._lock:
+            ent = self.files.get(key)
+            if ent and ent.get("size") == st.st_size and ent.get("mtime_ns") == st.st_mtime_ns:
+                return ent["sha256"]
+        h = file_sha256(path)
+        with self._lock:
+            self.files[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": h}
+        return h
+
+    def input_hashes(self, spec: StageSpec) -> Dict[str, str]:
+        out: Dict[str, str] = {}
+        for p in spec.files:
+            out[self._key(p)] = self.digest(p) if p.exists() else "missing"
+        code = sha256()
+        for p in spec.code:
+            code.update(self._key(p).encode("utf-8"))
+            code.update(self.digest(p).encode("utf-8"))
+        out["code"] = f"sha256:{code.hexdigest()}"
+        params = json.dumps(spec.params, ensure_ascii=False, sort_keys=True, default=str)
+        out["params"] = f"sha256:{sha256(params.encode('utf-8')).hexdigest()}"
+        return out
+
+    def is_fresh(self, stage: str, hashes: Dict[str, str], outputs: List[Path]) -> bool:
+        with self._lock:
+            prev = (self.stages.get(stage) or {}).get("inputs")
+        return prev == hashes and all(p.exists() for p in outputs)
+
+    def record(self, stage: str, hashes: Dict[str, str]) -> None:
+        with self._lock:
+            self.stages[stage] = {
+                "inputs": hashes,
+                "finished_at": dt.datetime.now(dt.timezone.utc).isoformat(),
+            }
+            self.save()
+
+    def save(self) -> None:
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump({"version": BUILD_STATE_VERSION, "files": self.files, "stages": self.stages},
+                          f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+
+
+def run_incremental(state: BuildState, stage: str, spec: StageSpec, run: Callable[[], Any],
+                    force: bool = False) -> Tuple[bool, Optional[Any]]:
+    """입력 해시가 마지막 성공 실행과 같고 출력이 남아 있으면 건너뛴다. (실행 여부, 결과)를 돌려준다."""
+    hashes = state.input_hashes(spec)
+    if not force and state.is_fresh(stage, hashes, spec.outputs):
+        print(f"[Build] {stage} up to date, skipped")
+        return False, None
+    result = run()
+    # 단계가 성공한 뒤에만 기록(실패 시 다음 실행에서 다시 시도)
+    state.record(stage, hashes)
+    return True, result
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from rapidfuzz import fuzz
+
+from .fuzzy import MIN_JAMO_SCORE_LEN
+from .jamo import JamoNgramIndex, jamo_key
+from .menu import (DEFAULT_PHRASE_CONFIDENCE, MenuMapping, _phrase_key, alias_index, match_text,
+                   phrase_index)
+
+# 퍼지 점수 상한은 FUZZY_WEIGHT·신뢰도라 신뢰도가 이보다 높은 exact 히트가 항상 위에 온다
+FUZZY_WEIGHT = 0.8
+DEFAULT_MIN_FUZZY = 75
+# 자모 역색인에서 채점할 phrase 수(질의 1회 상한)
+FUZZY_TOP_K = 64
+# 프롬프트에 넣을 menu.json 행에서 뺄 필드(토큰 절약)
+DROP_MENU_FIELDS = ("base_price",)
+
+
+class Candidate(NamedTuple):
+    key: str  # SKU 또는 별칭 term
+    score: float
+    phrase: str  # 점수를 낸 phrase(메뉴 표시명/alt/별칭)
+    exact: bool
+
+
+@dataclass
+class CandidateSlice:
+    skus: List[Candidate] = field(default_factory=list)
+    aliases: List[Candidate] = field(default_factory=list)
+
+    def sku_list(self) -> List[str]:
+        return [c.key for c in self.skus]
+
+    def alias_terms(self) -> List[str]:
+        return [c.key for c in self.aliases]
+
+
+@dataclass
+class CandidateIndex:
+    """발화 → 후보 SKU/별칭 Top-K(APP_ADVICE 1단계). 프롬프트에 메뉴 전체 대신 후보 행만 넣기 위한 것.
+
+    점수는 phrase 단위로 매겨 SKU/별칭별 최댓값을 쓴다.
+    - exact: 매핑의 Aho-Corasick 매처 히트 → phrase 신뢰도(메뉴 표시명/alt 1.0, 별칭 meta.confidence)
+    - fuzzy: 메뉴 phrase + 별칭 term 전체의 자모 n-gram 역색인으로 상위 후보만 골라 partial_ratio 채점
+      → FUZZY_WEIGHT · 점수/100 · 신뢰도(min_fuzzy 미만은 버림)
+    동점이면 exact, 발화에서 앞선 위치, 등록 순서 순.
+    """
+
+    mapping: MenuMapping
+    # 채점 대상 phrase(메뉴 phrase → 옵션 전용 별칭 순)와 매처 키
+    phrases: List[str]
+    targets: List[str]
+    jamo: JamoNgramIndex
+
+    def _confidence(self, phrase: str) -> float:
+        return self.mapping.phrase_confidence.get(phrase, DEFAULT_PHRASE_CONFIDENCE)
+
+    def phrase_scores(self, text: str, min_fuzzy: int = DEFAULT_MIN_FUZZY,
+                      fuzzy_top_k: int = FUZZY_TOP_K) -> Dict[str, Tuple[float, bool, int]]:
+        """phrase → (점수, exact 여부, 순위 키). 순위 키는 exact면 발화 내 시작 위치, 퍼지면 len(text) + phrase 순번."""
+        m = self.mapping
+        text = match_text(m, text)
+        out: Dict[str, Tuple[float, bool, int]] = {}
+        for ac in (phrase_index(m), alias_index(m, m.aliases)):
+            for hit in ac.finditer(text):
+                if hit.phrase not in out:
+                    out[hit.phrase] = (self._confidence(hit.phrase), True, hit.start)
+        key = _phrase_key(m)
+        query = key(text) if key is not None else text.lower()
+        jkey = None
+        for pid in self.jamo.candidates(query, top_k=fuzzy_top_k):
+            phrase = self.phrases[pid]
+            if phrase in out:
+                continue
+            score = fuzz.partial_ratio(query, self.targets[pid])
+            if len(self.jamo.keys[pid]) >= MIN_JAMO_SCORE_LEN:
+                if jkey is None:
+                    jkey = jamo_key(query)
+                score = max(score, fuzz.partial_ratio(jkey, self.jamo.keys[pid]))
+            if score >= min_fuzzy:
+                out[phrase] = (FUZZY_WEIGHT * score / 100 * self._confidence(phrase), False, len(text) + pid)
+        return out
+
+    def query(self, text: str, k_menu: int = 20, k_alias: int = 30, min_fuzzy: int = DEFAULT_MIN_FUZZY,
+              fuzzy_top_k: int = FUZZY_TOP_K) -> CandidateSlice:
+        """발화의 후보 SKU(최대 k_menu)와 별칭(최대 k_alias). 점수 내림차순."""
+        m = self.mapping
+        best_sku: Dict[str, Tuple[tuple, Candidate]] = {}
+        best_alias: List[Tuple[tuple, Candidate]] = []
+        for phrase, (score, exact, pos) in self.phrase_scores(text, min_fuzzy, fuzzy_top_k).items():
+            rank = (-score, not exact, pos)
+            sku = m.phrase_to_sku.get(phrase) or (m.aliases.get(phrase) or {}).get("sku")
+            if sku:
+                cur = best_sku.get(sku)
+                if cur is None or rank < cur[0]:
+                    best_sku[sku] = (rank, Candidate(sku, round(score, 4), phrase, exact))
+            if phrase in m.aliases:
+                best_alias.append((rank, Candidate(phrase, round(score, 4), phrase, exact)))
+        skus = [c for _, c in sorted(best_sku.values(), key=lambda x: x[0])[:k_menu]]
+        aliases = [c for _, c in sorted(best_alias, key=lambda x: x[0])[:k_alias]]
+        return CandidateSlice(skus=skus, aliases=aliases)
+
+
+def build_candidate_index(mapping: MenuMapping) -> CandidateIndex:
+    """매핑(load_combined_mapping 또는 MenuIndex.to_mapping)의 메뉴 phrase와 별칭 term으로 역색인을 1회 만든다."""
+    phrases = list(mapping.phrase_to_sku)
+    seen = set(phrases)
+    phrases.extend(t for t in mapping.aliases if t not in seen)
+    key = _phrase_key(mapping)
+    targets = [key(p) for p in phrases] if key is not None else [p.lower() for p in phrases]
+    return CandidateIndex(mapping=mapping, phrases=phrases, targets=targets, jamo=JamoNgramIndex(targets))
+
+
+def slice_menu_rows(menu_json: dict, skus: Iterable[str], drop: Iterable[str] = DROP_MENU_FIELDS) -> List[dict]:
+    """menu.json items 중 후보 SKU 행만(후보 순서 유지, drop 필드 제거)."""
+    by_sku = {it.get("sku"): it for it in (menu_json.get("items") or []) if isinstance(it, dict)}
+    drop = set(drop)
+    return [{k: v for k, v in by_sku[s].items() if k not in drop} for s in skus if s in by_sku]
+
+
+def slice_alias_rows(aliases_json: dict, terms: Iterable[str]) -> Dict[str, dict]:
+    """aliases.json 중 후보 term만(후보 순서 유지)."""
+    return {t: aliases_json[t] for t in terms if t in aliases_json}
+
+
+def top_candidates(text: str, mapping: MenuMapping, k_menu: int = 20, k_alias: int = 30,
+                   index: Optional[CandidateIndex] = None) -> CandidateSlice:
+    """1회성 호출용. 반복 호출이면 build_candidate_index로 만든 인덱스를 넘긴다."""
+    return (index or build_candidate_index(mapping)).query(text, k_menu=k_menu, k_alias=k_alias)
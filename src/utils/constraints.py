@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# slots.schema.json의 아이템 옵션 키(이 밖의 키는 few_shots/evalset에 싣지 않는다)
+SCHEMA_OPTION_KEYS = ("size", "temp", "shot", "syrup", "ice")
+# 스키마 enum(값 검사용). temp는 SKU별 temps 마스크로도 좁힌다
+SCHEMA_ENUMS: Dict[str, List[str]] = {"size": ["S", "M", "L"], "temp": ["HOT", "ICE"], "ice": ["less", "normal", "more"]}
+# ICE 온도를 지원하는 SKU는 tags에 없어도 이 태그가 있는 것으로 본다(ice 옵션의 applies_to_tags)
+ICED_TAG = "iced"
+
+
+def compile_constraints(items: Iterable[dict], options: Optional[dict] = None) -> Dict[str, Any]:
+    """메뉴 옵션 정책을 SKU별 비트마스크 표로 1회 해석한다(menu.json `constraints`).
+
+    SKU별 허용 옵션 = (allow_options가 있으면 그 목록, 없으면 options.*.applies_to_tags가 SKU tags와 겹치는 옵션)
+    + size(sizes_enabled) + temp − deny_options. 명시 allow_options가 태그 정책보다 우선한다.
+    temps 비트는 SCHEMA_ENUMS["temp"] 순서이며, temps를 적지 않은 SKU는 모든 온도를 허용한다.
+    """
+    options = options or {}
+    option_keys: List[str] = ["size", "temp"]
+    for k in list(options) + [k for it in items for k in (it.get("allow_options") or []) + (it.get("deny_options") or [])]:
+        if k not in option_keys:
+            option_keys.append(k)
+    bit = {k: 1 << i for i, k in enumerate(option_keys)}
+    temps_all = (1 << len(SCHEMA_ENUMS["temp"])) - 1
+
+    skus: Dict[str, Dict[str, int]] = {}
+    for it in items:
+        sku = it.get("sku")
+        if not sku:
+            continue
+        temps = [t for t in (it.get("temps") or []) if t in SCHEMA_ENUMS["temp"]]
+        tags = set(it.get("tags") or [])
+        if "ICE" in temps:
+            tags.add(ICED_TAG)
+        if isinstance(it.get("allow_options"), list):
+            allowed = set(it["allow_options"])
+        else:
+            allowed = {k for k, c in options.items()
+                       if not (c or {}).get("applies_to_tags") or tags & set(c["applies_to_tags"])}
+        if it.get("sizes_enabled"):
+            allowed.add("size")
+        allowed.add("temp")
+        allowed -= set(it.get("deny_options") or [])
+        skus[sku] = {
+            "options": sum(bit[k] for k in allowed if k in bit),
+            "temps": sum(1 << i for i, t in enumerate(SCHEMA_ENUMS["temp"]) if t in temps) or temps_all,
+        }
+
+    ranges: Dict[str, List[Optional[int]]] = {}
+    for k, c in options.items():
+        if (c or {}).get("type") == "integer":
+            ranges[k] = [c.get("min", 0), c.get("max")]
+    ranges.setdefault("shot", [0, None])
+    return {"option_keys": option_keys, "enums": SCHEMA_ENUMS, "ranges": ranges, "skus": skus}
+
+
+@dataclass
+class MenuConstraints:
+    """menu.json `constraints` 표의 런타임 뷰. 03/04 옵션 필터와 05 검증이 같은 규칙을 쓴다.
+
+    비트마스크는 열 때 1회 SKU별 (허용 스키마 옵션 키, 허용 temp 값) frozenset으로 풀어 두므로
+    아이템마다 set을 새로 만들지 않고 조회만 한다.
+    """
+
+    option_keys: List[str]
+    enums: Dict[str, List[str]]
+    ranges: Dict[str, List[Optional[int]]]
+    skus: Dict[str, Tuple[int, int]]
+    _rules: Dict[str, Tuple[frozenset, frozenset]] = field(init=False, repr=False)
+    _enum_sets: Dict[str, frozenset] = field(init=False, repr=False)
+    _unknown: Tuple[frozenset, frozenset] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        temps = self.enums["temp"]
+        self._enum_sets = {k: frozenset(v) for k, v in self.enums.items()}
+        self._rules = {
+            sku: (frozenset(k for i, k in enumerate(self.option_keys) if opt_mask >> i & 1 and k in SCHEMA_OPTION_KEYS),
+                  frozenset(t for i, t in enumerate(temps) if temp_mask >> i & 1))
+            for sku, (opt_mask, temp_mask) in self.skus.items()
+        }
+        # 모르는 SKU: 예전 필터처럼 temp만 통과
+        self._unknown = (frozenset(["temp"]), frozenset(temps))
+
+    @classmethod
+    def from_table(cls, table: Dict[str, Any]) -> "MenuConstraints":
+        return cls(option_keys=list(table["option_keys"]), enums={k: list(v) for k, v in table["enums"].items()},
+                   ranges={k: list(v) for k, v in (table.get("ranges") or {}).items()},
+                   skus={s: (int(r["options"]), int(r["temps"])) for s, r in table["skus"].items()})
+
+    @classmethod
+    def from_menu_json(cls, menu_json: dict) -> "MenuConstraints":
+        """menu.json의 constraints 표. 표가 없는 예전 menu.json이면 items의 allow_options/sizes_enabled/temps로 만든다."""
+        table = menu_json.get("constraints")
+        if not isinstance(table, dict):
+            table = compile_constraints([it for it in (menu_json.get("items") or []) if isinstance(it, dict)])
+        return cls.from_table(table)
+
+    def allowed_options(self, sku: str) -> List[str]:
+        mask = self.skus.get(sku, (0, 0))[0]
+        return [k for i, k in enumerate(self.option_keys) if mask >> i & 1]
+
+    def option_problem(self, sku: str, key: str, value: object) -> Optional[str]:
+        """옵션 1개의 위반 사유(없으면 None). 메시지는 05 검증 리포트에 그대로 쓰인다."""
+        allowed, temps = self._rules.get(sku, self._unknown)
+        if key not in allowed:
+            if key not in SCHEMA_OPTION_KEYS:
+                return f"unsupported option key: {key}"
+            return f"option not allowed for {sku}: {key}"
+        enum = self._enum_sets.get(key)
+        if enum is not None:
+            if value not in enum:
+                return f"invalid {key}: {value}"
+            if key == "temp" and value not in temps:
+                return f"temp not supported for {sku}: {value}"
+            return None
+        bounds = self.ranges.get(key)
+        if bounds is not None:
+            lo, hi = bounds
+            if not isinstance(value, int) or isinstance(value, bool) or value < (lo or 0) or (hi is not None and value > hi):
+                return f"invalid {key}: {value}"
+        return None
+
+    def filter_items(self, items: List[dict]) -> List[dict]:
+        """아이템 옵션 중 규칙을 어기는 것만 제거한다(제자리 수정, 옵션이 비면 options 키 삭제)."""
+        for it in items:
+            opts = it.get("options")
+            if not isinstance(opts, dict):
+                continue
+            sku = it.get("sku")
+            kept = {k: v for k, v in opts.items() if self.option_problem(sku, k, v) is None}
+            if kept:
+                it["options"] = kept
+            else:
+                del it["options"]
+        return items
+
+    def item_problems(self, item: dict) -> List[str]:
+        sku = item.get("sku")
+        if sku not in self._rules:
+            return [f"unknown sku: {sku}"]
+        opts = item.get("options")
+        problems: List[str] = []
+        if isinstance(opts, dict):
+            for k, v in opts.items():
+                p = self.option_problem(sku, k, v)
+                if p is not None:
+                    problems.append(p)
+        return problems
+
+    def order_problems(self, obj: dict) -> List[str]:
+        """few_shots/evalset 한 줄의 주문 아이템 위반 목록."""
+        data = obj.get("target") or obj.get("gold") or {}
+        order = (data or {}).get("order") or {}
+        problems: List[str] = []
+        for item in order.get("items") or []:
+            problems.extend(self.item_problems(item))
+        return problems
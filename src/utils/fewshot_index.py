@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import json
+import math
+import mmap
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .io import file_sha256
+from .packed import StringPool, open_packed, pack_arrays
+
+# 파일 레이아웃은 src.utils.packed 참고
+MAGIC = b"MALROFSI"
+FORMAT_VERSION = 1
+NGRAM_SIZES = (2, 3)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def ngram_counts(text: str, sizes: Iterable[int] = NGRAM_SIZES) -> Counter:
+    """소문자 + 공백 제거 후 문자 n-gram 빈도(띄어쓰기가 다른 STT 발화도 같은 n-gram을 낸다)."""
+    t = "".join(text.lower().split())
+    grams: Counter = Counter()
+    for n in sizes:
+        if len(t) < n:
+            continue
+        grams.update(t[i:i + n] for i in range(len(t) - n + 1))
+    if not grams and t:
+        grams[t] = 1
+    return grams
+
+
+def _example_skus(row: dict) -> List[str]:
+    items = (((row.get("target") or {}).get("order") or {}).get("items")) or []
+    return list(dict.fromkeys(it["sku"] for it in items if isinstance(it, dict) and isinstance(it.get("sku"), str)))
+
+
+def build_fewshot_index(rows: List[dict], lines: Optional[List[str]] = None) -> bytes:
+    """few_shots 행의 input에 대한 문자 n-gram BM25 역색인을 직렬화한다.
+
+    postings에는 문서별 BM25 가중치(idf · tf 포화)를 미리 계산해 두므로 질의는 가중치 합만 하면 된다.
+    lines(원본 JSONL 줄)를 주면 그대로 저장해 조회 결과로 돌려준다.
+    """
+    if lines is None:
+        lines = [json.dumps(r, ensure_ascii=False) for r in rows]
+    pool = StringPool()
+    docs = [ngram_counts(str(r.get("input", ""))) for r in rows]
+    lengths = [sum(d.values()) for d in docs]
+    avgdl = (sum(lengths) / len(lengths)) if lengths else 0.0
+    df: Counter = Counter()
+    for d in docs:
+        df.update(d.keys())
+    n_docs = len(docs)
+    terms = sorted(df)
+    term_id = {t: i for i, t in enumerate(terms)}
+
+    postings: List[List[Tuple[int, float]]] = [[] for _ in terms]
+    for doc_id, (d, dl) in enumerate(zip(docs, lengths)):
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * dl / avgdl) if avgdl else BM25_K1
+        for t, tf in d.items():
+            idf = math.log(1 + (n_docs - df[t] + 0.5) / (df[t] + 0.5))
+            postings[term_id[t]].append((doc_id, idf * tf * (BM25_K1 + 1) / (tf + norm)))
+    post_start, post_doc, post_w = [0], [], []
+    for plist in postings:
+        for doc_id, w in plist:
+            post_doc.append(doc_id)
+            post_w.append(w)
+        post_start.append(len(post_doc))
+
+    skus: List[str] = []
+    sku_id: Dict[str, int] = {}
+    doc_sku_start, doc_sku = [0], []
+    for r in rows:
+        for sku in _example_skus(r):
+            if sku not in sku_id:
+                sku_id[sku] = len(skus)
+                skus.append(sku)
+            doc_sku.append(sku_id[sku])
+        doc_sku_start.append(len(doc_sku))
+
+    arrays: Dict[str, Tuple[str, Any]] = {
+        "term.str": ("i", [pool.add(t) for t in terms]),
+        "term.post_start": ("i", post_start),
+        "post.doc": ("i", post_doc),
+        "post.w": ("f", post_w),
+        "doc.line": ("i", [pool.add(line) for line in lines]),
+        "doc.sku_start": ("i", doc_sku_start),
+        "doc.sku": ("i", doc_sku),
+        "sku.str": ("i", [pool.add(s) for s in skus]),
+        "str.offsets": ("q", pool.offsets),
+        "str.blob": ("B", pool.blob),
+    }
+    meta = {
+        "ngram_sizes": list(NGRAM_SIZES),
+        "bm25": {"k1": BM25_K1, "b": BM25_B, "avgdl": avgdl},
+        "counts": {"docs": n_docs, "terms": len(terms), "postings": len(post_doc), "skus": len(skus)},
+    }
+    return pack_arrays(arrays, meta, MAGIC, FORMAT_VERSION)
+
+
+def write_fewshot_index(path: Path, rows: List[dict], lines: Optional[List[str]] = None) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("wb") as f:
+        f.write(build_fewshot_index(rows, lines))
+
+
+@dataclass
+class FewShotHit:
+    doc: int
+    score: float
+    skus: List[str]
+    # few_shots.jsonl 원본 줄(프롬프트에 그대로 넣을 수 있음). dict가 필요하면 example
+    line: str
+
+    @property
+    def example(self) -> dict:
+        return json.loads(self.line)
+
+
+@dataclass
+class FewShotIndex:
+    """mmap으로 연 few-shot 검색 인덱스. postings는 numpy 뷰로 바로 읽는다(복사 없음).
+
+    열 때는 아무것도 디코딩하지 않는다. term은 정렬된 term.str을 질의 때 이진 탐색하고(UTF-8 바이트 순서 == 코드포인트 순서),
+    SKU 이름·SKU → 문서 목록·SKU 없는 문서 목록은 처음 필요할 때(max_per_sku / order_only) 1회 만든다.
+    """
+
+    path: Path
+    meta: dict
+    arrays: Dict[str, memoryview]
+    _mm: Optional[mmap.mmap] = None
+    _skus: Optional[List[str]] = None
+    _sku_docs: Optional[Dict[str, np.ndarray]] = None
+    _skuless: Optional[np.ndarray] = None
+
+    def __post_init__(self) -> None:
+        a = self.arrays
+        self._post_start = np.frombuffer(a["term.post_start"], dtype=np.int32).astype(np.int64)
+        self._post_doc = np.frombuffer(a["post.doc"], dtype=np.int32)
+        self._post_w = np.frombuffer(a["post.w"], dtype=np.float32)
+        self._sizes = tuple(self.meta.get("ngram_sizes") or NGRAM_SIZES)
+
+    def __len__(self) -> int:
+        return len(self.arrays["doc.line"])
+
+    def string(self, sid: int) -> str:
+        off = self.arrays["str.offsets"]
+        return bytes(self.arrays["str.blob"][off[sid]:off[sid + 1]]).decode("utf-8")
+
+    def line(self, doc: int) -> str:
+        return self.string(self.arrays["doc.line"][doc])
+
+    def example(self, doc: int) -> dict:
+        return json.loads(self.line(doc))
+
+    def term_id(self, term: str) -> Optional[int]:
+        """정렬된 term.str에서 이진 탐색(문자열 풀의 바이트를 그대로 비교, 디코딩 없음). 없으면 None."""
+        a = self.arrays
+        ids, off, blob = a["term.str"], a["str.offsets"], a["str.blob"]
+        key = term.encode("utf-8")
+        lo, hi = 0, len(ids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            sid = ids[mid]
+            if bytes(blob[off[sid]:off[sid + 1]]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(ids):
+            sid = ids[lo]
+            if bytes(blob[off[sid]:off[sid + 1]]) == key:
+                return lo
+        return None
+
+    @property
+    def skus(self) -> List[str]:
+        if self._skus is None:
+            self._skus = [self.string(sid) for sid in self.arrays["sku.str"]]
+        return self._skus
+
+    def doc_skus(self, doc: int) -> List[str]:
+        a = self.arrays
+        start, skus = a["doc.sku_start"], self.skus
+        return [skus[s] for s in a["doc.sku"][start[doc]:start[doc + 1]]]
+
+    def _counts(self) -> np.ndarray:
+        return np.diff(np.frombuffer(self.arrays["doc.sku_start"], dtype=np.int32))
+
+    def sku_docs(self, sku: str) -> np.ndarray:
+        """sku를 포함한 문서 id(다양성 제약용). 처음 호출할 때 전체 표를 1회 만든다."""
+        if self._sku_docs is None:
+            counts = self._counts()
+            docs = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+            sku_ids = np.frombuffer(self.arrays["doc.sku"], dtype=np.int32)
+            order = np.argsort(sku_ids, kind="stable")
+            bounds = np.searchsorted(sku_ids[order], np.arange(len(self.skus) + 1))
+            self._sku_docs = {name: docs[order[bounds[i]:bounds[i + 1]]] for i, name in enumerate(self.skus)}
+        return self._sku_docs.get(sku, np.zeros(0, dtype=np.int64))
+
+    def skuless_docs(self) -> np.ndarray:
+        """SKU가 없는 문서(ASK) id."""
+        if self._skuless is None:
+            self._skuless = np.flatnonzero(self._counts() == 0)
+        return self._skuless
+
+    def scores(self, text: str) -> np.ndarray:
+        """모든 문서의 BM25 점수(질의 n-gram 가중치 합)."""
+        tids = [i for i in map(self.term_id, ngram_counts(text, self._sizes)) if i is not None]
+        if not tids:
+            return np.zeros(len(self), dtype=np.float32)
+        # 질의 term들의 posting 구간을 한 번에 모아 문서별로 가중치 합산
+        t = np.array(tids, dtype=np.int64)
+        starts, lens = self._post_start[t], self._post_start[t + 1] - self._post_start[t]
+        idx = np.arange(int(lens.sum()), dtype=np.int64) + np.repeat(starts - np.cumsum(lens) + lens, lens)
+        return np.bincount(self._post_doc[idx], weights=self._post_w[idx], minlength=len(self)).astype(np.float32)
+
+    def query(self, text: str, k: int = 8, max_per_sku: Optional[int] = 2, order_only: bool = False) -> List[FewShotHit]:
+        """점수 상위 k개 예시. max_per_sku면 같은 SKU를 포함한 예시를 그 수까지만 고른다(다양성 제약).
+
+        최고점 문서를 하나씩 고르고, 한도에 닿은 SKU를 포함한 문서는 점수를 한꺼번에 0으로 지운다
+        (후보를 하나씩 건너뛰지 않으므로 인기 SKU가 몰린 인덱스에서도 반복은 k번). 동점이면 파일 순서.
+        order_only면 SKU가 없는 예시(ASK)는 제외한다.
+        """
+        sc = self.scores(text)
+        if order_only:
+            sc[self.skuless_docs()] = 0
+        used: Counter = Counter()
+        hits: List[FewShotHit] = []
+        while len(hits) < k:
+            doc = int(np.argmax(sc)) if len(sc) else 0
+            if not len(sc) or sc[doc] <= 0:
+                break
+            hit = FewShotHit(doc=doc, score=float(sc[doc]), skus=self.doc_skus(doc), line=self.line(doc))
+            hits.append(hit)
+            sc[doc] = 0
+            if max_per_sku is None:
+                continue
+            for sku in hit.skus:
+                used[sku] += 1
+                if used[sku] >= max_per_sku:
+                    sc[self.sku_docs(sku)] = 0
+        return hits
+
+
+def load_fewshot_index(path: Path, expected_hash: Optional[str] = None) -> FewShotIndex:
+    """FewShotIndex를 mmap으로 연다. expected_hash가 주어지면 manifest 해시와 대조."""
+    if expected_hash is not None and file_sha256(path) != expected_hash:
+        raise ValueError(f"few-shot index hash mismatch: {path}")
+    mm, meta, arrays = open_packed(path, MAGIC, FORMAT_VERSION, "few-shot index")
+    return FewShotIndex(path=path, meta=meta, arrays=arrays, _mm=mm)
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from rapidfuzz import fuzz, process
+
+from .jamo import JamoNgramIndex, jamo_key
+from .textnorm import normalize
+
+# 자모 점수는 짧은 phrase(예: "아아")에서 오탐이 많아 일정 길이 이상에만 적용
+MIN_JAMO_SCORE_LEN = 6
+
+
+class FuzzyResolver:
+    """phrase 목록에 대한 partial_ratio 퍼지 매칭 + LRU 캐시.
+
+    캐시 키는 (정규화 텍스트, threshold).
+    - use_jamo_index=False(기본): 전체 phrase 대상 음절 partial_ratio, 미스는 `process.cdist`로 일괄 채점.
+    - True: 자모 n-gram 색인으로 상위 top_k 후보만 골라 음절/자모 partial_ratio 중 높은 점수로 채점
+      (STT 띄어쓰기·자모 오류에 강하고 메뉴 크기에 준선형). 결과가 전체 채점과 다를 수 있어 스테이지에서만 켠다.
+    key가 주어지면 key(phrase)(예: 소문자화)에 대해 채점하고 결과는 원래 phrase로 돌려준다.
+    """
+
+    def __init__(self, phrases: Iterable[str], maxsize: int = 65536, chunk_size: int = 2048,
+                 use_jamo_index: bool = False, top_k: int = 8, key: Optional[Callable[[str], str]] = None):
+        self.phrases: List[str] = [p for p in phrases if p]
+        # 채점 대상 문자열(key 미지정 시 phrase 그대로)
+        self.targets: List[str] = [key(p) for p in self.phrases] if key is not None else self.phrases
+        self.maxsize = maxsize
+        self.chunk_size = chunk_size
+        self.top_k = top_k
+        self.index: Optional[JamoNgramIndex] = JamoNgramIndex(self.targets) if use_jamo_index else None
+        self._cache: "OrderedDict[Tuple[str, int], Optional[str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # 파이프라인 러너에서 스테이지가 스레드로 매핑을 공유하므로 캐시 갱신은 잠금
+        self._lock = threading.Lock()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._cache)}
+
+    def _get(self, key: Tuple[str, int]) -> Tuple[bool, Optional[str]]:
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return True, self._cache[key]
+        return False, None
+
+    def _put(self, key: Tuple[str, int], phrase: Optional[str]) -> None:
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = phrase
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def resolve(self, text: str, threshold: int = 88) -> Optional[str]:
+        """threshold 이상인 최고 점수 phrase(동점이면 앞선 phrase)."""
+        key = (normalize(text), threshold)
+        found, phrase = self._get(key)
+        if found:
+            return phrase
+        phrase = self._score(key[0], threshold)
+        self._put(key, phrase)
+        return phrase
+
+    def _score(self, text: str, threshold: int) -> Optional[str]:
+        if not self.phrases:
+            return None
+        if self.index is None:
+            cand = process.extractOne(text, self.targets, scorer=fuzz.partial_ratio, score_cutoff=threshold)
+            return self.phrases[cand[2]] if cand else None
+        best, best_score = None, float(threshold)
+        jkey = None
+        for pid in sorted(self.index.candidates(text, top_k=self.top_k)):
+            score = fuzz.partial_ratio(text, self.targets[pid])
+            pkey = self.index.keys[pid]
+            if len(pkey) >= MIN_JAMO_SCORE_LEN:
+                if jkey is None:
+                    jkey = jamo_key(text)
+                score = max(score, fuzz.partial_ratio(jkey, pkey))
+            # 동점이면 등록 순서가 앞선 phrase 유지
+            if score > best_score or (best is None and score >= best_score):
+                best, best_score = self.phrases[pid], score
+        return best
+
+    def resolve_many(self, texts: Iterable[str], threshold: int = 88) -> List[Optional[str]]:
+        """resolve의 배치 버전: 캐시 미스만 모아 일괄 채점(색인 미사용 시 cdist, score_cutoff, workers=-1)."""
+        keys = [(normalize(t), threshold) for t in texts]
+        out: Dict[Tuple[str, int], Optional[str]] = {}
+        pending: List[Tuple[str, int]] = []
+        for key in keys:
+            if key in out:
+                continue
+            found, phrase = self._get(key)
+            if found:
+                out[key] = phrase
+            else:
+                out[key] = None
+                pending.append(key)
+        if pending and self.index is not None:
+            for key in pending:
+                out[key] = self._score(key[0], threshold)
+        elif pending and self.phrases:
+            for i in range(0, len(pending), self.chunk_size):
+                block = pending[i:i + self.chunk_size]
+                scores = process.cdist([k[0] for k in block], self.targets, scorer=fuzz.partial_ratio,
+                                       score_cutoff=threshold, workers=-1)
+                best = scores.argmax(axis=1)
+                for row, key in enumerate(block):
+                    j = int(best[row])
+                    out[key] = self.phrases[j] if scores[row, j] >= threshold else None
+        for key in pending:
+            self._put(key, out[key])
+        return [out[k] for k in keys]
@@ -4,7 +4,7 @@ import json
 from dataclasses import dataclass
 from hashlib import sha256
 from pathlib import Path
-from typing import Iterable, Iterator, Optional
+from typing import Iterable, Iterator, List, Optional
 
 import pandas as pd
 import yaml
@@ -46,6 +46,120 @@ def file_sha256(path: Path) -> str:
     return f"sha256:{h.hexdigest()}"
 
 
+# interim/raw Parquet에서 dictionary(categorical)로 인코딩할 저카디널리티 열
+CATEGORICAL_COLUMNS = ["발화자", "카테고리", "QA여부", "인텐트"]
+
+
+def require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise RuntimeError("parquet format requires pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def to_categorical(df: pd.DataFrame, columns: Iterable[str] = CATEGORICAL_COLUMNS) -> pd.DataFrame:
+    cols = [c for c in columns if c in df.columns]
+    return df.astype({c: "category" for c in cols}) if cols else df
+
+
+def arrow_schema_for(df: pd.DataFrame):
+    """CATEGORICAL_COLUMNS는 dictionary<int32,string>으로 고정한 Arrow 스키마(chunk 간 스키마 일치용)."""
+    pa = require_pyarrow()
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    for i, name in enumerate(schema.names):
+        if name in CATEGORICAL_COLUMNS:
+            schema = schema.set(i, pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+    return schema.remove_metadata()
+
+
+class TableWriter:
+    """CSV/Parquet 공용 append writer(확장자로 포맷 결정). chunk 단위 스트리밍 출력용."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.parquet = path.suffix == ".parquet"
+        self._f = None
+        self._pq_writer = None
+        self._schema = None
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.parquet:
+            pa = require_pyarrow()
+            import pyarrow.parquet as pq
+            if self._pq_writer is None:
+                self._schema = arrow_schema_for(df)
+                self._pq_writer = pq.ParquetWriter(self.path, self._schema)
+            self._pq_writer.write_table(pa.Table.from_pandas(df, schema=self._schema, preserve_index=False))
+            return
+        if self._f is None:
+            self._f = self.path.open("w", encoding="utf-8", newline="")
+            df.to_csv(self._f, index=False, header=True)
+        else:
+            df.to_csv(self._f, index=False, header=False)
+
+    def close(self) -> None:
+        if self._pq_writer is not None:
+            self._pq_writer.close()
+        if self._f is not None:
+            self._f.close()
+
+    def __enter__(self) -> "TableWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def write_table(path: Path, df: pd.DataFrame) -> None:
+    with TableWriter(path) as w:
+        w.write(df)
+
+
+def interim_file(paths: "Paths", domain: str) -> Path:
+    """{domain}_orders.parquet/.csv 중 최신 파일(둘 다 있으면 mtime 기준)."""
+    cands = [p for p in (paths.data_interim / f"{domain}_orders.parquet", paths.data_interim / f"{domain}_orders.csv") if p.exists()]
+    if not cands:
+        raise FileNotFoundError(f"missing interim file: {paths.data_interim / f'{domain}_orders.csv'}")
+    return max(cands, key=lambda p: p.stat().st_mtime)
+
+
+def read_interim(paths: "Paths", domain: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """interim 로드. columns가 주어지면 해당 열만 읽는다(Parquet은 열 pushdown, CSV는 usecols)."""
+    path = interim_file(paths, domain)
+    if path.suffix == ".parquet":
+        require_pyarrow()
+        import pyarrow.parquet as pq
+        if columns is not None:
+            names = set(pq.read_schema(path).names)
+            columns = [c for c in columns if c in names]
+        return pq.read_table(path, columns=columns).to_pandas()
+    if columns is None:
+        return pd.read_csv(path)
+    wanted = set(columns)
+    return pd.read_csv(path, usecols=lambda c: c in wanted)
+
+
+def iter_interim_chunks(paths: "Paths", domain: str, columns: Optional[List[str]] = None,
+                        chunksize: int = 200_000) -> Iterator[pd.DataFrame]:
+    """interim을 chunk 단위로 읽는다(메모리 상한 ~ chunksize 행). 열 선택은 read_interim과 같다."""
+    path = interim_file(paths, domain)
+    if path.suffix == ".parquet":
+        require_pyarrow()
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(path)
+        if columns is not None:
+            names = set(pf.schema_arrow.names)
+            columns = [c for c in columns if c in names]
+        for batch in pf.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+        return
+    wanted = set(columns) if columns is not None else None
+    yield from pd.read_csv(path, usecols=(lambda c: c in wanted) if wanted is not None else None, chunksize=chunksize)
+
+
 def load_yaml(path: Path) -> dict:
     with path.open("r", encoding="utf-8") as f:
         return yaml.safe_load(f)
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+_SBASE, _LCOUNT, _VCOUNT, _TCOUNT = 0xAC00, 19, 21, 28
+_NCOUNT = _VCOUNT * _TCOUNT
+_SCOUNT = _LCOUNT * _NCOUNT
+
+
+def decompose(text: str) -> str:
+    """한글 음절을 초성/중성/종성(조합형 자모)으로 분해한다. 그 외 문자는 그대로."""
+    out: List[str] = []
+    for ch in text:
+        code = ord(ch) - _SBASE
+        if 0 <= code < _SCOUNT:
+            out.append(chr(0x1100 + code // _NCOUNT))
+            out.append(chr(0x1161 + (code % _NCOUNT) // _TCOUNT))
+            t = code % _TCOUNT
+            if t:
+                out.append(chr(0x11A7 + t))
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+def jamo_key(text: str) -> str:
+    """공백을 제거한 소문자 자모열(STT 띄어쓰기 오류에 둔감)."""
+    return decompose("".join(text.lower().split()))
+
+
+def jamo_ngrams(key: str, n: int) -> set:
+    if len(key) <= n:
+        return {key} if key else set()
+    return {key[i:i + n] for i in range(len(key) - n + 1)}
+
+
+class JamoNgramIndex:
+    """phrase 자모 n-gram 역색인. 퍼지 채점 대상을 상위 후보로 좁힌다.
+
+    후보 점수 = (질의와 공유하는 phrase n-gram 수) / (phrase n-gram 수).
+    질의 n-gram의 posting만 훑으므로 메뉴 크기에 선형이 아니다.
+    """
+
+    def __init__(self, phrases: Iterable[str], n: int = 3):
+        self.n = n
+        self.phrases: List[str] = list(phrases)
+        self.keys: List[str] = [jamo_key(p) for p in self.phrases]
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._gram_counts: List[int] = []
+        for pid, key in enumerate(self.keys):
+            grams = jamo_ngrams(key, n)
+            self._gram_counts.append(len(grams))
+            for g in grams:
+                self._postings[g].append(pid)
+        self._postings = dict(self._postings)
+
+    def candidates(self, text: str, top_k: int = 8, min_overlap: float = 0.3) -> List[int]:
+        """질의와 n-gram이 min_overlap 비율 이상 겹치는 상위 top_k phrase id(점수 내림차순, 동점은 등록 순)."""
+        hits: Dict[int, int] = defaultdict(int)
+        for g in jamo_ngrams(jamo_key(text), self.n):
+            for pid in self._postings.get(g, ()):
+                hits[pid] += 1
+        scored = [
+            (cnt / self._gram_counts[pid], pid)
+            for pid, cnt in hits.items()
+            if self._gram_counts[pid] and cnt / self._gram_counts[pid] >= min_overlap
+        ]
+        scored.sort(key=lambda x: (-x[0], x[1]))
+        return [pid for _, pid in scored[:top_k]]
@@ -1,22 +1,112 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
-
-from rapidfuzz import fuzz, process
+from typing import Dict, List, NamedTuple, Tuple, Optional
 
+from .automaton import PhraseAutomaton
+from .fuzzy import FuzzyResolver
 from .io import load_yaml
+from .metrics import count
+from .quantity import QuantityParser
+from .slots import SlotExtractor
+from .textnorm import TextNormalizer
 
 
 @dataclass
 class MenuMapping:
     phrase_to_sku: Dict[str, str]
     sku_to_phrases: Dict[str, List[str]]
+    aliases: Dict[str, dict] = field(default_factory=dict)
+    # phrase별 신뢰도(메뉴 표시명/alt=1.0, 별칭=meta.confidence)
+    phrase_confidence: Dict[str, float] = field(default_factory=dict)
+    # 컴파일된 phrase 매처(load_combined_mapping에서 1회 생성, 없으면 지연 생성)
+    index: Optional[PhraseAutomaton] = None
+    alias_index: Optional[PhraseAutomaton] = None
+    # 퍼지 폴백(phrase 목록 1회 생성 + LRU 캐시)
+    fuzzy: Optional[FuzzyResolver] = None
+    # patterns.yml 전처리기. 있으면 매처는 정규화된 phrase로 만들고 매칭 전 텍스트도 같은 규칙으로 정규화
+    normalizer: Optional[TextNormalizer] = None
+    # patterns.yml(parsing.slots/quantity)로 컴파일한 슬롯·수량 추출기. 없으면 파서가 configs/patterns.yml 기본본을 쓴다
+    slot_extractor: Optional[SlotExtractor] = None
+    quantity_parser: Optional[QuantityParser] = None
+    # 퍼지 폴백에 자모 n-gram 후보 색인 사용(FuzzyResolver use_jamo_index). 03/04/파이프라인/평가는 켠다
+    jamo_fuzzy: bool = False
+    # 파싱 캐시 키용 매핑 지문(처음 캐시를 쓸 때 1회 계산). 매처처럼 로드 뒤에는 매핑을 바꾸지 않는다고 본다
+    parse_fingerprint: Optional[str] = None
+
+
+class SkuSpan(NamedTuple):
+    start: int
+    end: int
+    sku: str
+    phrase: str
+    confidence: float
+
+
+DEFAULT_PHRASE_CONFIDENCE = 1.0
+
+
+def _phrase_keys(mapping: Optional[MenuMapping]):
+    return mapping.normalizer.phrase_keys if mapping is not None and mapping.normalizer is not None else None
+
+
+def _phrase_key(mapping: Optional[MenuMapping]):
+    return mapping.normalizer.phrase_key if mapping is not None and mapping.normalizer is not None else None
+
+
+def match_text(mapping: Optional[MenuMapping], text: str) -> str:
+    """매칭 전 텍스트 정규화(매핑에 전처리기가 없으면 그대로)."""
+    if mapping is None or mapping.normalizer is None:
+        return text
+    return mapping.normalizer(text)
+
+
+def compile_mapping_index(mapping: MenuMapping) -> MenuMapping:
+    """phrase_to_sku / aliases 키로 Aho-Corasick 매처를 (재)생성한다."""
+    keys = _phrase_keys(mapping)
+    mapping.index = PhraseAutomaton(mapping.phrase_to_sku.keys(), keys=keys)
+    mapping.alias_index = PhraseAutomaton(mapping.aliases.keys(), keys=keys)
+    mapping.fuzzy = FuzzyResolver(mapping.phrase_to_sku.keys(), use_jamo_index=mapping.jamo_fuzzy,
+                                  key=_phrase_key(mapping))
+    return mapping
+
+
+def phrase_index(mapping: MenuMapping) -> PhraseAutomaton:
+    if mapping.index is None:
+        mapping.index = PhraseAutomaton(mapping.phrase_to_sku.keys(), keys=_phrase_keys(mapping))
+    return mapping.index
+
+
+def fuzzy_resolver(mapping: MenuMapping) -> FuzzyResolver:
+    if mapping.fuzzy is None:
+        mapping.fuzzy = FuzzyResolver(mapping.phrase_to_sku.keys(), use_jamo_index=mapping.jamo_fuzzy,
+                                      key=_phrase_key(mapping))
+    return mapping.fuzzy
+
+
+def fuzzy_stats(mapping: MenuMapping) -> Dict[str, int]:
+    """퍼지 폴백 캐시 적중/미스 카운터."""
+    return fuzzy_resolver(mapping).stats()
+
+
+def alias_index(mapping: Optional[MenuMapping], aliases_map: Dict[str, dict]) -> PhraseAutomaton:
+    """aliases_map용 매처. 매핑의 별칭 사전 객체(mapping.aliases)를 그대로 넘기면 컴파일본을 재사용한다.
+
+    동일성만 보고 내용 비교는 하지 않는다(발화마다 사전 전체를 비교하지 않도록). 다른 사전이면 호출마다 새로 컴파일한다.
+    """
+    if mapping is not None and mapping.aliases is aliases_map:
+        if mapping.alias_index is None:
+            mapping.alias_index = PhraseAutomaton(mapping.aliases.keys(), keys=_phrase_keys(mapping))
+        return mapping.alias_index
+    return PhraseAutomaton(aliases_map.keys(), keys=_phrase_keys(mapping))
 
 
 def load_menu_mapping(menu_yaml_path: Path) -> MenuMapping:
-    data = load_yaml(menu_yaml_path) or {}
+    return _parse_menu(load_yaml(menu_yaml_path) or {})
+
+
+def _parse_menu(data: dict) -> MenuMapping:
     sku_to_phrases: Dict[str, List[str]] = {}
     phrase_to_sku: Dict[str, str] = {}
 
@@ -54,12 +144,10 @@ def load_menu_mapping(menu_yaml_path: Path) -> MenuMapping:
     return MenuMapping(phrase_to_sku=phrase_to_sku, sku_to_phrases=sku_to_phrases)
 
 
-def load_aliases_map(aliases_yaml_path: Path) -> Dict[str, dict]:
-    if not aliases_yaml_path.exists():
-        return {}
-    data = load_yaml(aliases_yaml_path) or {}
+def _parse_aliases(data: dict) -> Tuple[Dict[str, dict], Dict[str, float]]:
     raw_aliases = data.get("aliases", {})
     mapping: Dict[str, dict] = {}
+    confidence: Dict[str, float] = {}
     # 신형: aliases: [ { term: str, apply: { sku?, options? }, meta? } ]
     if isinstance(raw_aliases, list):
         for entry in raw_aliases:
@@ -69,48 +157,131 @@ def load_aliases_map(aliases_yaml_path: Path) -> Dict[str, dict]:
             apply = entry.get("apply") or {}
             if isinstance(term, str) and isinstance(apply, dict) and term:
                 mapping[term] = apply
-        return mapping
+                conf = (entry.get("meta") or {}).get("confidence")
+                if isinstance(conf, (int, float)):
+                    confidence[term] = float(conf)
+        return mapping, confidence
     # 구형: aliases: { phrase: { sku?, options? } }
     if isinstance(raw_aliases, dict):
         for k, v in raw_aliases.items():
             if isinstance(k, str) and isinstance(v, dict):
                 mapping[k] = v
-    return mapping
+    return mapping, confidence
+
 
+def load_aliases_map(aliases_yaml_path: Path) -> Dict[str, dict]:
+    if not aliases_yaml_path.exists():
+        return {}
+    data = load_yaml(aliases_yaml_path) or {}
+    return _parse_aliases(data)[0]
 
-def load_combined_mapping(menu_yaml_path: Path, aliases_yaml_path: Optional[Path] = None) -> MenuMapping:
-    mapping = load_menu_mapping(menu_yaml_path)
-    if aliases_yaml_path is None or not aliases_yaml_path.exists():
-        return mapping
-    aliases = load_aliases_map(aliases_yaml_path)
+
+def load_combined_mapping(menu_yaml_path: Path, aliases_yaml_path: Optional[Path] = None,
+                          normalizer: Optional[TextNormalizer] = None, jamo_fuzzy: bool = False,
+                          slot_extractor: Optional[SlotExtractor] = None,
+                          quantity_parser: Optional[QuantityParser] = None) -> MenuMapping:
+    aliases_data = None
+    if aliases_yaml_path is not None and aliases_yaml_path.exists():
+        aliases_data = load_yaml(aliases_yaml_path) or {}
+    return combined_mapping_from_config(load_yaml(menu_yaml_path) or {}, aliases_data, normalizer, jamo_fuzzy,
+                                        slot_extractor, quantity_parser)
+
+
+def combined_mapping_from_config(menu_data: dict, aliases_data: Optional[dict] = None,
+                                 normalizer: Optional[TextNormalizer] = None, jamo_fuzzy: bool = False,
+                                 slot_extractor: Optional[SlotExtractor] = None,
+                                 quantity_parser: Optional[QuantityParser] = None) -> MenuMapping:
+    """이미 읽은 menu/aliases YAML 객체로 load_combined_mapping과 같은 매핑을 만든다."""
+    mapping = _parse_menu(menu_data)
+    mapping.normalizer = normalizer
+    mapping.jamo_fuzzy = jamo_fuzzy
+    mapping.slot_extractor = slot_extractor
+    mapping.quantity_parser = quantity_parser
+    if aliases_data is None:
+        return compile_mapping_index(mapping)
+    aliases, confidence = _parse_aliases(aliases_data)
+    mapping.aliases = aliases
     # alias에 sku가 명시된 경우 phrase_to_sku에 추가
     for phrase, cfg in aliases.items():
         sku = cfg.get("sku")
         if isinstance(phrase, str) and sku:
             mapping.phrase_to_sku[phrase] = sku
             mapping.sku_to_phrases.setdefault(sku, []).append(phrase)
-    return mapping
+    # 옵션 전용 별칭(sku 없음)의 신뢰도도 남긴다(후보 슬라이서 채점용, SKU 매칭에는 영향 없음)
+    mapping.phrase_confidence.update(confidence)
+    return compile_mapping_index(mapping)
+
+
+def resolve_sku_spans(text: str, mapping: MenuMapping, normalized: bool = False) -> List[SkuSpan]:
+    """텍스트의 모든 SKU 후보 구간을 1회 스캔으로 찾고, 겹치지 않는 최장·최고 신뢰도 구간만 남긴다.
 
+    우선순위: 길이(긴 것) > 신뢰도 > 시작 위치(앞) > 등록 순서. 결과는 시작 위치 순.
+    매핑에 전처리기가 있으면 구간 위치는 정규화된 텍스트 기준(normalized=True면 이미 정규화된 텍스트로 보고 다시 하지 않음).
+    """
+    if not normalized:
+        text = match_text(mapping, text)
+    ac = phrase_index(mapping)
+    conf = mapping.phrase_confidence
+    cands = [
+        SkuSpan(m.start, m.end, mapping.phrase_to_sku[m.phrase], m.phrase,
+                conf.get(m.phrase, DEFAULT_PHRASE_CONFIDENCE))
+        for m in ac.finditer(text)
+    ]
+    if len(cands) <= 1:
+        return cands
+    cands.sort(key=lambda c: (c.start - c.end, -c.confidence, c.start, ac.rank(c.phrase)))
+    chosen: List[SkuSpan] = []
+    for c in cands:
+        if all(c.end <= o.start or c.start >= o.end for o in chosen):
+            chosen.append(c)
+    chosen.sort(key=lambda c: c.start)
+    return chosen
 
-def find_sku_by_text(text: str, mapping: MenuMapping, threshold: int = 88) -> str | None:
-    # 1) substring match 우선
-    for ph, sku in mapping.phrase_to_sku.items():
-        if ph and ph in text:
-            return sku
-    # 2) fuzzy match (partial ratio)
-    all_phrases = list(mapping.phrase_to_sku.keys())
-    if not all_phrases:
+
+def best_sku_span(spans: List[SkuSpan]) -> SkuSpan | None:
+    if not spans:
         return None
-    cand = process.extractOne(text, all_phrases, scorer=fuzz.partial_ratio)
-    if cand and cand[1] >= threshold:
-        return mapping.phrase_to_sku[cand[0]]
-    return None
+    return min(spans, key=lambda c: (c.start - c.end, -c.confidence, c.start))
+
+
+def find_sku_by_text(text: str, mapping: MenuMapping, threshold: int = 88, normalized: bool = False) -> str | None:
+    """normalized=True면 text를 이미 match_text로 정규화한 것으로 보고 다시 하지 않는다."""
+    if not normalized:
+        text = match_text(mapping, text)
+    # 1) exact match 우선: 최장·최고 신뢰도 구간 (dict 순서와 무관)
+    best = best_sku_span(resolve_sku_spans(text, mapping, normalized=True))
+    if best is not None:
+        return best.sku
+    # 2) fuzzy match (partial ratio, 정규화 텍스트 기준 캐시)
+    count("fuzzy_fallbacks")
+    ph = fuzzy_resolver(mapping).resolve(text, threshold)
+    if ph is not None:
+        count("fuzzy_resolved")
+    return mapping.phrase_to_sku[ph] if ph is not None else None
+
+
+def find_skus_by_texts(texts: List[str], mapping: MenuMapping, threshold: int = 88,
+                       normalized: bool = False) -> List[str | None]:
+    """find_sku_by_text의 배치 버전: exact 미해결 텍스트만 모아 퍼지를 1회 일괄 채점."""
+    out: List[str | None] = []
+    pending: List[int] = []
+    if not normalized:
+        texts = [match_text(mapping, t) for t in texts]
+    for i, text in enumerate(texts):
+        best = best_sku_span(resolve_sku_spans(text, mapping, normalized=True))
+        out.append(best.sku if best is not None else None)
+        if best is None:
+            pending.append(i)
+    if pending:
+        count("fuzzy_fallbacks", len(pending))
+        phrases = fuzzy_resolver(mapping).resolve_many([texts[i] for i in pending], threshold)
+        count("fuzzy_resolved", sum(ph is not None for ph in phrases))
+        for i, ph in zip(pending, phrases):
+            out[i] = mapping.phrase_to_sku[ph] if ph is not None else None
+    return out
 
 
 def has_menu_phrase(text: str, mapping: MenuMapping) -> bool:
-    for ph in mapping.phrase_to_sku.keys():
-        if ph and ph in text:
-            return True
-    return False
+    return phrase_index(mapping).search(match_text(mapping, text))
 
 
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import json
+import mmap
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .automaton import MmapPhraseAutomaton
+from .constraints import MenuConstraints
+from .io import file_sha256
+from .menu import MenuMapping, alias_index, phrase_index
+from .packed import StringPool, open_packed, pack_arrays
+from .quantity import compile_quantity_parser, quantity_config
+from .slots import compile_slot_extractor, slots_config
+from .textnorm import compile_normalizer, normalizer_config
+
+# 파일 레이아웃은 src.utils.packed 참고
+MAGIC = b"MALROIDX"
+FORMAT_VERSION = 2
+TEMP_VALUES = ["HOT", "ICE"]
+
+
+def build_menu_index(mapping: MenuMapping, menu_json: dict, aliases_json: dict,
+                     patterns: Optional[dict] = None) -> bytes:
+    """phrase/alias 매처, SKU별 옵션 제약, 별칭 암시 옵션 표를 하나의 바이너리로 직렬화한다.
+
+    매처는 매핑의 컴파일본(정규화 phrase 키) 그대로, 별칭은 aliases.yml 전체(옵션 전용·주문유형 포함)를 싣는다.
+    매핑에 전처리기·슬롯/수량 추출기가 있으면 그 patterns.yml 설정(patterns)을 meta에 넣어 to_mapping이 같은 것을 복원한다.
+    """
+    compiled = (mapping.normalizer, mapping.slot_extractor, mapping.quantity_parser)
+    if any(c is not None for c in compiled) and patterns is None:
+        raise ValueError("patterns is required when the mapping has a normalizer or slot/quantity parser")
+    pool = StringPool()
+    items = [it for it in (menu_json.get("items") or []) if isinstance(it, dict) and it.get("sku")]
+    skus: List[str] = [it["sku"] for it in items]
+    for sku in mapping.sku_to_phrases:
+        if sku not in skus:
+            skus.append(sku)
+    sku_id = {s: i for i, s in enumerate(skus)}
+    # SKU 제약: 허용 옵션 마스크는 menu.json constraints 표(03/04/05와 같은 규칙)를 그대로 쓴다
+    constraints = MenuConstraints.from_menu_json(menu_json)
+    option_names: List[str] = constraints.option_keys
+    conf = {it["sku"]: it for it in items}
+    sku_sizes, sku_temps, sku_allow = [], [], []
+    for sku in skus:
+        c = conf.get(sku, {})
+        sku_sizes.append(1 if c.get("sizes_enabled") else 0)
+        sku_temps.append(sum(1 << i for i, t in enumerate(TEMP_VALUES) if t in (c.get("temps") or [])))
+        sku_allow.append(constraints.skus.get(sku, (0, 0))[0])
+
+    arrays: Dict[str, Tuple[str, Any]] = {}
+    # phrase 매처
+    ph_ac = phrase_index(mapping)
+    for name, values in ph_ac.to_arrays().items():
+        arrays[f"phrase.{name}"] = ("i", values)
+    arrays["phrase.str"] = ("i", [pool.add(p) for p in ph_ac.phrases])
+    arrays["phrase.sku"] = ("i", [sku_id[mapping.phrase_to_sku[p]] for p in ph_ac.phrases])
+    arrays["phrase.conf"] = ("d", [mapping.phrase_confidence.get(p, 1.0) for p in ph_ac.phrases])
+
+    # 별칭 매처(aliases.yml 원본 apply 포함) + 암시 옵션 표(aliases.json 정규화 결과 기준, 없는 별칭은 빈 표)
+    al_ac = alias_index(mapping, mapping.aliases)
+    for name, values in al_ac.to_arrays().items():
+        arrays[f"alias.{name}"] = ("i", values)
+    alias_sku, alias_apply, alias_conf, opt_start, opt_key, opt_val, opt_int = [], [], [], [0], [], [], []
+    for term in al_ac.phrases:
+        apply = mapping.aliases[term]
+        sku = apply.get("sku")
+        alias_sku.append(sku_id.get(sku, -1) if isinstance(sku, str) else -1)
+        alias_apply.append(pool.add(json.dumps(apply, ensure_ascii=False, sort_keys=True)))
+        # 신뢰도가 명시되지 않은 별칭은 -1(to_mapping에서 기본값 처리)
+        alias_conf.append(mapping.phrase_confidence.get(term, -1.0))
+        for k, v in (aliases_json.get(term) or {}).items():
+            if k == "sku":
+                continue
+            opt_key.append(pool.add(k))
+            opt_int.append(1 if isinstance(v, int) else 0)
+            opt_val.append(v if isinstance(v, int) else pool.add(str(v)))
+        opt_start.append(len(opt_key))
+    arrays["alias.str"] = ("i", [pool.add(t) for t in al_ac.phrases])
+    arrays["alias.sku"] = ("i", alias_sku)
+    arrays["alias.apply"] = ("i", alias_apply)
+    arrays["alias.conf"] = ("d", alias_conf)
+    arrays["alias.opt_start"] = ("i", opt_start)
+    arrays["alias.opt_key"] = ("i", opt_key)
+    arrays["alias.opt_val"] = ("q", opt_val)
+    arrays["alias.opt_int"] = ("B", opt_int)
+
+    arrays["sku.str"] = ("i", [pool.add(s) for s in skus])
+    arrays["sku.sizes_enabled"] = ("B", sku_sizes)
+    arrays["sku.temps"] = ("B", sku_temps)
+    arrays["sku.allow"] = ("q", sku_allow)
+    arrays["str.offsets"] = ("q", pool.offsets)
+    arrays["str.blob"] = ("B", pool.blob)
+
+    meta = {
+        "option_names": option_names,
+        "temp_values": TEMP_VALUES,
+        "counts": {"phrases": len(ph_ac), "aliases": len(al_ac), "skus": len(skus)},
+        "menu_version": menu_json.get("version"),
+        # 매처 키를 만든 전처리기 설정(없으면 원문 phrase 매칭). 파일 해시(menu_index_hash)에 함께 묶인다
+        "normalizer": normalizer_config(patterns) if mapping.normalizer is not None else None,
+        # 슬롯·수량 추출기 설정(없으면 파서가 configs/patterns.yml 기본본을 쓴다)
+        "slots": slots_config(patterns) if mapping.slot_extractor is not None else None,
+        "quantity": quantity_config(patterns) if mapping.quantity_parser is not None else None,
+    }
+    return pack_arrays(arrays, meta, MAGIC, FORMAT_VERSION)
+
+
+def write_menu_index(path: Path, mapping: MenuMapping, menu_json: dict, aliases_json: dict,
+                     patterns: Optional[dict] = None) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("wb") as f:
+        f.write(build_menu_index(mapping, menu_json, aliases_json, patterns))
+
+
+@dataclass
+class MenuIndex:
+    """mmap으로 연 MenuIndex. 배열은 파일 페이지를 그대로 가리키므로 pre-fork 워커 간 공유된다."""
+
+    path: Path
+    meta: dict
+    arrays: Dict[str, memoryview]
+    phrase_matcher: MmapPhraseAutomaton = field(init=False)
+    alias_matcher: MmapPhraseAutomaton = field(init=False)
+    _mm: Optional[mmap.mmap] = None
+    _skus: Optional[List[str]] = None
+    _sku_ids: Optional[Dict[str, int]] = None
+
+    def __post_init__(self) -> None:
+        a = self.arrays
+        ph_str, al_str = a["phrase.str"], a["alias.str"]
+        self.phrase_matcher = MmapPhraseAutomaton(
+            {k.split(".", 1)[1]: v for k, v in a.items() if k.startswith("phrase.")},
+            lambda pid: self.string(ph_str[pid]), len(ph_str))
+        self.alias_matcher = MmapPhraseAutomaton(
+            {k.split(".", 1)[1]: v for k, v in a.items() if k.startswith("alias.")},
+            lambda pid: self.string(al_str[pid]), len(al_str))
+
+    def string(self, sid: int) -> str:
+        off = self.arrays["str.offsets"]
+        return bytes(self.arrays["str.blob"][off[sid]:off[sid + 1]]).decode("utf-8")
+
+    @property
+    def skus(self) -> List[str]:
+        if self._skus is None:
+            self._skus = [self.string(sid) for sid in self.arrays["sku.str"]]
+        return self._skus
+
+    def constraints(self, sku: str) -> Optional[dict]:
+        """SKU 옵션 제약(sizes_enabled / temps / allow_options). 모르는 SKU면 None."""
+        if self._sku_ids is None:
+            self._sku_ids = {s: i for i, s in enumerate(self.skus)}
+        i = self._sku_ids.get(sku)
+        if i is None:
+            return None
+        allow = self.arrays["sku.allow"][i]
+        temps = self.arrays["sku.temps"][i]
+        return {
+            "sizes_enabled": bool(self.arrays["sku.sizes_enabled"][i]),
+            "temps": [t for b, t in enumerate(self.meta["temp_values"]) if temps >> b & 1],
+            "allow_options": [k for b, k in enumerate(self.meta["option_names"]) if allow >> b & 1],
+        }
+
+    def _alias_entry(self, aid: int) -> dict:
+        a = self.arrays
+        out: Dict[str, Any] = {}
+        if a["alias.sku"][aid] >= 0:
+            out["sku"] = self.string(a["sku.str"][a["alias.sku"][aid]])
+        for k in range(a["alias.opt_start"][aid], a["alias.opt_start"][aid + 1]):
+            val = a["alias.opt_val"][k]
+            out[self.string(a["alias.opt_key"][k])] = val if a["alias.opt_int"][k] else self.string(val)
+        return out
+
+    def implied_options(self, term: str) -> dict:
+        """별칭의 암시 옵션(aliases.json 정규화 값). 없는 별칭이면 빈 dict."""
+        if term not in self.alias_matcher:
+            return {}
+        entry = self._alias_entry(self.alias_matcher.rank(term))
+        entry.pop("sku", None)
+        return entry
+
+    def to_mapping(self, jamo_fuzzy: bool = False) -> MenuMapping:
+        """파서(parse_order_items 등)가 그대로 쓸 수 있는 MenuMapping. 매처는 mmap 배열을 공유한다.
+
+        복사 없이 공유되는 것은 phrase/alias 매처 배열뿐이다. 파서가 phrase 문자열로 조회하는 phrase_to_sku,
+        phrase_confidence, aliases 사전과 전처리기·슬롯/수량 추출기(meta의 patterns 설정으로 재컴파일)는 호출한 프로세스마다
+        디코드해 만든다(메뉴 크기 비례, 워커당 1회). 그래서 load_combined_mapping(..., normalizer)와 같은 결과를 낸다.
+        """
+        a = self.arrays
+        skus = self.skus
+        phrase_to_sku: Dict[str, str] = {}
+        sku_to_phrases: Dict[str, List[str]] = {}
+        confidence: Dict[str, float] = {}
+        for pid in range(len(self.phrase_matcher)):
+            ph = self.string(a["phrase.str"][pid])
+            sku = skus[a["phrase.sku"][pid]]
+            phrase_to_sku[ph] = sku
+            sku_to_phrases.setdefault(sku, []).append(ph)
+            confidence[ph] = float(a["phrase.conf"][pid])
+        aliases: Dict[str, dict] = {}
+        for aid in range(len(self.alias_matcher)):
+            term = self.string(a["alias.str"][aid])
+            aliases[term] = json.loads(self.string(a["alias.apply"][aid]))
+            if a["alias.conf"][aid] >= 0:
+                confidence[term] = float(a["alias.conf"][aid])
+        cfg = self.meta.get("normalizer")
+        slots_cfg = self.meta.get("slots")
+        qty_cfg = self.meta.get("quantity")
+        return MenuMapping(
+            phrase_to_sku=phrase_to_sku,
+            sku_to_phrases=sku_to_phrases,
+            aliases=aliases,
+            phrase_confidence=confidence,
+            index=self.phrase_matcher,
+            alias_index=self.alias_matcher,
+            normalizer=compile_normalizer(cfg) if cfg is not None else None,
+            slot_extractor=compile_slot_extractor(slots_cfg) if slots_cfg is not None else None,
+            quantity_parser=compile_quantity_parser(qty_cfg) if qty_cfg is not None else None,
+            jamo_fuzzy=jamo_fuzzy,
+        )
+
+
+def load_menu_index(path: Path, expected_hash: Optional[str] = None) -> MenuIndex:
+    """MenuIndex를 mmap으로 연다(배열 복사 없음). expected_hash가 주어지면 manifest 해시와 대조."""
+    if expected_hash is not None and file_sha256(path) != expected_hash:
+        raise ValueError(f"menu index hash mismatch: {path}")
+    mm, meta, arrays = open_packed(path, MAGIC, FORMAT_VERSION, "menu index")
+    return MenuIndex(path=path, meta=meta, arrays=arrays, _mm=mm)
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import cProfile
+import datetime as dt
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# outputs/{domain}/build_metrics.json: 단계별 마지막 실행 지표, metrics_history.jsonl: 실행마다 1줄 누적(추세용)
+METRICS_FILE = "build_metrics.json"
+METRICS_HISTORY_FILE = "metrics_history.jsonl"
+PROFILE_DIR = "profile"
+
+# 현재 스레드(컨텍스트)에서 실행 중인 단계의 지표. 단계 밖에서는 None이라 count()가 아무것도 하지 않는다.
+_CURRENT: ContextVar[Optional["StageMetrics"]] = ContextVar("stage_metrics", default=None)
+_WRITE_LOCK = threading.Lock()
+
+
+@dataclass
+class StageMetrics:
+    """단계 1회 실행 지표. peak_rss_mb는 프로세스 전체 최고치(단계 종료 시점 기준)."""
+
+    stage: str
+    started_at: str = ""
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    child_cpu_s: float = 0.0
+    peak_rss_mb: float = 0.0
+    rows_in: Optional[int] = None
+    rows_out: Optional[int] = None
+    counters: Dict[str, int] = field(default_factory=Counter)
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d["counters"] = dict(sorted(self.counters.items()))
+        return d
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux는 KB, macOS는 bytes 단위
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _children_cpu() -> float:
+    ru = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return ru.ru_utime + ru.ru_stime
+
+
+def active() -> bool:
+    # 집계 비용이 드는 카운터는 단계 안에서만 계산하도록
+    return _CURRENT.get() is not None
+
+
+def count(name: str, n: int = 1) -> None:
+    """핫패스 카운터(퍼지 폴백, 별칭 매칭, 파싱 세그먼트 등). 단계 밖에서 호출되면 무시."""
+    m = _CURRENT.get()
+    if m is not None:
+        m.counters[name] += n
+
+
+def add_counts(counts: Dict[str, int]) -> None:
+    # 워커 프로세스에서 모은 카운터를 현재 단계에 합친다
+    m = _CURRENT.get()
+    if m is not None:
+        m.counters.update(counts)
+
+
+def set_rows(rows_in: Optional[int] = None, rows_out: Optional[int] = None) -> None:
+    m = _CURRENT.get()
+    if m is None:
+        return
+    if rows_in is not None:
+        m.rows_in = int(rows_in)
+    if rows_out is not None:
+        m.rows_out = int(rows_out)
+
+
+@contextmanager
+def collect_counts() -> Iterator[Counter]:
+    """단계 밖(예: 프로세스 풀 워커)에서 카운터만 모은다. 끝나면 yield한 Counter에 값이 남는다."""
+    m = StageMetrics(stage="")
+    token = _CURRENT.set(m)
+    try:
+        yield m.counters
+    finally:
+        _CURRENT.reset(token)
+
+
+@contextmanager
+def measure(stage: str, profile_path: Optional[Path] = None) -> Iterator[StageMetrics]:
+    """단계 실행 구간의 wall/CPU/peak RSS와 카운터를 잰다. profile_path가 있으면 cProfile 결과를 저장.
+
+    CPU는 단계를 실행한 스레드 기준(time.thread_time)이고, 프로세스 풀 워커 몫은 child_cpu_s로 따로 본다.
+    """
+    m = StageMetrics(stage=stage, started_at=dt.datetime.now(dt.timezone.utc).isoformat())
+    token = _CURRENT.set(m)
+    prof = cProfile.Profile() if profile_path is not None else None
+    wall0, cpu0, child0 = time.perf_counter(), time.thread_time(), _children_cpu()
+    if prof is not None:
+        prof.enable()
+    try:
+        yield m
+    finally:
+        if prof is not None:
+            prof.disable()
+        m.wall_s = round(time.perf_counter() - wall0, 4)
+        m.cpu_s = round(time.thread_time() - cpu0, 4)
+        m.child_cpu_s = round(_children_cpu() - child0, 4)
+        m.peak_rss_mb = round(peak_rss_mb(), 1)
+        _CURRENT.reset(token)
+        if prof is not None:
+            profile_path.parent.mkdir(parents=True, exist_ok=True)
+            prof.dump_stats(str(profile_path))
+            print(f"[Metrics] profile -> {profile_path}")
+
+
+def load_metrics(out_dir: Path) -> Dict[str, dict]:
+    path = out_dir / METRICS_FILE
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8")).get("stages") or {}
+    except (OSError, ValueError):
+        return {}
+
+
+def record_metrics(out_dir: Path, m: StageMetrics) -> None:
+    """build_metrics.json의 해당 단계를 갱신하고 metrics_history.jsonl에 1줄 추가."""
+    row = m.to_dict()
+    with _WRITE_LOCK:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        stages = load_metrics(out_dir)
+        stages[m.stage] = row
+        path = out_dir / METRICS_FILE
+        tmp = path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump({"stages": dict(sorted(stages.items()))}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+        with (out_dir / METRICS_HISTORY_FILE).open("a", encoding="utf-8") as f:
+            f.write(json.dumps(row, ensure_ascii=False))
+            f.write("\n")
+
+
+def format_metrics(m: StageMetrics) -> str:
+    rows = ""
+    if m.rows_in is not None or m.rows_out is not None:
+        rows = f", rows {m.rows_in if m.rows_in is not None else '-'} -> {m.rows_out if m.rows_out is not None else '-'}"
+    counters = ", ".join(f"{k}={v}" for k, v in sorted(m.counters.items()))
+    return (f"wall {m.wall_s:.2f}s, cpu {m.cpu_s + m.child_cpu_s:.2f}s, peak RSS {m.peak_rss_mb:.0f} MB{rows}"
+            + (f" [{counters}]" if counters else ""))
+
+
+def instrumented(paths: Any, domain: str, stage: str, run: Callable[[], Any],
+                 profile: bool = False) -> Callable[[], Any]:
+    """run을 계측해 outputs/{domain}에 지표를 남기는 함수로 감싼다(run_incremental에 그대로 넘길 수 있음).
+
+    profile이면 outputs/{domain}/profile/{stage}.pstats에 cProfile 결과를 저장한다.
+    """
+    out_dir = paths.outputs / domain
+
+    def wrapped() -> Any:
+        profile_path = out_dir / PROFILE_DIR / f"{stage}.pstats" if profile else None
+        with measure(stage, profile_path) as m:
+            result = run()
+        record_metrics(out_dir, m)
+        print(f"[Metrics] {stage}: {format_metrics(m)}")
+        return result
+
+    return wrapped
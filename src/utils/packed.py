@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import json
+import mmap
+import struct
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+# 파일 레이아웃: MAGIC(8) | u32 header_len | header(JSON) | pad(8) | 배열 데이터(8바이트 정렬)
+# header = {"version", "arrays": {name: [typecode, byte offset, length]}, "meta"}
+_ALIGN = 8
+
+
+class StringPool:
+    """문자열을 하나의 UTF-8 blob + offsets 배열로 모은다(같은 문자열은 1회만)."""
+
+    def __init__(self) -> None:
+        self._ids: Dict[str, int] = {}
+        self.blob = bytearray()
+        self.offsets: List[int] = [0]
+
+    def add(self, s: str) -> int:
+        sid = self._ids.get(s)
+        if sid is None:
+            sid = len(self.offsets) - 1
+            self._ids[s] = sid
+            self.blob.extend(s.encode("utf-8"))
+            self.offsets.append(len(self.blob))
+        return sid
+
+
+def pack_arrays(arrays: Dict[str, Tuple[str, Any]], meta: dict, magic: bytes, version: int) -> bytes:
+    table: Dict[str, list] = {}
+    chunks: List[bytes] = []
+    offset = 0
+    for name, (code, values) in arrays.items():
+        data = array(code, values).tobytes() if code != "B" else bytes(values)
+        table[name] = [code, offset, len(data) // array(code).itemsize]
+        pad = (-len(data)) % _ALIGN
+        chunks.append(data + b"\0" * pad)
+        offset += len(data) + pad
+    header = json.dumps({"version": version, "arrays": table, "meta": meta}, ensure_ascii=False).encode("utf-8")
+    prefix = magic + struct.pack("<I", len(header)) + header
+    prefix += b"\0" * ((-len(prefix)) % _ALIGN)
+    return prefix + b"".join(chunks)
+
+
+def open_packed(path: Path, magic: bytes, version: int, kind: str) -> Tuple[mmap.mmap, dict, Dict[str, memoryview]]:
+    """pack_arrays 파일을 mmap으로 열어 (mmap, meta, 이름 → typed memoryview)를 돌려준다(복사 없음)."""
+    with path.open("rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[: len(magic)] != magic:
+        mm.close()
+        raise ValueError(f"not a {kind} file: {path}")
+    (header_len,) = struct.unpack_from("<I", mm, len(magic))
+    start = len(magic) + 4
+    header = json.loads(mm[start:start + header_len].decode("utf-8"))
+    if header.get("version") != version:
+        mm.close()
+        raise ValueError(f"unsupported {kind} version: {header.get('version')}")
+    base = start + header_len
+    base += (-base) % _ALIGN
+    view = memoryview(mm)
+    arrays: Dict[str, memoryview] = {}
+    for name, (code, offset, length) in header["arrays"].items():
+        nbytes = length * array(code).itemsize
+        arrays[name] = view[base + offset: base + offset + nbytes].cast(code)
+    return mm, header.get("meta") or {}, arrays
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from .menu import MenuMapping, load_combined_mapping
+from .metrics import add_counts, collect_counts
+from .parse import parse_order_items_batch
+from .io import file_sha256
+from .parse_cache import ParseCache, cache_mode, cached_parse
+from .quantity import QuantityParser, default_quantity_parser
+from .slots import SlotExtractor, default_slot_extractor
+from .textnorm import TextNormalizer
+
+# 워커 프로세스별 상태(initializer에서 1회 로드)
+_WORKER: Dict[str, MenuMapping] = {}
+
+
+def _init_parse_worker(menu_yaml_path: Path, aliases_yaml_path: Optional[Path],
+                       normalizer: Optional[TextNormalizer], jamo_fuzzy: bool = False,
+                       slot_extractor: Optional[SlotExtractor] = None,
+                       quantity_parser: Optional[QuantityParser] = None) -> None:
+    _WORKER["mapping"] = load_combined_mapping(menu_yaml_path, aliases_yaml_path, normalizer, jamo_fuzzy,
+                                               slot_extractor, quantity_parser)
+
+
+def _parse_shard(texts: List[str], orders: bool = False) -> Tuple[List[object], Dict[str, int]]:
+    mapping = _WORKER["mapping"]
+    # 워커 카운터는 결과와 함께 돌려보내 부모 단계 지표에 합친다
+    with collect_counts() as counts:
+        items = parse_order_items_batch(texts, mapping, mapping.aliases, orders=orders).tolist()
+    return items, dict(counts)
+
+
+class ParallelParser:
+    """parse_order_items_batch를 프로세스 풀로 나눠 실행한다(orders=True면 주문 dict Series).
+
+    입력 순서대로 연속 구간 shard를 만들고 결과도 같은 순서로 합치므로,
+    단일 프로세스 실행과 결과가 동일하다(매핑/매처는 워커마다 initializer에서 1회 로드).
+    with 블록 안에서는 풀을 유지하므로 배치를 여러 번 나눠 넘겨도(03/04 스트리밍 샘플러) 워커를 다시 띄우지 않는다.
+    cache(ParseCache)를 주면 부모 프로세스에서 조회/기록하고 캐시에 없는 고유 발화만 워커로 보낸다.
+    """
+
+    def __init__(self, menu_yaml_path: Path, aliases_yaml_path: Optional[Path], workers: int,
+                 shards_per_worker: int = 4, normalizer: Optional[TextNormalizer] = None, orders: bool = False,
+                 cache: Optional[ParseCache] = None, jamo_fuzzy: bool = False,
+                 slot_extractor: Optional[SlotExtractor] = None, quantity_parser: Optional[QuantityParser] = None):
+        self.workers = workers
+        self.shards_per_worker = shards_per_worker
+        self.orders = orders
+        self.cache = cache
+        # 워커 매핑은 부모와 같은 조건(정규화기, 자모 퍼지 여부, 슬롯·수량 추출기)으로 만든다
+        self._initargs = (menu_yaml_path, aliases_yaml_path, normalizer, jamo_fuzzy, slot_extractor, quantity_parser)
+        self._mode = "order" if orders else "items"
+        if cache is not None:
+            # 워커는 mapping.aliases(별칭 사용)로 파싱한다. 캐시 키는 워커 매핑을 만드는 입력의 지문
+            aliases_hash = None
+            if aliases_yaml_path is not None and aliases_yaml_path.exists():
+                aliases_hash = file_sha256(aliases_yaml_path)
+            self._mode = cache_mode(self._mode, menu=file_sha256(menu_yaml_path), aliases=aliases_hash,
+                                    normalizer=normalizer.signature() if normalizer is not None else None,
+                                    slots=(slot_extractor or default_slot_extractor()).signature(),
+                                    quantity=(quantity_parser or default_quantity_parser()).signature(),
+                                    jamo_fuzzy=jamo_fuzzy)
+        self._ex: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> "ParallelParser":
+        self._ex = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_parse_worker, initargs=self._initargs)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._ex is not None:
+            self._ex.shutdown()
+            self._ex = None
+
+    def __call__(self, texts: pd.Series) -> pd.Series:
+        values = [str(t) for t in texts.fillna("")]
+        if not values:
+            return pd.Series([], index=texts.index, dtype=object)
+        out = cached_parse(self.cache, self._mode, values, self._run)
+        return pd.Series(out, index=texts.index, dtype=object)
+
+    def _run(self, values: List[str]) -> List[object]:
+        n_shards = max(1, min(len(values), self.workers * self.shards_per_worker))
+        size = -(-len(values) // n_shards)
+        shards = [values[i:i + size] for i in range(0, len(values), size)]
+        out: List[object] = []
+        for part, counts in self._ex.map(partial(_parse_shard, orders=self.orders), shards):
+            out.extend(part)
+            add_counts(counts)
+        return out
+
+
+def parse_order_items_parallel(texts: pd.Series, menu_yaml_path: Path, aliases_yaml_path: Optional[Path],
+                               workers: int, shards_per_worker: int = 4,
+                               normalizer: Optional[TextNormalizer] = None, orders: bool = False,
+                               jamo_fuzzy: bool = False, slot_extractor: Optional[SlotExtractor] = None,
+                               quantity_parser: Optional[QuantityParser] = None) -> pd.Series:
+    """ParallelParser 1회 호출(풀을 만들고 바로 닫는다)."""
+    if texts.empty:
+        return pd.Series([], index=texts.index, dtype=object)
+    with ParallelParser(menu_yaml_path, aliases_yaml_path, workers, shards_per_worker, normalizer, orders,
+                        jamo_fuzzy=jamo_fuzzy, slot_extractor=slot_extractor, quantity_parser=quantity_parser) as parse:
+        return parse(texts)
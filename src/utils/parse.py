@@ -1,74 +1,49 @@
 from __future__ import annotations
 
 import re
-from typing import Optional, Tuple
-
-from .menu import MenuMapping, find_sku_by_text
-
-
-KOR_NUM_MAP = {
-    "한": 1, "하나": 1, "1": 1,
-    "두": 2, "둘": 2, "2": 2,
-    "세": 3, "셋": 3, "3": 3,
-    "네": 4, "넷": 4, "4": 4,
-    "다섯": 5, "5": 5,
-    "여섯": 6, "6": 6,
-    "일곱": 7, "7": 7,
-    "여덟": 8, "8": 8,
-    "아홉": 9, "9": 9,
-    "열": 10, "10": 10,
-    "열한": 11, "열하나": 11, "11": 11,
-    "열두": 12, "열둘": 12, "12": 12,
-    "열세": 13, "열셋": 13, "13": 13,
-    "열네": 14, "열넷": 14, "14": 14,
-    "열다섯": 15, "15": 15,
-    "열여섯": 16, "16": 16,
-    "열일곱": 17, "17": 17,
-    "열여덟": 18, "18": 18,
-    "열아홉": 19, "19": 19,
-    "스무": 20, "스물": 20, "20": 20,
-}
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from .menu import (MenuMapping, alias_index, find_sku_by_text, find_skus_by_texts, match_text,
+                   resolve_sku_spans)
+from .metrics import active, count
+from .parse_cache import ParseCache, cache_mode, cached_parse
+# KOR_NUM_MAP은 예전 parse 모듈 경로로 쓰던 곳을 위해 다시 내보낸다
+from .quantity import KOR_NUM_MAP, QuantityParser, default_quantity_parser  # noqa: F401
+from .slots import SlotExtractor, default_slot_extractor, extract_slots
 
 
 def parse_quantity(text: str) -> Optional[int]:
-    t = text.strip()
-    # 1) 숫자 + 단위
-    m = re.search(r"(\d{1,3})\s*(잔|개|병|세트|컵)", t)
-    if m:
-        return int(m.group(1))
-    # 2) 한글수 + 단위
-    for tok, val in sorted(KOR_NUM_MAP.items(), key=lambda x: -len(x[0])):
-        if re.search(fr"{tok}\s*(잔|개|병|세트|컵)", t):
-            return val
-    # 3) 단독 숫자 토큰
-    m = re.search(r"\b(\d{1,3})\b", t)
-    if m:
-        return int(m.group(1))
-    return None
+    return default_quantity_parser()(text)
+
+
+def _quantity_parser(menu_mapping: Optional[MenuMapping]) -> QuantityParser:
+    """매핑에 실린 수량 추출기(스테이지가 넘긴 patterns로 컴파일). 없으면 configs/patterns.yml 기본본."""
+    if menu_mapping is not None and menu_mapping.quantity_parser is not None:
+        return menu_mapping.quantity_parser
+    return default_quantity_parser()
+
+
+def _slot_extractor(menu_mapping: Optional[MenuMapping]) -> SlotExtractor:
+    """매핑에 실린 슬롯 추출기(스테이지가 넘긴 patterns로 컴파일). 없으면 configs/patterns.yml 기본본."""
+    if menu_mapping is not None and menu_mapping.slot_extractor is not None:
+        return menu_mapping.slot_extractor
+    return default_slot_extractor()
 
 
 def detect_temp(text: str) -> Optional[str]:
-    t = text
-    if any(x in t for x in ["아이스", "차가운", "아아"]):
-        return "ICE"
-    if any(x in t for x in ["뜨거운", "핫", "뜨아"]):
-        return "HOT"
-    return None
+    return extract_slots(text).options.get("temp")
 
 
 def detect_size(text: str) -> Optional[str]:
-    t = text
-    if any(x in t for x in ["라지", "벤티"]):
-        return "L"
-    if any(x in t for x in ["톨", "레귤러", "미디움"]):
-        return "M"
-    return None
+    return extract_slots(text).options.get("size")
 
 
-def detect_sku(text: str, menu_mapping: Optional[MenuMapping] = None) -> Optional[str]:
+def detect_sku(text: str, menu_mapping: Optional[MenuMapping] = None, normalized: bool = False) -> Optional[str]:
     t = text
     if menu_mapping is not None:
-        return find_sku_by_text(t, menu_mapping)
+        return find_sku_by_text(t, menu_mapping, normalized=normalized)
     # fallback 간단 규칙
     if "아메리카노" in t or "아아" in t or "뜨아" in t:
         return "AMERICANO"
@@ -79,74 +54,292 @@ def detect_sku(text: str, menu_mapping: Optional[MenuMapping] = None) -> Optiona
     return None
 
 
+SEGMENT_SPLIT_RE = re.compile(r"[\s,]*(?:그리고|랑|와|및|,)[\s,]*")
+# 세그먼트 분할에는 쓰지 않지만("포장하고") 두 메뉴 구간 사이에 단독으로 오면 조각 경계로 보는 접속어
+PIECE_JOINER_RE = re.compile(r"(?<!\S)하고(?!\S)")
+
+
 def split_order_segments(text: str) -> list[str]:
     # 쉼표/접속사 기준 분할: ",", "그리고", "랑", "와", "및"
-    parts = re.split(r"[\s,]*(?:그리고|랑|와|및|,)[\s,]*", text)
+    parts = SEGMENT_SPLIT_RE.split(text)
     parts = [p.strip() for p in parts if p and p.strip()]
     return parts
 
 
-def parse_order_items(text: str, menu_mapping: Optional[MenuMapping], aliases_map: Optional[dict] = None) -> list[dict]:
-    items: list[dict] = []
-    for seg in split_order_segments(text):
-        sku = detect_sku(seg, menu_mapping)
-        if not sku:
-            # alias에 sku가 명시된 경우로 보완
-            if aliases_map:
-                for phrase, cfg in aliases_map.items():
-                    if phrase and phrase in seg and cfg.get("sku"):
-                        sku = cfg["sku"]
-                        break
-            if not sku:
-                continue
-        qty = parse_quantity(seg) or 1
-        temp = detect_temp(seg)
-        size = detect_size(seg)
-        item = {"sku": sku, "quantity": qty}
-        opts = {k: v for k, v in {"temp": temp, "size": size}.items() if v is not None}
-        # alias가 암시 옵션을 제공하면 기본 옵션에 병합(명시된 값 우선)
-        if aliases_map:
-            for phrase, cfg in aliases_map.items():
-                if phrase and phrase in seg:
-                    implied = (cfg.get("options") or {}) if isinstance(cfg, dict) else {}
-                    for k, v in implied.items():
-                        opts.setdefault(k, v)
-        # 옵션 정규화: shot "+1" -> 1 (int), size XL -> L
-        if "shot" in opts:
-            val = opts["shot"]
-            if isinstance(val, str):
-                import re as _re
-                m = _re.search(r"[-+]?\d+", val)
-                if m:
-                    try:
-                        opts["shot"] = max(0, int(m.group(0)))
-                    except ValueError:
-                        del opts["shot"]
-                else:
+def _alias_sku(seg_aliases: List[str], aliases_map: Optional[dict]) -> Optional[str]:
+    # alias에 sku가 명시된 경우로 보완(등록 순서상 첫 별칭)
+    for phrase in seg_aliases:
+        cfg = aliases_map[phrase]
+        if cfg.get("sku"):
+            return cfg["sku"]
+    return None
+
+
+def _build_item(sku: str, qty: int, slot_opts: Dict[str, object],
+                seg_aliases: List[str], aliases_map: Optional[dict]) -> dict:
+    item = {"sku": sku, "quantity": qty}
+    opts = dict(slot_opts)
+    # alias가 암시 옵션을 제공하면 기본 옵션에 병합(명시된 값 우선)
+    for phrase in seg_aliases:
+        cfg = aliases_map[phrase]
+        implied = (cfg.get("options") or {}) if isinstance(cfg, dict) else {}
+        for k, v in implied.items():
+            opts.setdefault(k, v)
+    # 옵션 정규화: shot "+1" -> 1 (int), size XL -> L
+    if "shot" in opts:
+        val = opts["shot"]
+        if isinstance(val, str):
+            m = re.search(r"[-+]?\d+", val)
+            if m:
+                try:
+                    opts["shot"] = max(0, int(m.group(0)))
+                except ValueError:
                     del opts["shot"]
-            elif isinstance(val, (int,)):
-                opts["shot"] = max(0, int(val))
             else:
                 del opts["shot"]
-        if opts.get("size") == "XL":
-            opts["size"] = "L"
-        # ice 정규화: 스키마는 소문자 ['less','normal','more']만 허용
-        if "ice" in opts:
-            val = opts["ice"]
-            if isinstance(val, str):
-                up = val.upper()
-                ice_map = {"NONE": "less", "LESS": "less", "REGULAR": "normal", "MORE": "more",
-                           "less": "less", "normal": "normal", "more": "more"}
-                norm = ice_map.get(up, ice_map.get(val, None))
-                if norm is None:
-                    del opts["ice"]
-                else:
-                    opts["ice"] = norm
-            else:
+        elif isinstance(val, (int,)):
+            opts["shot"] = max(0, int(val))
+        else:
+            del opts["shot"]
+    if opts.get("size") == "XL":
+        opts["size"] = "L"
+    # ice 정규화: 스키마는 소문자 ['less','normal','more']만 허용
+    if "ice" in opts:
+        val = opts["ice"]
+        if isinstance(val, str):
+            up = val.upper()
+            ice_map = {"NONE": "less", "LESS": "less", "REGULAR": "normal", "MORE": "more",
+                       "less": "less", "normal": "normal", "more": "more"}
+            norm = ice_map.get(up, ice_map.get(val, None))
+            if norm is None:
                 del opts["ice"]
-        if opts:
-            item["options"] = opts
-        items.append(item)
-    return items
+            else:
+                opts["ice"] = norm
+        else:
+            del opts["ice"]
+    if opts:
+        item["options"] = opts
+    return item
+
+
+def _span_pieces(seg: str, menu_mapping: Optional[MenuMapping]) -> List[Tuple[str, str]]:
+    """정규화된 세그먼트에 겹치지 않는 SKU 구간이 둘 이상이면 구간마다 (sku, 조각 텍스트). 하나 이하면 [].
+
+    이웃한 두 구간 사이는 마지막 수량 표현 바로 뒤 → 단독 "하고" 앞 → 다음 구간의 시작 순으로 자른다
+    ("라떼 두 잔 하고 뜨거운 아메리카노" → "라떼 두 잔" / "하고 뜨거운 아메리카노"). 수량·슬롯·별칭은 조각 안에서만 찾는다.
+    """
+    if menu_mapping is None:
+        return []
+    spans = resolve_sku_spans(seg, menu_mapping, normalized=True)
+    if len(spans) < 2:
+        return []
+    qty_re = _quantity_parser(menu_mapping).pattern
+    cuts = [0]
+    for prev, nxt in zip(spans, spans[1:]):
+        cut = None
+        for m in qty_re.finditer(seg, prev.end, nxt.start):
+            cut = m.end()
+        if cut is None:
+            for m in PIECE_JOINER_RE.finditer(seg, prev.end, nxt.start):
+                cut = m.start()
+        cuts.append(nxt.start if cut is None else cut)
+    cuts.append(len(seg))
+    return [(sp.sku, seg[cuts[i]:cuts[i + 1]].strip()) for i, sp in enumerate(spans)]
+
+
+def _plan_pieces(pieces: List[Tuple[str, str]], extractor, quantity, alias_ac) -> Tuple[list, Optional[str]]:
+    """조각별 (sku, 수량, 슬롯 옵션, 별칭)과 조각 순서상 첫 주문 유형."""
+    plan = []
+    order_type: Optional[str] = None
+    for sku, piece in pieces:
+        slots = extractor.extract(piece)
+        if order_type is None:
+            order_type = slots.order_type
+        aliases = alias_ac.matched_by_rank(piece) if alias_ac is not None else []
+        plan.append((sku, quantity(piece) or 1, slots.options, aliases))
+    return plan, order_type
+
+
+def _parse_segments(text: str, menu_mapping: Optional[MenuMapping], aliases_map: Optional[dict],
+                    want_type: bool) -> Tuple[list, Optional[str]]:
+    items: list[dict] = []
+    order_type: Optional[str] = None
+    extractor = _slot_extractor(menu_mapping)
+    quantity = _quantity_parser(menu_mapping)
+    alias_ac = alias_index(menu_mapping, aliases_map) if aliases_map else None
+    for seg in split_order_segments(text):
+        count("segments_parsed")
+        # 세그먼트 분할(쉼표 등) 뒤에 정규화해야 구분자가 지워지지 않는다
+        seg = match_text(menu_mapping, seg)
+        # 세그먼트당 1회 스캔으로 매칭된 별칭(등록 순서)
+        seg_aliases = alias_ac.matched_by_rank(seg) if alias_ac is not None else []
+        if seg_aliases:
+            count("alias_hits")
+        # 접속사 없이 메뉴가 이어지면("아메리카노 라떼") 구간마다 아이템
+        pieces = _span_pieces(seg, menu_mapping)
+        if pieces:
+            plan, piece_type = _plan_pieces(pieces, extractor, quantity, alias_ac)
+            if order_type is None:
+                order_type = piece_type
+            items.extend(_build_item(sku, qty, opts, al, aliases_map) for sku, qty, opts, al in plan)
+            continue
+        sku = detect_sku(seg, menu_mapping, normalized=True) or _alias_sku(seg_aliases, aliases_map)
+        if not sku and not (want_type and order_type is None):
+            continue
+        # 슬롯은 세그먼트당 1회 스캔(주문 유형은 메뉴가 없는 세그먼트에서도 찾는다)
+        slots = extractor.extract(seg)
+        if order_type is None:
+            order_type = slots.order_type
+        if not sku:
+            continue
+        qty = quantity(seg) or 1
+        items.append(_build_item(sku, qty, slots.options, seg_aliases, aliases_map))
+    return items, order_type
+
+
+def parse_order_items(text: str, menu_mapping: Optional[MenuMapping], aliases_map: Optional[dict] = None,
+                      cache: Optional[ParseCache] = None) -> list[dict]:
+    """cache(ParseCache)를 주면 같은 발화는 디스크 캐시 결과를 돌려준다(키는 배치 경로와 같다)."""
+    if cache is not None:
+        return cached_parse(cache, _cache_mode("items", menu_mapping, aliases_map), [text],
+                            lambda ts: [parse_order_items(ts[0], menu_mapping, aliases_map)])[0]
+    return _parse_segments(text, menu_mapping, aliases_map, want_type=False)[0]
+
+
+def _order(items: list, order_type: Optional[str]) -> dict:
+    order: dict = {"items": items}
+    if order_type:
+        order["type"] = order_type
+    return order
+
+
+def parse_order(text: str, menu_mapping: Optional[MenuMapping], aliases_map: Optional[dict] = None,
+                cache: Optional[ParseCache] = None) -> dict:
+    """parse_order_items + 주문 유형(포장/매장). {"items": [...], "type"?: "TAKE_OUT"|"DINE_IN"}"""
+    if cache is not None:
+        return cached_parse(cache, _cache_mode("order", menu_mapping, aliases_map), [text],
+                            lambda ts: [parse_order(ts[0], menu_mapping, aliases_map)])[0]
+    return _order(*_parse_segments(text, menu_mapping, aliases_map, want_type=True))
+
+
+def _mapping_fingerprint(menu_mapping: MenuMapping) -> str:
+    """매핑 내용(phrase·신뢰도·별칭)·전처리기·슬롯/수량 추출기·퍼지 방식의 지문. 매핑마다 처음 1회만 계산해 둔다."""
+    if menu_mapping.parse_fingerprint is None:
+        normalizer = menu_mapping.normalizer
+        menu_mapping.parse_fingerprint = cache_mode(
+            "mapping", phrases=menu_mapping.phrase_to_sku, confidence=menu_mapping.phrase_confidence,
+            aliases=menu_mapping.aliases, normalizer=normalizer.signature() if normalizer is not None else None,
+            slots=_slot_extractor(menu_mapping).signature(), quantity=_quantity_parser(menu_mapping).signature(),
+            jamo_fuzzy=menu_mapping.jamo_fuzzy)
+    return menu_mapping.parse_fingerprint
+
+
+def _cache_mode(mode: str, menu_mapping: Optional[MenuMapping], aliases_map: Optional[dict]) -> str:
+    """매핑 지문과 넘긴 별칭 사전까지 붙인 캐시 모드(같은 설정 파일이라도 호출 조건이 다르면 다른 키).
+
+    매핑 자신의 별칭 사전(mapping.aliases)이면 이미 매핑 지문에 들어 있어 다시 해시하지 않는다(alias_index와 같은 동일성 기준).
+    """
+    if menu_mapping is None:
+        return cache_mode(mode, mapping=None, aliases=aliases_map)
+    aliases = "mapping" if aliases_map is menu_mapping.aliases else aliases_map
+    return cache_mode(mode, mapping=_mapping_fingerprint(menu_mapping), aliases=aliases)
+
+
+def parse_order_items_batch(texts, menu_mapping: Optional[MenuMapping], aliases_map: Optional[dict] = None,
+                            flat: bool = False, orders: bool = False, cache: Optional[ParseCache] = None):
+    """parse_order_items의 배치 버전(결과 동일).
+
+    texts: pandas Series / pyarrow Array / 문자열 iterable.
+    세그먼트 분할은 `.str` 컬럼 연산으로, SKU·별칭·수량·슬롯은 고유 세그먼트에 대해서만
+    컴파일된 매처로 계산한다(코퍼스 중복 발화는 1회만 처리).
+
+    반환: 입력 index에 맞춘 item 리스트 Series, flat=True면 utt_id(입력 index 라벨) 컬럼을 가진 아이템 테이블,
+    orders=True면 parse_order와 같은 주문 dict Series.
+    cache(ParseCache)를 주면 캐시에 없는 고유 발화만 파싱한다(flat 테이블은 캐시하지 않음). 캐시 키에는 매핑·별칭 사전 지문이 들어간다.
+    """
+    if hasattr(texts, "to_pandas"):
+        texts = texts.to_pandas()
+    if not isinstance(texts, pd.Series):
+        texts = pd.Series(list(texts), dtype=object)
+    texts = texts.fillna("").astype(str)
+    # 발화는 위치로 묶는다(중복 index 라벨이 있어도 행끼리 섞이지 않도록). 원래 index는 마지막에 다시 붙인다
+    index = texts.index
+    texts = texts.reset_index(drop=True)
+    if cache is not None and not flat:
+        mode = _cache_mode("order" if orders else "items", menu_mapping, aliases_map)
+        values = cached_parse(cache, mode, texts.tolist(),
+                              lambda ts: parse_order_items_batch(ts, menu_mapping, aliases_map, orders=orders).tolist())
+        return pd.Series(values, index=index, dtype=object)
+
+    segs = texts.str.split(SEGMENT_SPLIT_RE.pattern, regex=True).explode().dropna().str.strip()
+    segs = segs[segs.str.len() > 0].astype(object)
+    if menu_mapping is not None and menu_mapping.normalizer is not None:
+        # 고유 세그먼트만 1회씩 정규화(Series API)
+        segs = menu_mapping.normalizer.series(segs)
+        segs = segs[segs.str.len() > 0]
+
+    alias_ac = alias_index(menu_mapping, aliases_map) if aliases_map else None
+    uniq = list(pd.unique(segs.to_numpy()))
+    extractor = _slot_extractor(menu_mapping)
+    quantity = _quantity_parser(menu_mapping)
+    seg_aliases: Dict[str, List[str]] = {}
+    # 고유 세그먼트 → [(sku, 수량, 슬롯 옵션, 별칭)](스칼라 경로의 아이템 순서)와 첫 주문 유형
+    seg_plan: Dict[str, list] = {}
+    seg_type: Dict[str, Optional[str]] = {}
+    single: List[str] = []
+    for seg in uniq:
+        seg_aliases[seg] = alias_ac.matched_by_rank(seg) if alias_ac is not None else []
+        pieces = _span_pieces(seg, menu_mapping)
+        if pieces:
+            seg_plan[seg], seg_type[seg] = _plan_pieces(pieces, extractor, quantity, alias_ac)
+        else:
+            single.append(seg)
+    if menu_mapping is not None:
+        # exact 미해결 세그먼트만 모아 퍼지 폴백을 일괄 처리
+        detected = find_skus_by_texts(single, menu_mapping, normalized=True)
+    else:
+        detected = [detect_sku(seg) for seg in single]
+    for seg, sku in zip(single, detected):
+        sku = sku or _alias_sku(seg_aliases[seg], aliases_map)
+        seg_plan[seg] = []
+        if sku or orders:
+            slots = extractor.extract(seg)
+            seg_type[seg] = slots.order_type
+            if sku:
+                seg_plan[seg] = [(sku, quantity(seg) or 1, slots.options, seg_aliases[seg])]
 
+    if active():
+        # 스칼라 경로와 같은 기준(중복 세그먼트도 각각 센다)
+        count("segments_parsed", len(segs))
+        count("segments_unique", len(uniq))
+        count("alias_hits", int(segs.map(lambda s: bool(seg_aliases[s])).sum()))
+    order_type: Dict[int, str] = {}
+    if orders:
+        # 발화별 첫 주문 유형(스칼라 경로와 같은 세그먼트 순서)
+        for pos, seg in zip(segs.index, segs):
+            t = seg_type.get(seg)
+            if t and pos not in order_type:
+                order_type[pos] = t
 
+    # 아이템별 발화 위치(segs.index는 reset한 위치 index)
+    utt_pos: List[int] = []
+    built: List[dict] = []
+    for pos, seg in zip(segs.index, segs):
+        for sku, qty, opts, al in seg_plan[seg]:
+            utt_pos.append(pos)
+            built.append(_build_item(sku, int(qty), opts, al, aliases_map))
+    if flat:
+        table = pd.DataFrame({
+            "utt_id": index[utt_pos],
+            "sku": [it["sku"] for it in built],
+            "quantity": [it["quantity"] for it in built],
+            "options": [it.get("options") for it in built],
+        })
+        return table.reset_index(drop=True)
+    grouped: Dict[int, list] = {}
+    for pos, item in zip(utt_pos, built):
+        grouped.setdefault(pos, []).append(item)
+    if orders:
+        return pd.Series([_order(grouped.get(pos, []), order_type.get(pos)) for pos in range(len(texts))],
+                         index=index, dtype=object)
+    return pd.Series([grouped.get(pos, []) for pos in range(len(texts))], index=index, dtype=object)
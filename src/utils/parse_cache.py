@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from hashlib import sha256
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .io import file_sha256
+from .metrics import count
+
+PARSE_CACHE_VERSION = 1
+UTILS_DIR = Path(__file__).resolve().parent
+# 파싱 결과를 바꾸는 코드(이 밖의 코드만 바뀐 재빌드는 캐시를 그대로 쓴다)
+PARSE_CODE = [UTILS_DIR / f"{name}.py" for name in
+              ("parse", "menu", "slots", "quantity", "textnorm", "fuzzy", "jamo", "automaton", "parse_cache")]
+# 한 번에 조회할 키 수(SQLite 변수 개수 상한 아래)
+LOOKUP_BATCH = 500
+
+
+def parse_cache_path(paths: "Paths", domain: str) -> Path:
+    return paths.data_interim / f"{domain}_parse_cache.sqlite"
+
+
+def parse_config_hash(config_files: Iterable[Path], code: Iterable[Path] = PARSE_CODE) -> str:
+    """메뉴/별칭/patterns 설정과 파서 코드의 내용 해시. 하나라도 바뀌면 캐시 전체가 무효가 된다."""
+    h = sha256(f"v{PARSE_CACHE_VERSION}".encode("utf-8"))
+    for p in list(config_files) + list(code):
+        h.update(p.name.encode("utf-8"))
+        h.update((file_sha256(p) if p.exists() else "missing").encode("utf-8"))
+    return f"sha256:{h.hexdigest()}"
+
+
+def cache_mode(mode: str, **parts) -> str:
+    """캐시 모드 키("items"/"order")에 결과를 바꾸는 호출 조건(매핑·별칭 사전·전처리기·퍼지 방식)의 지문을 붙인다.
+
+    config 해시는 설정 파일 내용만 보므로, 같은 파일로 만든 매핑이라도 별칭을 끄거나 전처리기를 바꿔 부르면 다른 키가 되어야 한다.
+    """
+    blob = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return f"{mode}:{sha256(blob.encode('utf-8')).hexdigest()[:16]}"
+
+
+class ParseCache:
+    """발화 → 파싱 결과 디스크 캐시(SQLite, data/interim/{domain}_parse_cache.sqlite).
+
+    키는 (모드, 발화 원문)이고 파일 전체가 하나의 config 해시에 묶인다. 열 때 해시가 다르면 비우고 새로 채운다.
+    모드에는 cache_mode로 호출 조건의 지문이 붙어 있어 별칭 사용 여부·전처리기가 다른 호출끼리 결과를 섞지 않는다.
+    원문을 키로 쓰는 이유: 정규화는 세그먼트 분할 뒤에 하므로(구분자가 지워짐) 정규화 텍스트가 같아도 결과가 다를 수 있다.
+    쓰기는 store 호출 단위로 커밋한다. 03/04가 같은 파일을 동시에 열어도 되도록 WAL 모드.
+    """
+
+    def __init__(self, path: Path, config_hash: str):
+        self.path = path
+        self.config_hash = config_hash
+        self.hits = 0
+        self.misses = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), timeout=60, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS parses (mode TEXT, text TEXT, result TEXT, PRIMARY KEY (mode, text))"
+                             " WITHOUT ROWID")
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'config_hash'").fetchone()
+            if row is None or row[0] != config_hash:
+                self._db.execute("DELETE FROM parses")
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('config_hash', ?)", (config_hash,))
+
+    @classmethod
+    def for_domain(cls, paths: "Paths", domain: str) -> "ParseCache":
+        """03/04용: 도메인 메뉴·별칭 YAML과 patterns.yml로 config 해시를 만든다."""
+        configs = [paths.configs / f"menu.{domain}.yml", paths.configs / f"aliases.{domain}.yml",
+                   paths.configs / "patterns.yml"]
+        return cls(parse_cache_path(paths, domain), parse_config_hash(configs))
+
+    def lookup(self, mode: str, texts: Iterable[str]) -> Dict[str, str]:
+        """캐시에 있는 발화의 결과 JSON 문자열(hits/misses는 고유 발화 기준)."""
+        keys = list(dict.fromkeys(texts))
+        found: Dict[str, str] = {}
+        for i in range(0, len(keys), LOOKUP_BATCH):
+            part = keys[i:i + LOOKUP_BATCH]
+            marks = ",".join("?" * len(part))
+            found.update(self._db.execute(
+                f"SELECT text, result FROM parses WHERE mode = ? AND text IN ({marks})", [mode, *part]))
+        self._tally(len(found), len(keys) - len(found))
+        return found
+
+    def store(self, mode: str, results: Dict[str, str]) -> None:
+        """발화 → 결과 JSON 문자열을 한 트랜잭션으로 쓴다."""
+        if not results:
+            return
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO parses VALUES (?, ?, ?)",
+                                 [(mode, t, r) for t, r in results.items()])
+
+    def _tally(self, hits: int, misses: int) -> None:
+        self.hits += hits
+        self.misses += misses
+        count("parse_cache_hits", hits)
+        count("parse_cache_misses", misses)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / total, 4) if total else 0.0}
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "ParseCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def cached_parse(cache: Optional[ParseCache], mode: str, texts: List[str], parse) -> List[object]:
+    """texts 중 캐시에 없는 고유 발화만 parse(list) -> list로 파싱해 채운다(입력 순서 유지).
+
+    결과는 행마다 JSON에서 새로 만들므로 호출 측이 제자리 수정해도(옵션 필터) 다른 행에 번지지 않는다.
+    """
+    if cache is None:
+        return parse(texts)
+    found = cache.lookup(mode, texts)
+    todo = [t for t in dict.fromkeys(texts) if t not in found]
+    if todo:
+        fresh = {t: json.dumps(r, ensure_ascii=False) for t, r in zip(todo, parse(todo))}
+        cache.store(mode, fresh)
+        found.update(fresh)
+    return [json.loads(found[t]) for t in texts]
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .io import load_yaml
+
+KOR_NUM_MAP = {
+    "한": 1, "하나": 1, "1": 1,
+    "두": 2, "둘": 2, "2": 2,
+    "세": 3, "셋": 3, "3": 3,
+    "네": 4, "넷": 4, "4": 4,
+    "다섯": 5, "5": 5,
+    "여섯": 6, "6": 6,
+    "일곱": 7, "7": 7,
+    "여덟": 8, "8": 8,
+    "아홉": 9, "9": 9,
+    "열": 10, "10": 10,
+    "열한": 11, "열하나": 11, "11": 11,
+    "열두": 12, "열둘": 12, "12": 12,
+    "열세": 13, "열셋": 13, "13": 13,
+    "열네": 14, "열넷": 14, "14": 14,
+    "열다섯": 15, "15": 15,
+    "열여섯": 16, "16": 16,
+    "열일곱": 17, "17": 17,
+    "열여덟": 18, "18": 18,
+    "열아홉": 19, "19": 19,
+    "스무": 20, "스물": 20, "20": 20,
+}
+
+
+DEFAULT_QTY_UNITS = ["잔", "개", "병", "세트", "컵"]
+# 숫자 수량은 세 자리까지만 인정한다(예전 \d{1,3} 규칙). 설정 regexes가 \d+여도 "1000잔"은 수량으로 보지 않는다
+MAX_QTY_DIGITS = 3
+
+PATTERNS_PATH = Path(__file__).resolve().parents[2] / "configs" / "patterns.yml"
+
+
+@dataclass
+class QuantityParser:
+    """patterns.yml(parsing.quantity)에서 1회 컴파일한 수량 추출기.
+
+    단일 alternation 정규식을 한 번 훑은 뒤 우선순위로 고른다:
+    숫자+단위 > 한글수+단위(긴 수사 우선) > 단독 숫자. MAX_QTY_DIGITS보다 긴 숫자는 후보에서 뺀다.
+    """
+
+    pattern: re.Pattern
+    number_words: Dict[str, int]
+    word_rank: Dict[str, int]
+
+    def signature(self) -> list:
+        """컴파일된 정규식·수사 표 요약(파싱 캐시 키용). 같은 patterns.yml로 만든 추출기는 같은 값."""
+        return [self.pattern.pattern, sorted(self.number_words.items())]
+
+    def __call__(self, text: str) -> Optional[int]:
+        best_key = None
+        best_val = None
+        for m in self.pattern.finditer(text.strip()):
+            for name, tok in m.groupdict().items():
+                if tok is None:
+                    continue
+                role = name.split("__", 1)[0]
+                if role in ("num", "bare") and len(tok) > MAX_QTY_DIGITS:
+                    break
+                if role == "num":
+                    key, val = (0, 0, m.start()), int(tok)
+                elif role == "wordnum":
+                    if tok not in self.number_words:
+                        continue
+                    key, val = (1, self.word_rank[tok], m.start()), self.number_words[tok]
+                elif role == "bare":
+                    key, val = (2, 0, m.start()), int(tok)
+                else:
+                    continue
+                if best_key is None or key < best_key:
+                    best_key, best_val = key, val
+                break
+        return best_val
+
+
+def quantity_config(patterns: Optional[dict] = None) -> dict:
+    """patterns.yml 중 compile_quantity_parser가 읽는 부분만(인덱스 meta에 직렬화용)."""
+    qcfg = (((patterns or {}).get("parsing") or {}).get("quantity")) or {}
+    return {"parsing": {"quantity": qcfg}} if qcfg else {}
+
+
+def compile_quantity_parser(patterns: Optional[dict] = None) -> QuantityParser:
+    qcfg = ((patterns or {}).get("parsing") or {}).get("quantity") or {}
+    units = list(DEFAULT_QTY_UNITS)
+    for u in qcfg.get("units") or []:
+        if isinstance(u, str) and u and u not in units:
+            units.append(u)
+    number_words: Dict[str, int] = {k: v for k, v in KOR_NUM_MAP.items() if not k.isdigit()}
+    for k, v in (qcfg.get("number_words") or {}).items():
+        if isinstance(k, str) and k and isinstance(v, int):
+            number_words[k] = v
+    # 같은 위치에서 긴 수사가 먼저 매칭되도록 길이 역순(안정 정렬)
+    ordered = sorted(number_words, key=lambda w: -len(w))
+    word_rank = {w: i for i, w in enumerate(ordered)}
+    unit_alt = "|".join(re.escape(u) for u in sorted(units, key=lambda u: -len(u)))
+    word_alt = "|".join(re.escape(w) for w in ordered)
+
+    # 설정 regexes는 그룹명(num/wordnum/unit)을 패턴별로 고유화해 하나의 alternation으로 합친다
+    alts: List[str] = []
+    for i, rx in enumerate(qcfg.get("regexes") or []):
+        if not isinstance(rx, str):
+            continue
+        alts.append("(?:" + re.sub(r"\(\?P<(\w+)>", lambda g: f"(?P<{g.group(1)}__{i}>", rx) + ")")
+    alts.append(fr"(?P<num__d>\d{{1,3}})\s*(?:{unit_alt})")
+    alts.append(fr"(?P<wordnum__w>{word_alt})\s*(?:{unit_alt})")
+    alts.append(r"\b(?P<bare__b>\d{1,3})\b")
+    pattern = re.compile("|".join(alts))
+    return QuantityParser(pattern=pattern, number_words=number_words, word_rank=word_rank)
+
+
+@lru_cache(maxsize=1)
+def default_quantity_parser() -> QuantityParser:
+    patterns = load_yaml(PATTERNS_PATH) if PATTERNS_PATH.exists() else {}
+    return compile_quantity_parser(patterns or {})
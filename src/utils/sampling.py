@@ -1,4 +1,18 @@
-from typing import Iterable, List
+from __future__ import annotations
+
+import math
+from collections import Counter
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+import numpy as np
+import pandas as pd
+
+from .io import Paths, iter_interim_chunks
+from .metrics import count
+
+T = TypeVar("T")
 
 
 def unique_by(items: Iterable[str]) -> List[str]:
@@ -9,3 +23,286 @@ def unique_by(items: Iterable[str]) -> List[str]:
             seen.add(it)
             out.append(it)
     return out
+
+
+# 코드포인트는 21비트 이하라 3-gram을 겹침 없이 64비트 정수 하나로 만들 수 있다
+_CP_BITS = 21
+_MAX_SHINGLE = 3
+_MULT_SHIFT = np.uint64(32)
+
+
+def _shingle_ids(texts: Sequence[str], k: int) -> tuple:
+    """텍스트들의 문자 k-gram을 정수 id로(벡터 연산). 반환: (평탄한 id 배열, 텍스트별 시작 offset).
+
+    k보다 짧은 텍스트는 채움 문자를 붙여 k-gram 1개로 만든다.
+    """
+    padded = [t.ljust(k, "\x01") for t in texts]
+    lengths = np.fromiter((len(t) for t in padded), dtype=np.int64, count=len(padded))
+    # 구분자(\x00)로 이어 붙여 UTF-32로 한 번에 코드포인트 배열을 만든다
+    cp = np.frombuffer("\x00".join(padded).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    win = cp[:len(cp) - k + 1].copy()
+    for j in range(1, k):
+        win = (win << np.uint64(_CP_BITS)) | cp[j:len(cp) - k + 1 + j]
+    starts = np.concatenate(([0], np.cumsum(lengths[:-1] + 1)))
+    n_win = lengths - k + 1
+    offsets = np.concatenate(([0], np.cumsum(n_win[:-1])))
+    # 텍스트 j의 창 시작 위치: starts[j] .. starts[j] + n_win[j] - 1 (구분자를 걸치는 창은 제외)
+    idx = np.arange(int(n_win.sum()), dtype=np.int64) + np.repeat(starts - offsets, n_win)
+    return win[idx], offsets
+
+
+def minhash_signatures(texts: Sequence[str], num_perm: int = 64, shingle: int = 3, seed: int = 1,
+                       chunk: int = 20_000) -> np.ndarray:
+    """문자 shingle 집합의 MinHash 서명(n × num_perm, uint32).
+
+    순열은 multiply-shift 해시((a·x + b) mod 2^64 >> 32, a는 홀수)로 근사한다.
+    메모리를 묶어 두려고 텍스트를 chunk개씩 나눠 계산한다.
+    """
+    if not 1 <= shingle <= _MAX_SHINGLE:
+        raise ValueError(f"shingle must be 1..{_MAX_SHINGLE}")
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+    sig = np.empty((len(texts), num_perm), dtype=np.uint32)
+    with np.errstate(over="ignore"):
+        for lo in range(0, len(texts), chunk):
+            ids, offsets = _shingle_ids(texts[lo:lo + chunk], shingle)
+            for p in range(num_perm):
+                hv = (a[p] * ids + b[p]) >> _MULT_SHIFT
+                sig[lo:lo + len(offsets), p] = np.minimum.reduceat(hv, offsets)
+    return sig
+
+
+def _components(n: int, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """간선 (u, v)로 연결 요소를 구해 각 노드의 최소 인덱스를 돌려준다(최소 라벨 전파 + pointer jumping)."""
+    labels = np.arange(n, dtype=np.int64)
+    if len(u) == 0:
+        return labels
+    while True:
+        prev = labels.copy()
+        np.minimum.at(labels, u, labels[v])
+        np.minimum.at(labels, v, labels[u])
+        labels = labels[labels]
+        if np.array_equal(labels, prev):
+            return labels
+
+
+def near_duplicate_labels(texts: Sequence[str], threshold: float = 0.8, num_perm: int = 64, bands: int = 16,
+                          shingle: int = 3, normalize: Optional[Callable[[str], str]] = None) -> np.ndarray:
+    """거의 같은 발화끼리 묶어 각 텍스트의 대표 인덱스(클러스터에서 가장 앞선 위치)를 돌려준다.
+
+    normalize(예: TextNormalizer) 후 공백을 지운 문자 shingle로 MinHash를 만들고, LSH 밴드 버킷이 같은 쌍 중
+    서명 일치율(추정 Jaccard)이 threshold 이상인 것만 잇는다. 쌍별 비교 없이 텍스트 수에 거의 선형.
+    정규화 후 완전히 같은 텍스트는 서명 계산 전에 합친다.
+    """
+    if num_perm % bands:
+        raise ValueError("num_perm must be divisible by bands")
+    s = pd.Series(list(texts), dtype=object).fillna("").astype(str)
+    if normalize is not None:
+        s = s.map(normalize)
+    s = s.map(lambda t: "".join(t.split()))
+    codes, uniq = pd.factorize(s)
+    first = np.full(len(uniq), len(s), dtype=np.int64)
+    np.minimum.at(first, codes, np.arange(len(s), dtype=np.int64))
+
+    sig = minhash_signatures(list(uniq), num_perm=num_perm, shingle=shingle)
+    rows = num_perm // bands
+    need = int(np.ceil(threshold * num_perm))
+    us, vs = [], []
+    for band in range(bands):
+        keys = np.ascontiguousarray(sig[:, band * rows:(band + 1) * rows]).view(np.dtype((np.void, 4 * rows))).ravel()
+        _, rep_idx, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        rep = rep_idx[inverse.ravel()]
+        cand = np.nonzero(rep != np.arange(len(uniq)))[0]
+        if len(cand) == 0:
+            continue
+        # 버킷 첫 원소와의 서명 일치율로 LSH 오탐을 거른다
+        ok = (sig[cand] == sig[rep[cand]]).sum(axis=1) >= need
+        us.append(cand[ok])
+        vs.append(rep[cand[ok]])
+    u = np.concatenate(us) if us else np.empty(0, dtype=np.int64)
+    v = np.concatenate(vs) if vs else np.empty(0, dtype=np.int64)
+    # factorize 순서 == 첫 등장 순서이므로 최소 라벨이 곧 가장 앞선 텍스트
+    labels = _components(len(uniq), u, v)
+    return first[labels[codes]]
+
+
+def near_duplicate_mask(texts: Sequence[str], **kwargs) -> np.ndarray:
+    """클러스터마다 대표 1개(가장 앞선 위치)만 True."""
+    labels = near_duplicate_labels(texts, **kwargs)
+    return labels == np.arange(len(labels))
+
+
+def seeded_order(n: int, seed: int) -> np.ndarray:
+    """0..n-1의 시드 고정 순열(스트리밍 샘플러가 훑는 순서)."""
+    return np.random.default_rng(seed).permutation(n)
+
+
+def seeded_texts(df: pd.DataFrame, seed: int, column: str = "발화문") -> List[str]:
+    texts = df[column].map(str).tolist()
+    return [texts[i] for i in seeded_order(len(texts), seed)]
+
+
+def reservoir_sample(chunks: Iterable[Sequence[T]], size: int, seed: int) -> List[T]:
+    """chunk 스트림에서 균등 표본 size개(Algorithm R). 전체를 메모리에 올리지 않으며 결과는 시드 고정 순서로 섞는다."""
+    rng = np.random.default_rng(seed)
+    pool: List[T] = []
+    seen = 0
+    for chunk in chunks:
+        values = list(chunk)
+        fill = min(len(values), size - len(pool))
+        pool.extend(values[:fill])
+        rest = values[fill:]
+        if rest:
+            # i번째(0부터) 원소는 확률 size/(i+1)로 임의 슬롯을 대체. 뽑기는 chunk 단위로 한 번에
+            idx = np.arange(seen + fill, seen + fill + len(rest))
+            slots = rng.integers(0, idx + 1)
+            for j in np.nonzero(slots < size)[0]:
+                pool[slots[j]] = rest[j]
+        seen += len(values)
+    return [pool[i] for i in rng.permutation(len(pool))]
+
+
+def interim_pool(paths: Paths, domain: str, size: int, seed: int, column: str = "발화문",
+                 chunksize: int = 200_000) -> pd.DataFrame:
+    """메모리에 다 올릴 수 없는 interim을 chunk로 한 번 훑어 발화 size개 균등 표본(reservoir)을 만든다."""
+    chunks = (c[column].map(str).tolist() for c in iter_interim_chunks(paths, domain, [column], chunksize))
+    return pd.DataFrame({column: reservoir_sample(chunks, size, seed)})
+
+
+@dataclass
+class Quotas:
+    """층별 목표 행 수. 아이템 수(single/multi)·옵션 유무(yes/no)는 각각 합이 drafts, SKU는 상한만 둔다."""
+
+    total: int
+    sku_cap: int
+    items: Dict[str, int]
+    options: Dict[str, int]
+    ask: int = 0
+
+    def cap(self, key: str) -> int:
+        kind, _, value = key.partition(":")
+        if kind == "sku":
+            return self.sku_cap
+        if kind == "items":
+            return self.items[value]
+        if kind == "options":
+            return self.options[value]
+        return self.ask
+
+
+def make_quotas(total: int, multi_share: float = 0.3, option_share: float = 0.5, max_sku_share: float = 0.1,
+                ask_share: float = 0.0) -> Quotas:
+    """total행을 나눌 층별 목표. ASK는 ask_share, 나머지(drafts) 중 멀티 아이템 multi_share·옵션 포함 option_share."""
+    ask = int(total * ask_share)
+    drafts = total - ask
+    multi = round(drafts * multi_share)
+    with_opts = round(drafts * option_share)
+    return Quotas(total=total, sku_cap=max(1, math.ceil(total * max_sku_share)),
+                  items={"single": drafts - multi, "multi": multi},
+                  options={"yes": with_opts, "no": drafts - with_opts}, ask=ask)
+
+
+def order_strata(order: Optional[dict]) -> List[str]:
+    """주문이 속한 층 키. None(ASK)은 ["ask"]."""
+    if order is None:
+        return ["ask"]
+    items = order.get("items") or []
+    keys = [f"sku:{s}" for s in unique_by(it.get("sku") for it in items if it.get("sku"))]
+    keys.append("items:multi" if len(items) > 1 else "items:single")
+    keys.append("options:yes" if any(it.get("options") for it in items) else "options:no")
+    return keys
+
+
+# 할당량에 막힌 행은 total의 이 배수까지만 보류(마지막 채우기에서 SKU 상한을 지킬 후보를 넉넉히 남기려고)
+DEFERRED_FACTOR = 5
+
+
+class StratifiedSampler:
+    """행을 하나씩 받아 층별 할당량 안에서만 채택한다. 모든 층이 차면(= total행) full.
+
+    할당량에 막힌 행은 보류해 두었다가, 스트림이 끝나거나 patience행 연속으로 채택이 없으면
+    finish()에서 보류분으로 모자란 행을 채운다(SKU 상한을 지키는 행 먼저). ASK는 상한을 넘기지 않는다.
+    """
+
+    def __init__(self, quotas: Quotas, patience: Optional[int] = None):
+        self.quotas = quotas
+        self.patience = patience
+        self.used: Counter = Counter()
+        self.accepted: List[Any] = []
+        self._deferred: List[Tuple[Any, List[str]]] = []
+        self._idle = 0
+        # sample_stream이 파싱에 넘긴 발화 수
+        self.scanned = 0
+
+    @property
+    def full(self) -> bool:
+        return len(self.accepted) >= self.quotas.total
+
+    @property
+    def done(self) -> bool:
+        return self.full or (self.patience is not None and self._idle >= self.patience)
+
+    def _take(self, row: Any, keys: List[str]) -> None:
+        self.accepted.append(row)
+        self.used.update(keys)
+
+    def offer(self, row: Any, order: Optional[dict] = None) -> bool:
+        """row(None이면 쓸 수 없는 발화로 보고 건너뜀). order는 층 판정용 주문(ASK면 None)."""
+        if self.full:
+            return False
+        if row is None:
+            self._idle += 1
+            return False
+        keys = order_strata(order)
+        if all(self.used[k] < self.quotas.cap(k) for k in keys):
+            self._take(row, keys)
+            self._idle = 0
+            return True
+        self._idle += 1
+        if keys != ["ask"] and len(self._deferred) < DEFERRED_FACTOR * self.quotas.total:
+            self._deferred.append((row, keys))
+        return False
+
+    def finish(self) -> List[Any]:
+        for strict in (True, False):
+            rest = []
+            for row, keys in self._deferred:
+                if self.full:
+                    break
+                if strict and any(self.used[k] >= self.quotas.sku_cap for k in keys if k.startswith("sku:")):
+                    rest.append((row, keys))
+                    continue
+                self._take(row, keys)
+            self._deferred = rest
+        return self.accepted
+
+
+def sample_stream(texts: Iterable[str], build: Callable[[List[str]], List[Tuple[Any, Optional[dict]]]],
+                  sampler: StratifiedSampler, batch_size: int = 256) -> List[Any]:
+    """시드 순서의 발화를 배치로 build(파싱)해 sampler에 넣고, 할당량이 차면 남은 발화는 파싱하지 않는다.
+
+    build(texts)는 발화마다 (행 또는 None, 층 판정용 주문)을 돌려준다. 배치 크기는 남은 행 수의 2배 이하로 줄여
+    마지막 배치에서 버리는 파싱을 줄인다.
+    """
+    it = iter(texts)
+    while not sampler.done:
+        need = sampler.quotas.total - len(sampler.accepted)
+        batch = list(islice(it, max(32, min(batch_size, 2 * need))))
+        if not batch:
+            break
+        sampler.scanned += len(batch)
+        for row, order in build(batch):
+            sampler.offer(row, order)
+            if sampler.done:
+                break
+    count("sample_scanned", sampler.scanned)
+    return sampler.finish()
+
+
+def dedupe_utterances(df: pd.DataFrame, normalize: Optional[Callable[[str], str]] = None, threshold: float = 0.8,
+                      column: str = "발화문") -> pd.DataFrame:
+    """03/04 샘플링 전에 거의 같은 발화를 클러스터당 1행(가장 앞선 행)으로 줄인다."""
+    keep = near_duplicate_mask(df[column].map(str).tolist(), threshold=threshold, normalize=normalize)
+    count("dedupe_dropped", int(len(df) - keep.sum()))
+    return df[keep]
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .automaton import PhraseAutomaton
+from .io import load_yaml
+
+PATTERNS_PATH = Path(__file__).resolve().parents[2] / "configs" / "patterns.yml"
+
+# 주문 단위 슬롯(아이템 옵션이 아니라 order.type으로 간다)
+ORDER_SLOTS = {"order_type"}
+# 예전 detect_temp/detect_size 키워드. 설정에 없더라도 계속 인식하도록 기본으로 합친다.
+LEGACY_KEYWORDS: Dict[str, Dict[str, List[str]]] = {
+    "temp": {"ICE": ["아이스", "차가운", "아아"], "HOT": ["뜨거운", "핫", "뜨아"]},
+    "size": {"L": ["라지", "벤티"], "M": ["톨", "레귤러", "미디움"]},
+}
+_SHOT_RE = re.compile(r"plus(\d+)$")
+# 한 글자 동의어("중", "대", "소")는 일반 문장에도 흔해 바로 뒤에 이 단어가 올 때만 인정
+SIZE_CONTEXT = ("사이즈", "size", "컵")
+
+
+class SlotMatch(NamedTuple):
+    start: int
+    end: int
+    slot: str
+    value: str
+    phrase: str
+
+
+@dataclass
+class SlotResult:
+    options: Dict[str, object] = field(default_factory=dict)
+    order_type: Optional[str] = None
+    spans: List[SlotMatch] = field(default_factory=list)
+
+
+def _slot_value(slot: str, value: str) -> Optional[object]:
+    # shot은 스키마가 정수라 plusN → N, 표현할 수 없는 값(half 등)은 버린다
+    if slot == "shot":
+        m = _SHOT_RE.match(value)
+        return int(m.group(1)) if m else None
+    return value
+
+
+@dataclass
+class SlotExtractor:
+    """patterns.yml(parsing.slots)의 모든 동의어를 하나의 Aho-Corasick 매처로 묶은 슬롯 추출기.
+
+    세그먼트를 한 번 훑어 겹치지 않는 최장 매칭만 남기고(예: "노아이스" > "아이스", "두 샷 추가" > "샷 추가"),
+    슬롯마다 가장 앞선 값을 쓴다. 영문·한 글자 동의어("sm", "hot", "중")는 단어 안에서 오탐이 잦아
+    앞뒤가 글자/숫자가 아닐 때만 인정하고, 한 글자 동의어는 뒤에 SIZE_CONTEXT가 올 때만 쓴다("중 사이즈").
+    """
+
+    automaton: PhraseAutomaton
+    # 동의어 → (슬롯, 설정 값). 같은 동의어가 여러 슬롯에 있으면 먼저 등록된 쪽
+    targets: Dict[str, Tuple[str, str]]
+    bounded: frozenset
+
+    def _accept(self, text: str, start: int, end: int, phrase: str) -> bool:
+        if phrase not in self.bounded:
+            return True
+        if (start and text[start - 1].isalnum()) or (end < len(text) and text[end].isalnum()):
+            return False
+        return len(phrase) > 1 or text[end:].lstrip().startswith(SIZE_CONTEXT)
+
+    def spans(self, text: str) -> List[SlotMatch]:
+        text = text.lower()
+        cands = [
+            SlotMatch(m.start, m.end, *self.targets[m.phrase], m.phrase)
+            for m in self.automaton.finditer(text)
+            if self._accept(text, m.start, m.end, m.phrase)
+        ]
+        if len(cands) <= 1:
+            return cands
+        # 최장 우선, 같은 길이면 앞선 위치·등록 순서
+        cands.sort(key=lambda c: (c.start - c.end, c.start, self.automaton.rank(c.phrase)))
+        chosen: List[SlotMatch] = []
+        for c in cands:
+            if all(c.end <= o.start or c.start >= o.end for o in chosen):
+                chosen.append(c)
+        chosen.sort(key=lambda c: c.start)
+        return chosen
+
+    def signature(self) -> list:
+        """동의어 표 요약(파싱 캐시 키용). 같은 patterns.yml로 만든 추출기는 같은 값."""
+        return [sorted(self.targets.items()), sorted(self.bounded)]
+
+    def extract(self, text: str) -> SlotResult:
+        res = SlotResult(spans=self.spans(text))
+        for s in res.spans:
+            if s.slot in ORDER_SLOTS:
+                if res.order_type is None:
+                    res.order_type = s.value
+                continue
+            if s.slot in res.options:
+                continue
+            value = _slot_value(s.slot, s.value)
+            if value is not None:
+                res.options[s.slot] = value
+        return res
+
+
+def slots_config(patterns: Optional[dict] = None) -> dict:
+    """patterns.yml 중 compile_slot_extractor가 읽는 부분만(인덱스 meta에 직렬화용)."""
+    slots = (((patterns or {}).get("parsing") or {}).get("slots")) or {}
+    return {"parsing": {"slots": slots}} if slots else {}
+
+
+def compile_slot_extractor(patterns: Optional[dict] = None) -> SlotExtractor:
+    slots = (((patterns or {}).get("parsing") or {}).get("slots")) or {}
+    table: List[Tuple[str, str, str]] = []
+    for slot, values in slots.items():
+        if not isinstance(values, dict):
+            continue
+        for value, words in values.items():
+            for w in words or []:
+                if isinstance(w, str) and w.strip():
+                    table.append((w.strip().lower(), str(slot), str(value)))
+    legacy = set()
+    for slot, values in LEGACY_KEYWORDS.items():
+        for value, words in values.items():
+            for w in words:
+                table.append((w, slot, value))
+                legacy.add(w)
+
+    targets: Dict[str, Tuple[str, str]] = {}
+    for word, slot, value in table:
+        targets.setdefault(word, (slot, value))
+    bounded = frozenset(w for w in targets if w not in legacy and (len(w) == 1 or w.isascii()))
+    return SlotExtractor(automaton=PhraseAutomaton(targets.keys()), targets=targets, bounded=bounded)
+
+
+@lru_cache(maxsize=1)
+def default_slot_extractor() -> SlotExtractor:
+    patterns = load_yaml(PATTERNS_PATH) if PATTERNS_PATH.exists() else {}
+    return compile_slot_extractor(patterns or {})
+
+
+def extract_slots(text: str) -> SlotResult:
+    return default_slot_extractor().extract(text)
@@ -1,6 +1,180 @@
+from __future__ import annotations
+
 import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+_SPACES_RE = re.compile(r"\s+")
+_REGEX_META = set(".^$*+?{}[]\\|()")
+
+
+def _first_literal(pattern: str) -> Optional[str]:
+    """규칙이 반드시 시작하는 글자(앞쪽 \\b / ^ 무시). 판단할 수 없으면 None."""
+    i = 0
+    while pattern.startswith(("\\b", "^"), i):
+        i += 1 if pattern[i] == "^" else 2
+    if i >= len(pattern) or pattern[i] in _REGEX_META:
+        return None
+    if i + 1 < len(pattern) and pattern[i + 1] in "?*{":
+        return None
+    return pattern[i]
+
 
 def normalize(text: str) -> str:
     text = text.strip()
     text = re.sub(r"\s+", " ", text)
     return text
+
+
+@dataclass
+class TextNormalizer:
+    """patterns.yml(normalization + rewrites)에서 1회 컴파일한 전처리기.
+
+    적용 순서: 유니코드 정규화 → 소문자 → rewrites → 선행 STT 잡음 토큰 제거 → strip_regex → 공백 정리.
+    rewrites는 규칙마다 re.sub를 도는 대신 하나의 alternation으로 합쳐 한 번만 훑고,
+    매칭된 바깥 그룹 번호로 치환 문자열을 고른다. 같은 위치에서는 앞선 규칙이 이기고(leftmost-first),
+    치환 결과를 다른 규칙이 다시 고치지는 않는다.
+    """
+
+    unicode_form: Optional[str] = None
+    lower: bool = False
+    rewrite_re: Optional[re.Pattern] = None
+    # 바깥 그룹 번호 → (규칙 정규식, 치환 문자열). 역참조가 없는 치환은 문자열 그대로 쓴다.
+    rewrites: Dict[int, Tuple[re.Pattern, str]] = field(default_factory=dict)
+    noise_re: Optional[re.Pattern] = None
+    strip_re: Optional[re.Pattern] = None
+    collapse_spaces: bool = True
+    trim: bool = True
+    maxsize: int = 65536
+    _cache: Dict[str, str] = field(default_factory=dict, repr=False)
+
+    def _rewrite(self, m: re.Match) -> str:
+        rule, repl = self.rewrites[m.lastindex]
+        if "\\" not in repl:
+            return repl
+        # 역참조는 규칙 단독 정규식으로 같은 위치를 다시 맞춰 확장
+        return rule.match(m.string, m.start()).expand(repl)
+
+    def apply(self, text: str, rewrite: bool = True) -> str:
+        if self.unicode_form:
+            text = unicodedata.normalize(self.unicode_form, text)
+        if self.lower:
+            text = text.lower()
+        if rewrite and self.rewrite_re is not None:
+            text = self.rewrite_re.sub(self._rewrite, text)
+        if rewrite and self.noise_re is not None:
+            text = self.noise_re.sub("", text.lstrip())
+        if self.strip_re is not None:
+            text = self.strip_re.sub("", text)
+        if self.collapse_spaces and self.trim:
+            # split/join이 정규식 치환보다 빠르고 결과는 같다
+            return " ".join(text.split())
+        if self.collapse_spaces:
+            text = _SPACES_RE.sub(" ", text)
+        if self.trim:
+            text = text.strip()
+        return text
+
+    def __call__(self, text: str) -> str:
+        """캐시된 scalar 정규화(입력 원문 → 결과만 캐시).
+
+        apply는 멱등이 아니므로(선행 잡음 제거 뒤 새 잡음 토큰이 드러날 수 있음, "!음 라떼" → "음 라떼") 결과를 키로
+        넣지 않는다. 이미 정규화한 텍스트는 다시 넘기지 말고 호출 측에서 normalized=True로 표시한다.
+        """
+        out = self._cache.get(text)
+        if out is None:
+            out = self.apply(text)
+            if len(self._cache) >= self.maxsize:
+                self._cache.clear()
+            self._cache[text] = out
+        return out
+
+    def series(self, texts: pd.Series) -> pd.Series:
+        """Series 버전: 고유값만 1회씩 정규화해 되돌려 붙인다(결과는 apply와 동일).
+
+        `.str` 단계별 연산은 rewrites 콜백이 원소마다 파이썬으로 돌아 오히려 느려서 쓰지 않는다.
+        """
+        s = texts.fillna("").astype(str)
+        uniq = pd.unique(s.to_numpy(dtype=object))
+        return s.map(dict(zip(uniq, map(self, uniq)))).astype(object)
+
+    def signature(self) -> list:
+        """컴파일된 규칙 요약(파싱 캐시 키용). 같은 patterns.yml로 만든 전처리기는 같은 값."""
+        return [self.unicode_form, self.lower, self.rewrite_re.pattern if self.rewrite_re is not None else None,
+                [repl for _, (_, repl) in sorted(self.rewrites.items())],
+                self.noise_re.pattern if self.noise_re is not None else None,
+                self.strip_re.pattern if self.strip_re is not None else None, self.collapse_spaces, self.trim]
+
+    def phrase_key(self, phrase: str) -> str:
+        # 매처에 등록할 phrase는 표기만 맞춘다. rewrites는 발화 교정용이라 phrase에만 걸면
+        # 단어 경계가 다른 문맥(예: "카모마일" vs "카모마일티")에서 매칭을 잃는다.
+        return self.apply(phrase, rewrite=False) or phrase
+
+    def phrase_keys(self, phrase: str) -> List[str]:
+        """phrase를 매처에 등록할 표기들: 표기 정규화본 + rewrites 적용본(발화 쪽이 교정된 경우)."""
+        keys = [self.phrase_key(phrase)]
+        rewritten = self.apply(phrase)
+        if rewritten and rewritten != keys[0]:
+            keys.append(rewritten)
+        return keys
+
+    def __getstate__(self) -> dict:
+        # 프로세스 풀로 넘길 때 캐시는 비운다
+        state = dict(self.__dict__)
+        state["_cache"] = {}
+        return state
+
+
+def normalizer_config(patterns: Optional[dict] = None) -> dict:
+    """patterns.yml 중 compile_normalizer가 읽는 부분만(인덱스 meta에 직렬화용)."""
+    patterns = patterns or {}
+    return {k: patterns[k] for k in ("normalization", "rewrites") if patterns.get(k)}
+
+
+def compile_normalizer(patterns: Optional[dict] = None) -> TextNormalizer:
+    patterns = patterns or {}
+    ncfg = patterns.get("normalization") or {}
+    rules: List[Tuple[str, str]] = []
+    for r in ((patterns.get("rewrites") or {}).get("replacements") or []):
+        if isinstance(r, dict) and isinstance(r.get("pattern"), str) and r["pattern"]:
+            rules.append((r["pattern"], str(r.get("replace") or "")))
+
+    rewrite_re = None
+    rewrites: Dict[int, Tuple[re.Pattern, str]] = {}
+    if rules:
+        parts: List[str] = []
+        group = 1
+        for pat, repl in rules:
+            rule = re.compile(pat)
+            rewrites[group] = (rule, repl)
+            parts.append(f"({pat})")
+            # 규칙 내부 그룹만큼 다음 바깥 그룹 번호가 밀린다
+            group += 1 + rule.groups
+        combined = "|".join(parts)
+        # 모든 규칙의 첫 글자를 알 수 있으면 lookahead로 걸러 대부분의 위치에서 alternation 시도를 건너뛴다
+        firsts = [_first_literal(pat) for pat, _ in rules]
+        if all(firsts):
+            combined = f"(?=[{''.join(re.escape(c) for c in sorted(set(firsts)))}])(?:{combined})"
+        rewrite_re = re.compile(combined)
+
+    noise_re = None
+    tokens = [t for t in (ncfg.get("stt_noise_tokens") or []) if isinstance(t, str) and t]
+    if tokens:
+        alt = "|".join(re.escape(t) for t in sorted(tokens, key=lambda t: -len(t)))
+        # 발화 맨 앞에서 독립 토큰으로 나온 잡음만 반복 제거
+        noise_re = re.compile(rf"^(?:(?:{alt})(?:\s+|$))+")
+
+    strip_pat = ncfg.get("strip_regex")
+    return TextNormalizer(
+        unicode_form=ncfg.get("unicode_form") or None,
+        lower=bool(ncfg.get("lower", False)),
+        rewrite_re=rewrite_re,
+        rewrites=rewrites,
+        noise_re=noise_re,
+        strip_re=re.compile(strip_pat) if isinstance(strip_pat, str) and strip_pat else None,
+        collapse_spaces=bool(ncfg.get("collapse_spaces", True)),
+        trim=bool(ncfg.get("trim", True)),
+    )
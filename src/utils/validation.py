@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 import json
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Iterable, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
 from jsonschema import Draft202012Validator, RefResolver
 
+from .constraints import MenuConstraints
+
 
 def load_json(path: Path) -> dict:
     with path.open("r", encoding="utf-8") as f:
@@ -36,18 +39,242 @@ def validate_json(obj: dict, schema: dict, store: Dict[str, dict]) -> Tuple[bool
 def validate_jsonl(path: Path, schema: dict, store: Dict[str, dict]) -> Tuple[int, int, list]:
     ok, fail = 0, 0
     messages = []
+    # validator는 파일당 1회만 만든다
+    validator = Draft202012Validator(schema, resolver=RefResolver.from_schema(schema, store=store))
     with path.open("r", encoding="utf-8") as f:
         for i, line in enumerate(f, start=1):
             line = line.strip()
             if not line:
                 continue
             obj = json.loads(line)
-            valid, err = validate_json(obj, schema, store)
-            if valid:
+            errors = sorted(validator.iter_errors(obj), key=lambda e: e.path)
+            if not errors:
                 ok += 1
             else:
                 fail += 1
-                messages.append(f"line {i}: {err}")
+                messages.append(f"line {i}: " + "; ".join([f"{list(e.path)}: {e.message}" for e in errors]))
     return ok, fail, messages
 
 
+# ---- 검증 엔진: 스키마 1회 컴파일 + 파일 1회 파싱(스키마/의미 검사 동시) + byte-range 병렬 ----
+
+# 이 크기 미만 파일은 워커를 띄우지 않고 현재 프로세스에서 처리
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+
+
+def bundle_schema(schema: object, store: Dict[str, dict], _stack: Tuple[str, ...] = ()) -> object:
+    """저장소 $id를 가리키는 $ref를 참조 스키마 본문으로 펼친다.
+
+    줄마다 반복되던 원격 참조 해석 비용을 컴파일 시 1회로 옮긴다. 순환 참조나 fragment 참조는 그대로 둔다.
+    """
+    if isinstance(schema, list):
+        return [bundle_schema(v, store, _stack) for v in schema]
+    if not isinstance(schema, dict):
+        return schema
+    ref = schema.get("$ref")
+    if isinstance(ref, str) and ref in store and ref not in _stack:
+        target = {k: v for k, v in store[ref].items() if k not in ("$id", "$schema")}
+        inlined = bundle_schema(target, store, _stack + (ref,))
+        rest = {k: v for k, v in schema.items() if k != "$ref"}
+        if not rest:
+            return inlined
+        return {"allOf": [inlined], **bundle_schema(rest, store, _stack)}
+    return {k: bundle_schema(v, store, _stack) for k, v in schema.items()}
+
+
+class SchemaSet:
+    """configs/*.schema.json을 $id 저장소로 묶고, 스키마별 validator를 1회만 만든다(원격 $ref는 미리 펼침)."""
+
+    def __init__(self, configs_dir: Path):
+        self.configs_dir = configs_dir
+        self.store = load_schema_store(configs_dir)
+        self._validators: Dict[str, Draft202012Validator] = {}
+        self._fast: Dict[str, Optional[Callable[[object], object]]] = {}
+
+    def validator(self, schema_file: str) -> Draft202012Validator:
+        v = self._validators.get(schema_file)
+        if v is None:
+            schema = load_json(self.configs_dir / schema_file)
+            bundled = bundle_schema(schema, self.store, (schema.get("$id"),))
+            v = Draft202012Validator(bundled, resolver=RefResolver.from_schema(bundled, store=self.store))
+            self._validators[schema_file] = v
+        return v
+
+    def fast_validator(self, schema_file: str) -> Optional[Callable[[object], object]]:
+        """fastjsonschema(선택 의존성)로 컴파일한 통과 판정기. 없거나 컴파일 실패면 None."""
+        if schema_file not in self._fast:
+            fast = None
+            try:
+                import fastjsonschema
+                bundled = bundle_schema(load_json(self.configs_dir / schema_file), self.store)
+                # 사용 키워드는 draft-07과 호환되므로 $schema를 빼고 기본 draft로 컴파일
+                fast = fastjsonschema.compile({k: v for k, v in bundled.items() if k != "$schema"})
+            except Exception:
+                fast = None
+            self._fast[schema_file] = fast
+        return self._fast[schema_file]
+
+    def errors(self, schema_file: str, obj: object) -> List[str]:
+        """검증 오류 메시지 목록. fast 판정기가 통과시키면 jsonschema는 건너뛰고, 거부 시에만 jsonschema로 확정."""
+        fast = self.fast_validator(schema_file)
+        if fast is not None:
+            try:
+                fast(obj)
+                return []
+            except Exception:
+                pass
+        errors = sorted(self.validator(schema_file).iter_errors(obj), key=lambda e: e.path)
+        return [f"{list(e.path)}: {e.message}" for e in errors]
+
+    def validate(self, schema_file: str, obj: object) -> Tuple[bool, str]:
+        errors = sorted(self.validator(schema_file).iter_errors(obj), key=lambda e: e.path)
+        if errors:
+            return False, "; ".join([f"{list(e.path)}: {e.message}" for e in errors])
+        return True, ""
+
+
+@dataclass
+class FileReport:
+    """JSONL 1개 검증 결과. 메시지는 (줄 번호, 내용)으로 앞에서부터 max_messages개만 보관."""
+
+    name: str
+    path: str
+    records: int = 0
+    schema_failures: int = 0
+    semantic_failures: int = 0
+    schema_errors: List[Tuple[int, str]] = field(default_factory=list)
+    problems: List[Tuple[int, str]] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.schema_failures == 0 and self.semantic_failures == 0
+
+    def to_dict(self) -> dict:
+        return {
+            "path": self.path,
+            "records": self.records,
+            "schema_failures": self.schema_failures,
+            "semantic_failures": self.semantic_failures,
+            "schema_errors": [{"line": ln, "message": m} for ln, m in self.schema_errors],
+            "problems": [{"line": ln, "message": m} for ln, m in self.problems],
+        }
+
+
+@dataclass
+class ValidationReport:
+    files: Dict[str, FileReport] = field(default_factory=dict)
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        return {name: r.records for name, r in self.files.items()}
+
+    def to_dict(self) -> dict:
+        return {"counts": self.counts, "files": {name: r.to_dict() for name, r in self.files.items()}}
+
+
+# 워커 프로세스별 상태(initializer에서 1회 구성)
+_WORKER: Dict[str, object] = {}
+
+
+def _init_worker(configs_dir: Path, constraints: Optional[MenuConstraints]) -> None:
+    _WORKER["schemas"] = SchemaSet(configs_dir)
+    _WORKER["constraints"] = constraints
+
+
+def _check_range(path: Path, start: int, end: int, schema_file: str, max_messages: int) -> Tuple[int, int, int, int, list, list]:
+    """[start, end) 바이트 구간의 줄을 1회 파싱해 스키마/의미 검사. 줄 번호는 구간 내 상대값(1부터)."""
+    schemas: SchemaSet = _WORKER["schemas"]  # type: ignore[assignment]
+    constraints = _WORKER["constraints"]
+    records = schema_fail = sem_fail = 0
+    schema_errors: list = []
+    problems: list = []
+    with path.open("rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    lines = data.split(b"\n")
+    if lines and lines[-1] == b"":
+        lines.pop()
+    for ln, raw in enumerate(lines, start=1):
+        raw = raw.strip()
+        if not raw:
+            continue
+        records += 1
+        try:
+            obj = json.loads(raw)
+        except ValueError as e:
+            schema_fail += 1
+            if len(schema_errors) < max_messages:
+                schema_errors.append((ln, f"json parse error: {e}"))
+            continue
+        errors = schemas.errors(schema_file, obj)
+        if errors:
+            schema_fail += 1
+            if len(schema_errors) < max_messages:
+                schema_errors.append((ln, "; ".join(errors)))
+        if constraints is not None and isinstance(obj, dict):
+            found = constraints.order_problems(obj)
+            if found:
+                sem_fail += 1
+                for msg in found:
+                    if len(problems) < max_messages:
+                        problems.append((ln, msg))
+    return len(lines), records, schema_fail, sem_fail, schema_errors, problems
+
+
+def _byte_ranges(path: Path, parts: int) -> List[Tuple[int, int]]:
+    """파일을 parts개 구간으로 나누되 경계를 줄 시작에 맞춘다."""
+    size = path.stat().st_size
+    if parts <= 1 or size == 0:
+        return [(0, size)]
+    bounds = [0]
+    with path.open("rb") as f:
+        for i in range(1, parts):
+            pos = max(size * i // parts, bounds[-1])
+            # pos-1부터 줄 끝까지 건너뛰면 다음 줄 시작(pos가 이미 줄 시작이면 그대로)
+            f.seek(pos - 1)
+            f.readline()
+            pos = f.tell()
+            if pos >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def validate_jsonl_files(files: Dict[str, Tuple[Path, str]], configs_dir: Path,
+                         constraints: Optional[MenuConstraints] = None, workers: int = 1,
+                         max_messages: int = 20) -> ValidationReport:
+    """여러 JSONL을 한 번씩만 읽어 스키마 + 주문 아이템 의미 검사를 함께 수행한다.
+
+    files: 이름 -> (경로, 스키마 파일명). workers > 1이고 파일이 충분히 크면 byte-range 구간을
+    프로세스 풀에 나눠 주며(워커마다 스키마 1회 컴파일), 결과는 구간 순서대로 합쳐 줄 번호를 보정한다.
+    """
+    tasks: List[Tuple[str, Path, int, int, str]] = []
+    for name, (path, schema_file) in files.items():
+        parts = workers * 4 if workers > 1 and path.stat().st_size >= PARALLEL_MIN_BYTES else 1
+        for start, end in _byte_ranges(path, parts):
+            tasks.append((name, path, start, end, schema_file))
+
+    if workers > 1 and any(t[3] - t[2] < t[1].stat().st_size for t in tasks):
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(configs_dir, constraints)) as ex:
+            futures = [ex.submit(_check_range, p, s, e, sf, max_messages) for _, p, s, e, sf in tasks]
+            results = [fut.result() for fut in futures]
+    else:
+        _init_worker(configs_dir, constraints)
+        results = [_check_range(p, s, e, sf, max_messages) for _, p, s, e, sf in tasks]
+
+    report = ValidationReport()
+    offsets: Dict[str, int] = {}
+    for (name, path, _, _, _), (n_lines, records, schema_fail, sem_fail, schema_errors, problems) in zip(tasks, results):
+        r = report.files.setdefault(name, FileReport(name=name, path=str(path)))
+        base = offsets.get(name, 0)
+        r.records += records
+        r.schema_failures += schema_fail
+        r.semantic_failures += sem_fail
+        r.schema_errors.extend((base + ln, m) for ln, m in schema_errors[: max_messages - len(r.schema_errors)])
+        r.problems.extend((base + ln, m) for ln, m in problems[: max_messages - len(r.problems)])
+        offsets[name] = base + n_lines
+    return report
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import json
+import os
+
+import pytest
+
+import src.utils.buildstate as buildstate
+from src.utils.buildstate import BuildState, StageSpec, run_incremental
+
+
+def _setup(tmp_path):
+    src = tmp_path / "in.txt"
+    src.write_text("a\n", encoding="utf-8")
+    out = tmp_path / "out.txt"
+    calls = []
+
+    def run():
+        calls.append(1)
+        out.write_text(src.read_text(encoding="utf-8"), encoding="utf-8")
+        return len(calls)
+
+    return src, out, calls, run
+
+
+def _state(tmp_path):
+    return BuildState(tmp_path / "build_state.json", tmp_path)
+
+
+def test_second_run_with_same_inputs_is_skipped(tmp_path):
+    src, out, calls, run = _setup(tmp_path)
+    spec = StageSpec(files=[src], outputs=[out], params={"n": 1})
+    assert run_incremental(_state(tmp_path), "s", spec, run) == (True, 1)
+    # 새 BuildState도 디스크의 기록으로 판단한다
+    assert run_incremental(_state(tmp_path), "s", spec, run) == (False, None)
+    assert len(calls) == 1
+
+
+def test_input_param_output_and_force_changes_rerun(tmp_path):
+    src, out, calls, run = _setup(tmp_path)
+    state = _state(tmp_path)
+    spec = StageSpec(files=[src], outputs=[out], params={"n": 1})
+    run_incremental(state, "s", spec, run)
+
+    src.write_text("b\n", encoding="utf-8")
+    assert run_incremental(state, "s", spec, run)[0]
+    assert run_incremental(state, "s", StageSpec(files=[src], outputs=[out], params={"n": 2}), run)[0]
+    out.unlink()
+    assert run_incremental(state, "s", StageSpec(files=[src], outputs=[out], params={"n": 2}), run)[0]
+    assert run_incremental(state, "s", StageSpec(files=[src], outputs=[out], params={"n": 2}), run, force=True)[0]
+    assert len(calls) == 5
+    # 다른 단계 이름은 따로 기록된다
+    assert run_incremental(state, "t", StageSpec(files=[src], outputs=[out], params={"n": 2}), run)[0]
+
+
+def test_failed_run_is_not_recorded(tmp_path):
+    src, out, _, _ = _setup(tmp_path)
+    state = _state(tmp_path)
+    spec = StageSpec(files=[src], outputs=[out])
+
+    def fail():
+        out.write_text("partial", encoding="utf-8")
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        run_incremental(state, "s", spec, fail)
+    assert "s" not in _state(tmp_path).stages
+
+
+def test_digest_reuses_hash_until_size_or_mtime_changes(tmp_path, monkeypatch):
+    src = tmp_path / "in.txt"
+    src.write_text("a\n", encoding="utf-8")
+    hashed = []
+    real = buildstate.file_sha256
+    monkeypatch.setattr(buildstate, "file_sha256", lambda p: hashed.append(p) or real(p))
+    state = _state(tmp_path)
+    first = state.digest(src)
+    assert state.digest(src) == first and len(hashed) == 1
+    st = src.stat()
+    os.utime(src, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert state.digest(src) == first and len(hashed) == 2
+
+
+def test_state_from_another_version_is_ignored(tmp_path):
+    src, out, calls, run = _setup(tmp_path)
+    spec = StageSpec(files=[src], outputs=[out])
+    run_incremental(_state(tmp_path), "s", spec, run)
+    path = tmp_path / "build_state.json"
+    data = json.loads(path.read_text(encoding="utf-8"))
+    data["version"] = -1
+    path.write_text(json.dumps(data), encoding="utf-8")
+    assert run_incremental(_state(tmp_path), "s", spec, run)[0]
+    assert len(calls) == 2
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from collections import Counter
+
+from src.utils.fewshot_index import load_fewshot_index, write_fewshot_index
+
+
+def _row(text, *skus):
+    target = {"order": {"items": [{"sku": s, "quantity": 1} for s in skus]}} if skus else {"ask": "메뉴를 말씀해 주세요"}
+    return {"input": text, "target": target}
+
+
+ROWS = [
+    _row("아이스 아메리카노 두 잔", "AMERICANO"),
+    _row("아메리카노 한 잔이랑 라떼", "AMERICANO", "LATTE"),
+    _row("따뜻한 아메리카노 포장", "AMERICANO"),
+    _row("바닐라 라떼 한 잔", "VANILLA_LATTE"),
+    _row("아메리카노 있어요?"),
+]
+
+
+def test_query_is_lazy_and_diverse(tmp_path):
+    path = tmp_path / "few_shots.index.bin"
+    write_fewshot_index(path, ROWS)
+    idx = load_fewshot_index(path)
+    assert idx._skus is None and idx._sku_docs is None and idx._skuless is None
+
+    assert idx.term_id("아메") is not None
+    assert idx.term_id("없는") is None
+    hits = idx.query("아메리카노", k=5, max_per_sku=2, order_only=True)
+    assert 4 not in [h.doc for h in hits]
+    assert max(Counter(s for h in hits for s in h.skus).values()) <= 2
+    assert idx.doc_skus(1) == ["AMERICANO", "LATTE"]
+    assert list(idx.sku_docs("AMERICANO")) == [0, 1, 2]
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import importlib
+import os
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+from src.utils.buildstate import BuildState, run_incremental
+from src.utils.io import Paths
+
+ROOT = Path(__file__).resolve().parents[1]
+mod = importlib.import_module("src.etl.01_filter_orders")
+
+COLUMNS = ["IDX", "발화자", "발화문", "카테고리", "QA번호", "QA여부", "감성", "인텐트", "개체명", "상담번호", "상담내순번"]
+
+
+def _write_raw(path: Path, texts, start: int = 0) -> None:
+    rows = [[start + i, "c", t, "카페", 1, "q", "", "", "", start + i, 1] for i, t in enumerate(texts)]
+    pd.DataFrame(rows, columns=COLUMNS).to_csv(path, index=False)
+
+
+def _run(paths: Paths, patterns: dict) -> bool:
+    mod.prepare_raw(paths, "cafe", chunksize=1000)
+    ran, _ = run_incremental(BuildState.for_domain(paths, "cafe"), "01_filter_orders", mod.stage_spec(paths, "cafe"),
+                             lambda: mod.filter_orders(paths, "cafe", patterns))
+    return ran
+
+
+def test_new_and_edited_csv_are_not_hidden_by_parquet(tmp_path):
+    paths = Paths(root=tmp_path)
+    shutil.copytree(ROOT / "configs", paths.configs)
+    paths.data_raw.mkdir(parents=True)
+    patterns = {"filters": {"require_speaker": "c", "require_qa": "q", "order_keywords": ["주문"]}}
+    _write_raw(paths.data_raw / "cafe_a.csv", ["아메리카노 주문할게요", "안녕하세요"])
+    mod.prepare_raw(paths, "cafe", chunksize=1000, convert=True)
+    assert _run(paths, patterns)
+    out = paths.data_interim / "cafe_orders.csv"
+    assert len(pd.read_csv(out)) == 1
+    assert not _run(paths, patterns)
+
+    # CSV를 추가하면 변환본이 새로 생기고 새 행이 반영된다
+    _write_raw(paths.data_raw / "cafe_b.csv", ["라떼 주문이요", "카페라떼 두 잔 주문"], start=10)
+    assert _run(paths, patterns)
+    assert (paths.data_raw / "cafe_b.parquet").exists()
+    assert len(pd.read_csv(out)) == 3
+
+    # 기존 CSV를 고치면 낡은 변환본 대신 새 내용을 읽는다
+    _write_raw(paths.data_raw / "cafe_a.csv", ["아메리카노 주문할게요", "모카 주문"])
+    stamp = (paths.data_raw / "cafe_a.parquet").stat().st_mtime + 5
+    os.utime(paths.data_raw / "cafe_a.csv", (stamp, stamp))
+    assert _run(paths, patterns)
+    assert len(pd.read_csv(out)) == 4
+    assert not _run(paths, patterns)
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import pytest
+
+from src.utils.fuzzy import FuzzyResolver
+
+PHRASES = ["아메리카노", "카페라떼", "바닐라 라떼", "카페 모카", "블루베리 요거트 스무디", "초코칩 쿠키"]
+QUERIES = ["아메리 카노", "바닐라라떼 두 잔", "블루베리 요거트 스무디요", "카페모카", "화장실", "", "카페라떼"]
+
+
+def test_default_uses_batch_cdist_path():
+    resolver = FuzzyResolver(PHRASES)
+    assert resolver.index is None
+    assert resolver.resolve_many(QUERIES) == [FuzzyResolver(PHRASES).resolve(q) for q in QUERIES]
+
+
+@pytest.mark.parametrize("use_jamo_index", [False, True])
+def test_resolve_many_matches_resolve(use_jamo_index):
+    batch = FuzzyResolver(PHRASES, use_jamo_index=use_jamo_index).resolve_many(QUERIES)
+    scalar = FuzzyResolver(PHRASES, use_jamo_index=use_jamo_index)
+    assert batch == [scalar.resolve(q) for q in QUERIES]
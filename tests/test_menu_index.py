@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import importlib
+import json
+from pathlib import Path
+
+import pandas as pd
+
+from src.utils.io import load_yaml
+from src.utils.menu import load_combined_mapping
+from src.utils.menu_index import load_menu_index, write_menu_index
+from src.utils.parse import parse_order_items_batch
+from src.utils.quantity import compile_quantity_parser
+from src.utils.slots import compile_slot_extractor
+from src.utils.textnorm import compile_normalizer
+
+ROOT = Path(__file__).resolve().parents[1]
+CONFIGS = ROOT / "configs"
+
+UTTERANCES = [
+    "아이스 아메리카노 두 잔이랑 라떼 하나 포장",
+    "음 바닐라 라떼 두유로 한 잔",
+    "카페라떼 덜 달게 오트밀크로 주세요",
+    "아아 하나 샷추가요 먹고 가요",
+    "아메리 카노 한 잔 주세요",
+    "iced Blueberry Yogurt Smoothie 한 잔",
+    "화장실이 어디예요?",
+]
+
+
+def test_index_mapping_matches_etl_mapping(tmp_path):
+    patterns = load_yaml(CONFIGS / "patterns.yml") or {}
+    mapping = load_combined_mapping(CONFIGS / "menu.cafe.yml", CONFIGS / "aliases.cafe.yml",
+                                    compile_normalizer(patterns), jamo_fuzzy=True,
+                                    slot_extractor=compile_slot_extractor(patterns),
+                                    quantity_parser=compile_quantity_parser(patterns))
+    menu_json = importlib.import_module("src.etl.02_export_menu").compile_menu(load_yaml(CONFIGS / "menu.cafe.yml"))
+    aliases_json = json.loads((ROOT / "outputs" / "cafe" / "aliases.json").read_text(encoding="utf-8"))
+    path = tmp_path / "menu_index.bin"
+    write_menu_index(path, mapping, menu_json, aliases_json, patterns)
+
+    index_mapping = load_menu_index(path).to_mapping(jamo_fuzzy=True)
+    assert index_mapping.normalizer is not None
+    assert index_mapping.slot_extractor.signature() == mapping.slot_extractor.signature()
+    assert index_mapping.quantity_parser.signature() == mapping.quantity_parser.signature()
+    assert set(index_mapping.aliases) == set(mapping.aliases)
+    texts = pd.Series(UTTERANCES, dtype=object)
+    want = parse_order_items_batch(texts, mapping, mapping.aliases, orders=True).tolist()
+    got = parse_order_items_batch(texts, index_mapping, index_mapping.aliases, orders=True).tolist()
+    assert got == want
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from src.utils.io import load_yaml
+from src.utils.menu import load_combined_mapping
+from src.utils.parallel import parse_order_items_parallel
+from src.utils.parse import parse_order, parse_order_items, parse_order_items_batch
+from src.utils.parse_cache import ParseCache
+from src.utils.quantity import compile_quantity_parser
+from src.utils.slots import compile_slot_extractor
+from src.utils.textnorm import compile_normalizer
+
+CONFIGS = Path(__file__).resolve().parents[1] / "configs"
+MENU_YAML = CONFIGS / "menu.cafe.yml"
+ALIASES_YAML = CONFIGS / "aliases.cafe.yml"
+
+UTTERANCES = [
+    "아이스 아메리카노 두 잔이랑 라떼 하나 포장",
+    "아메리카노 라떼",
+    "초코칩 쿠키 두 개 하고 뜨거운 카페라떼 한 잔 주세요",
+    "바닐라 라떼 두 잔",
+    "아아 하나 샷추가요",
+    "카페 모카 4잔 먹고 가요",
+    "아메리 카노 한 잔 주세요",
+    "음.. iced Blueberry Yogurt Smoothie 한 잔 주문할게요",
+    "화장실이 어디예요?",
+    "",
+]
+
+
+@pytest.fixture(scope="module")
+def mapping():
+    normalizer = compile_normalizer(load_yaml(CONFIGS / "patterns.yml") or {})
+    return load_combined_mapping(MENU_YAML, ALIASES_YAML, normalizer)
+
+
+def test_batch_matches_scalar(mapping):
+    texts = pd.Series(UTTERANCES, dtype=object)
+    items = parse_order_items_batch(texts, mapping, mapping.aliases)
+    orders = parse_order_items_batch(texts, mapping, mapping.aliases, orders=True)
+    for text, got_items, got_order in zip(UTTERANCES, items, orders):
+        assert got_items == parse_order_items(text, mapping, mapping.aliases), text
+        assert got_order == parse_order(text, mapping, mapping.aliases), text
+
+
+def test_batch_groups_by_position_not_label(mapping):
+    texts = pd.Series(["아메리카노 한 잔", "라떼 두 잔"], index=[0, 0], dtype=object)
+    out = parse_order_items_batch(texts, mapping, mapping.aliases)
+    assert list(out.index) == [0, 0]
+    assert out.iloc[0] == parse_order_items("아메리카노 한 잔", mapping, mapping.aliases)
+    assert out.iloc[1] == parse_order_items("라떼 두 잔", mapping, mapping.aliases)
+
+
+def test_flat_table_keeps_input_labels(mapping):
+    texts = pd.Series(["아메리카노 라떼", "화장실이 어디예요?", "초코칩 쿠키 세 개"], index=["a", "b", "c"], dtype=object)
+    table = parse_order_items_batch(texts, mapping, mapping.aliases, flat=True)
+    assert list(table["utt_id"]) == ["a", "a", "c"]
+    assert list(table["sku"]) == [it["sku"] for t in texts for it in parse_order_items(t, mapping, mapping.aliases)]
+
+
+def test_parallel_matches_single_process(mapping):
+    texts = pd.Series(UTTERANCES * 3, dtype=object)
+    expected = parse_order_items_batch(texts, mapping, mapping.aliases, orders=True).tolist()
+    got = parse_order_items_parallel(texts, MENU_YAML, ALIASES_YAML, workers=2,
+                                     normalizer=mapping.normalizer, orders=True).tolist()
+    assert got == expected
+
+
+def test_parsers_use_the_mapping_slot_extractor(mapping):
+    patterns = load_yaml(CONFIGS / "patterns.yml") or {}
+    patterns["parsing"]["slots"]["size"]["L"].append("왕큰")
+    custom = load_combined_mapping(MENU_YAML, ALIASES_YAML, mapping.normalizer,
+                                   slot_extractor=compile_slot_extractor(patterns))
+    text = "라떼 왕큰 사이즈로 한 잔"
+    assert parse_order_items(text, mapping, mapping.aliases)[0].get("options", {}).get("size") is None
+    expected = parse_order_items(text, custom, custom.aliases)
+    assert expected[0]["options"]["size"] == "L"
+    texts = pd.Series([text] * 2, dtype=object)
+    assert parse_order_items_batch(texts, custom, custom.aliases).tolist() == [expected] * 2
+    got = parse_order_items_parallel(texts, MENU_YAML, ALIASES_YAML, workers=2, normalizer=custom.normalizer,
+                                     slot_extractor=custom.slot_extractor).tolist()
+    assert got == [expected] * 2
+
+
+def test_parsers_use_the_mapping_quantity_parser(mapping):
+    patterns = load_yaml(CONFIGS / "patterns.yml") or {}
+    patterns["parsing"]["quantity"]["units"].append("사발")
+    custom = load_combined_mapping(MENU_YAML, ALIASES_YAML, mapping.normalizer,
+                                   quantity_parser=compile_quantity_parser(patterns))
+    text = "라떼 세 사발 주세요"
+    assert parse_order_items(text, mapping, mapping.aliases)[0]["quantity"] == 1
+    expected = parse_order_items(text, custom, custom.aliases)
+    assert expected[0]["quantity"] == 3
+    texts = pd.Series([text] * 2, dtype=object)
+    assert parse_order_items_batch(texts, custom, custom.aliases).tolist() == [expected] * 2
+    got = parse_order_items_parallel(texts, MENU_YAML, ALIASES_YAML, workers=2, normalizer=custom.normalizer,
+                                     quantity_parser=custom.quantity_parser).tolist()
+    assert got == [expected] * 2
+
+
+def test_quantity_ignores_more_than_three_digits(mapping):
+    parse = compile_quantity_parser(load_yaml(CONFIGS / "patterns.yml") or {})
+    assert parse("1000잔") is None
+    assert parse("1234잔") is None
+    assert parse("라떼 1000") is None
+    assert parse("999잔") == 999
+    assert parse("두 잔 1000") == 2
+    texts = ["아메리카노 1000잔", "라떼 1234잔 주세요"]
+    for text, items in zip(texts, parse_order_items_batch(pd.Series(texts, dtype=object), mapping, mapping.aliases)):
+        assert [it["quantity"] for it in items] == [1]
+        assert items == parse_order_items(text, mapping, mapping.aliases)
+
+
+def test_normalizer_cache_is_keyed_by_input_only(mapping):
+    normalizer = mapping.normalizer
+    first = normalizer("!음 라떼")
+    assert first == normalizer.apply("!음 라떼")
+    # 앞 호출의 결과 문자열을 새 입력으로 넘기면 캐시가 아니라 apply 결과를 돌려줘야 한다
+    assert normalizer(first) == normalizer.apply(first)
+
+
+def test_parse_cache_keys_on_aliases(mapping, tmp_path):
+    # "아라"는 temp=ICE를 암시하는 별칭이라 별칭 사전 없이 파싱하면 옵션이 빠진다
+    texts = pd.Series(UTTERANCES + ["아라 한 잔 주세요"], dtype=object)
+    with ParseCache(tmp_path / "cache.sqlite", "test") as cache:
+        with_aliases = parse_order_items_batch(texts, mapping, mapping.aliases, cache=cache).tolist()
+        without = parse_order_items_batch(texts, mapping, None, cache=cache).tolist()
+        assert cache.hits == 0
+        again = parse_order_items_batch(texts, mapping, mapping.aliases, cache=cache).tolist()
+    assert with_aliases == again
+    assert without == parse_order_items_batch(texts, mapping, None).tolist()
+    assert without != with_aliases
+
+
+def test_scalar_parse_shares_the_batch_cache(mapping, tmp_path):
+    texts = UTTERANCES + ["아라 한 잔 주세요"]
+    with ParseCache(tmp_path / "cache.sqlite", "test") as cache:
+        batch = parse_order_items_batch(pd.Series(texts, dtype=object), mapping, mapping.aliases, orders=True,
+                                        cache=cache).tolist()
+        assert [parse_order(t, mapping, mapping.aliases, cache=cache) for t in texts] == batch
+        assert cache.misses == len(set(texts)) and cache.hits == len(set(texts))
+        # 별칭 없이 부른 스칼라 호출은 별칭 키의 결과를 받지 않는다
+        assert parse_order_items("아라 한 잔 주세요", mapping, None, cache=cache) == \
+            parse_order_items("아라 한 잔 주세요", mapping, None)
+    assert mapping.parse_fingerprint is not None
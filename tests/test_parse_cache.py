@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from src.utils.parse_cache import ParseCache, cached_parse, parse_config_hash
+
+
+def _parse(texts):
+    return [{"text": t, "n": len(t)} for t in texts]
+
+
+def test_reopen_with_same_hash_keeps_entries(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    with ParseCache(path, "h1") as cache:
+        first = cached_parse(cache, "items", ["라떼", "아메리카노", "라떼"], _parse)
+        assert (cache.hits, cache.misses) == (0, 2)
+    with ParseCache(path, "h1") as cache:
+        assert cached_parse(cache, "items", ["라떼", "아메리카노", "라떼"], _parse) == first
+        assert (cache.hits, cache.misses) == (2, 0)
+        # 모드가 다르면 같은 발화라도 다른 키
+        cached_parse(cache, "order", ["라떼"], _parse)
+        assert cache.misses == 1
+
+
+def test_config_hash_change_clears_entries(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    with ParseCache(path, "h1") as cache:
+        cached_parse(cache, "items", ["라떼"], _parse)
+    with ParseCache(path, "h2") as cache:
+        assert cache.lookup("items", ["라떼"]) == {}
+        cached_parse(cache, "items", ["라떼"], _parse)
+    # 되돌려 열어도 h1 시절 결과는 이미 지워졌다
+    with ParseCache(path, "h1") as cache:
+        assert cache.lookup("items", ["라떼"]) == {}
+
+
+def test_config_hash_follows_file_contents(tmp_path):
+    cfg = tmp_path / "menu.test.yml"
+    cfg.write_text("items: []\n", encoding="utf-8")
+    before = parse_config_hash([cfg], code=[])
+    assert parse_config_hash([cfg], code=[]) == before
+    cfg.write_text("items: [{sku: LATTE}]\n", encoding="utf-8")
+    assert parse_config_hash([cfg], code=[]) != before
+    cfg.unlink()
+    assert parse_config_hash([cfg], code=[]) != before
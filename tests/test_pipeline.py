@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from src.pipeline import Stage, default_stages, run_pipeline
+
+
+def _recorder(events, lock):
+    def stage(name, *deps, fn=None):
+        def run(ctx):
+            with lock:
+                events.append(("start", name))
+            result = fn(ctx) if fn is not None else name
+            with lock:
+                events.append(("end", name))
+            return result
+        return Stage(name, deps, run)
+    return stage
+
+
+def test_stages_start_after_their_dependencies_finish():
+    events, lock = [], threading.Lock()
+    stage = _recorder(events, lock)
+    ctx = SimpleNamespace(results={})
+    stages = [stage("d", "b", "c"), stage("b", "a"), stage("c", "a"), stage("a")]
+    timings = run_pipeline(ctx, stages, jobs=4)
+    pos = {ev: i for i, ev in enumerate(events)}
+    for s in stages:
+        for dep in s.deps:
+            assert pos[("end", dep)] < pos[("start", s.name)]
+    assert sorted(t.name for t in timings) == ["a", "b", "c", "d"]
+    assert ctx.results == {n: n for n in "abcd"}
+
+
+def test_independent_stages_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+    ctx = SimpleNamespace(results={})
+    # 두 단계가 동시에 돌지 않으면 barrier가 시간 초과로 깨진다
+    stages = [Stage("x", (), lambda c: barrier.wait()), Stage("y", (), lambda c: barrier.wait())]
+    run_pipeline(ctx, stages, jobs=2)
+    assert set(ctx.results) == {"x", "y"}
+
+
+def test_unknown_dependency_and_cycle_are_rejected():
+    ctx = SimpleNamespace(results={})
+    with pytest.raises(ValueError, match="unknown dependency"):
+        run_pipeline(ctx, [Stage("a", ("missing",), lambda c: None)])
+    with pytest.raises(ValueError, match="cycle"):
+        run_pipeline(ctx, [Stage("a", ("b",), lambda c: None), Stage("b", ("a",), lambda c: None)])
+
+
+def test_failed_stage_raises_and_blocks_dependents():
+    events, lock = [], threading.Lock()
+    stage = _recorder(events, lock)
+
+    def boom(ctx):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        run_pipeline(SimpleNamespace(results={}), [stage("a", fn=boom), stage("b", "a")], jobs=2)
+    assert ("start", "b") not in events
+
+
+def test_default_stages_declare_every_reader_of_upstream_outputs():
+    deps = {s.name: set(s.deps) for s in default_stages()}
+
+    def upstream(name):
+        out = set()
+        for d in deps[name]:
+            out |= {d} | upstream(d)
+        return out
+
+    assert upstream("05_validate_artifacts") == set(deps) - {"00_eda_report", "05_validate_artifacts"}
+    # 인덱스 단계는 evalset을 읽지 않으므로 04와 독립
+    assert "04_build_evalset" not in upstream("02_build_index")
+    assert {"01_filter_orders", "02_export_menu"} <= upstream("03_build_fewshot_index")
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.sampling import (StratifiedSampler, dedupe_utterances, make_quotas, minhash_signatures,
+                                near_duplicate_labels, near_duplicate_mask, order_strata, reservoir_sample,
+                                sample_stream)
+
+TEXTS = [
+    "아이스 아메리카노 두 잔 주세요",
+    "바닐라 라떼 한 잔",
+    "아이스 아메리카노 두잔 주세요",
+    "아이스 아메리카노 두 잔 주세요요",
+    "초코칩 쿠키 세 개 포장",
+]
+
+
+def test_near_duplicates_point_at_first_occurrence():
+    labels = near_duplicate_labels(TEXTS)
+    # 공백만 다른 발화는 같은 텍스트, 한 글자 더 붙은 발화는 임계값 안의 유사 발화
+    assert labels.tolist() == [0, 1, 0, 0, 4]
+    assert near_duplicate_mask(TEXTS).tolist() == [True, True, False, False, True]
+
+
+def test_threshold_one_merges_only_identical_texts():
+    assert near_duplicate_labels(TEXTS, threshold=1.0).tolist() == [0, 1, 0, 3, 4]
+
+
+def test_normalize_runs_before_shingling():
+    texts = ["LATTE 한 잔", "latte 한 잔"]
+    assert near_duplicate_labels(texts, threshold=1.0).tolist() == [0, 1]
+    assert near_duplicate_labels(texts, threshold=1.0, normalize=str.lower).tolist() == [0, 0]
+
+
+def test_minhash_agreement_estimates_jaccard():
+    a, b = "아이스아메리카노두잔주세요그리고라떼", "아이스아메리카노두잔주세요그리고모카"
+    grams = [{t[i:i + 3] for i in range(len(t) - 2)} for t in (a, b)]
+    jaccard = len(grams[0] & grams[1]) / len(grams[0] | grams[1])
+    sig = minhash_signatures([a, b, a], num_perm=256)
+    assert (sig[0] == sig[2]).all()
+    assert abs((sig[0] == sig[1]).mean() - jaccard) < 0.1
+
+
+def test_bands_must_divide_num_perm():
+    with pytest.raises(ValueError):
+        near_duplicate_labels(TEXTS, num_perm=64, bands=10)
+
+
+def test_dedupe_utterances_keeps_first_row_per_cluster():
+    df = pd.DataFrame({"발화문": TEXTS, "id": np.arange(len(TEXTS))})
+    assert dedupe_utterances(df)["id"].tolist() == [0, 1, 4]
+
+
+def _order(*skus: str, options: bool = False) -> dict:
+    extra = {"options": {"size": "L"}} if options else {}
+    return {"items": [{"sku": sku, "quantity": 1, **extra} for sku in skus]}
+
+
+def test_reservoir_sample_is_uniform_and_seeded():
+    chunks = [list(range(i, i + 7)) for i in range(0, 21, 7)]
+    assert reservoir_sample(chunks, 5, seed=3) == reservoir_sample(chunks, 5, seed=3)
+    assert sorted(reservoir_sample(chunks, 50, seed=3)) == list(range(21))
+    hits = np.zeros(21)
+    for seed in range(2000):
+        picked = reservoir_sample(iter(chunks), 5, seed=seed)
+        assert len(set(picked)) == 5
+        hits[picked] += 1
+    # 원소마다 5/21 확률로 뽑혀야 한다
+    assert np.abs(hits / 2000 - 5 / 21).max() < 0.05
+
+
+def test_sampler_stays_within_quotas():
+    quotas = make_quotas(10, multi_share=0.3, option_share=0.5, max_sku_share=0.2, ask_share=0.2)
+    sampler = StratifiedSampler(quotas)
+    for i in range(200):
+        order = None if i % 5 == 0 else _order(*[f"S{(i + j) % 8}" for j in range(1 + i % 2)], options=i % 3 == 0)
+        sampler.offer((i, order), order)
+    rows = sampler.finish()
+    assert len(rows) == 10
+    used = {}
+    for _, order in rows:
+        for key in order_strata(order):
+            used[key] = used.get(key, 0) + 1
+    assert all(n <= quotas.cap(key) for key, n in used.items())
+
+
+def test_finish_fills_from_deferred_rows_under_the_sku_cap_first():
+    sampler = StratifiedSampler(make_quotas(4, multi_share=0.25, option_share=0.5, max_sku_share=0.25))
+    rows = [("a", _order("S1")), ("b", _order("S1")), ("c", _order("S1", options=True)), ("d", _order("S2")),
+            ("f", _order("S3", "S4"))]
+    assert [sampler.offer(row, order) for row, order in rows] == [True, False, False, True, False]
+    # 보류분 중 SKU 상한을 지키는 f가 먼저, 모자란 1행은 상한을 넘는 보류분에서 순서대로
+    assert sampler.finish() == ["a", "d", "f", "b"]
+
+
+def test_ask_rows_are_never_deferred_past_their_quota():
+    sampler = StratifiedSampler(make_quotas(10, ask_share=0.2))
+    for i in range(10):
+        sampler.offer(i, None)
+    assert sampler.finish() == [0, 1]
+
+
+def test_patience_stops_on_unusable_rows():
+    sampler = StratifiedSampler(make_quotas(10), patience=3)
+    for _ in range(3):
+        assert not sampler.done
+        sampler.offer(None)
+    assert sampler.done
+
+
+def test_sample_stream_stops_parsing_once_full():
+    texts = [f"t{i}" for i in range(1000)]
+    parsed = []
+
+    def build(batch):
+        parsed.extend(batch)
+        return [(t, _order("A")) for t in batch]
+
+    sampler = StratifiedSampler(make_quotas(10, multi_share=0.0, option_share=0.0, max_sku_share=1.0))
+    assert sample_stream(texts, build, sampler, batch_size=256) == texts[:10]
+    assert sampler.scanned == len(parsed) == 32